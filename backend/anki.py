@@ -0,0 +1,269 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import time
+import zipfile
+from html import escape, unescape
+
+# zstandard is optional; it is only needed for packages from Anki 2.1.50+
+# exported without "Support older Anki versions"
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from importer import RowError, validate_card
+
+READ_BATCH_SIZE = 500  # notes fetched from the package per batch
+FIELD_SEPARATOR = '\x1f'
+DECK_SEPARATOR = '::'
+DEFAULT_FOLDER = 'Anki'
+MAX_NAME_LENGTH = 100  # matches the set name and folder columns
+
+# Anki stores ease as permille; new cards have 0
+HARD_FACTOR = 2100
+EASY_FACTOR = 2700
+DIFFICULTY_FACTORS = {'easy': 2800, 'medium': 2500, 'hard': 2000}
+DIFFICULTY_TAG = 'difficulty::'  # tag carrying our difficulty through a round trip
+
+CLOZE = re.compile(r'\{\{c\d+::(.*?)(?:::(.*?))?\}\}', re.S)
+LINE_BREAK = re.compile(r'<br\s*/?>|</div>|</p>|</li>', re.I)
+TAG = re.compile(r'<[^>]+>')
+MEDIA = re.compile(r'\[sound:[^\]]*\]')
+
+def html_to_text(html):
+    text = LINE_BREAK.sub('\n', html)
+    text = MEDIA.sub('', TAG.sub('', text))
+    return unescape(text).replace('\xa0', ' ').strip()
+
+def text_to_html(text):
+    return escape(text).replace('\n', '<br>')
+
+def split_deck_name(deck_name):
+    """(set name, folder) for an Anki deck; parent decks become the folder"""
+    parts = [p.strip() for p in deck_name.replace(FIELD_SEPARATOR, DECK_SEPARATOR).split(DECK_SEPARATOR)]
+    name = parts[-1] or 'Untitled'
+    folder = ' / '.join(parts[:-1]) or DEFAULT_FOLDER
+    return name[:MAX_NAME_LENGTH], folder[:MAX_NAME_LENGTH]
+
+def note_to_card(fields, tags, factor):
+    """Card fields for an Anki note, or RowError if it has no usable text
+
+    Cloze notes become the text with blanks on the front and the full text
+    on the back. The difficulty comes from our own tag if the note has been
+    through an export, otherwise from the card's ease.
+    """
+    fields = fields.split(FIELD_SEPARATOR)
+    first = html_to_text(fields[0])
+    extra = html_to_text(fields[1]) if len(fields) > 1 else ''
+    if CLOZE.search(first):
+        front = CLOZE.sub(lambda m: f'[{m.group(2) or "..."}]', first)
+        back = CLOZE.sub(lambda m: m.group(1), first)
+        if extra:
+            back = f'{back}\n\n{extra}'
+    else:
+        front, back = first, extra
+
+    difficulty = 'medium'
+    for tag in tags.split():
+        if tag.lower().startswith(DIFFICULTY_TAG):
+            difficulty = tag[len(DIFFICULTY_TAG):].lower()
+            break
+    else:
+        if factor and factor <= HARD_FACTOR:
+            difficulty = 'hard'
+        elif factor and factor >= EASY_FACTOR:
+            difficulty = 'easy'
+    return validate_card({'front': front, 'back': back, 'difficulty': difficulty})
+
+class PackageError(ValueError):
+    """The upload is not an Anki package we can read"""
+
+def extract_collection(package_path, directory):
+    """Copy the collection database out of a .apkg file; returns its path"""
+    try:
+        package = zipfile.ZipFile(package_path)
+    except zipfile.BadZipFile:
+        raise PackageError('File is not an Anki package')
+    with package:
+        names = set(package.namelist())
+        target = os.path.join(directory, 'collection.sqlite')
+        if 'collection.anki21b' in names:
+            if zstandard is None:
+                raise PackageError('Export the deck with "Support older Anki versions" '
+                                   'ticked, or install zstandard on the server')
+            with package.open('collection.anki21b') as src, open(target, 'wb') as dst:
+                zstandard.ZstdDecompressor().copy_stream(src, dst)
+            return target
+        for name in ('collection.anki21', 'collection.anki2'):
+            if name in names:
+                with package.open(name) as src, open(target, 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+                return target
+    raise PackageError('Anki package has no collection')
+
+class CollectionReader:
+    """Reads notes from an Anki collection a batch at a time
+
+    Each note is read once, with the deck and ease of its first card, and
+    notes come out grouped by deck. Methods are blocking; callers run them
+    with asyncio.to_thread.
+    """
+    def __init__(self, path):
+        # Batches are fetched from whichever thread to_thread picks
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        try:
+            self.decks = self._deck_names()
+        except sqlite3.DatabaseError:
+            self.conn.close()
+            raise PackageError('Anki collection is damaged or not a database')
+        # SQLite fills bare columns from the row that MIN() picked
+        self.cursor = self.conn.execute(
+            'SELECT n.flds, n.tags, c.did, c.factor, MIN(c.ord) '
+            'FROM notes n JOIN cards c ON c.nid = n.id '
+            'GROUP BY n.id ORDER BY c.did, n.id'
+        )
+
+    def _deck_names(self):
+        # Newer collections keep decks in their own table
+        tables = {row[0] for row in self.conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if 'decks' in tables:
+            rows = self.conn.execute('SELECT id, name FROM decks').fetchall()
+            if rows:
+                return dict(rows)
+        decks = json.loads(self.conn.execute('SELECT decks FROM col').fetchone()[0] or '{}')
+        return {int(deck_id): deck['name'] for deck_id, deck in decks.items()}
+
+    def read_batch(self):
+        """Next batch of (deck id, deck name, card dict or RowError)"""
+        batch = []
+        for fields, tags, deck_id, factor, _ in self.cursor.fetchmany(READ_BATCH_SIZE):
+            try:
+                card = note_to_card(fields, tags, factor)
+            except RowError as e:
+                card = e
+            batch.append((deck_id, self.decks.get(deck_id, 'Default'), card))
+        return batch
+
+    def close(self):
+        self.conn.close()
+
+# Schema of a legacy (version 11) collection, which every Anki version imports
+SCHEMA = '''
+CREATE TABLE col (id integer primary key, crt integer not null, mod integer not null,
+    scm integer not null, ver integer not null, dty integer not null, usn integer not null,
+    ls integer not null, conf text not null, models text not null, decks text not null,
+    dconf text not null, tags text not null);
+CREATE TABLE notes (id integer primary key, guid text not null, mid integer not null,
+    mod integer not null, usn integer not null, tags text not null, flds text not null,
+    sfld integer not null, csum integer not null, flags integer not null, data text not null);
+CREATE TABLE cards (id integer primary key, nid integer not null, did integer not null,
+    ord integer not null, mod integer not null, usn integer not null, type integer not null,
+    queue integer not null, due integer not null, ivl integer not null, factor integer not null,
+    reps integer not null, lapses integer not null, left integer not null, odue integer not null,
+    odid integer not null, flags integer not null, data text not null);
+CREATE TABLE revlog (id integer primary key, cid integer not null, usn integer not null,
+    ease integer not null, ivl integer not null, lastIvl integer not null, factor integer not null,
+    time integer not null, type integer not null);
+CREATE TABLE graves (usn integer not null, oid integer not null, type integer not null);
+CREATE INDEX ix_notes_usn ON notes (usn);
+CREATE INDEX ix_cards_usn ON cards (usn);
+CREATE INDEX ix_revlog_usn ON revlog (usn);
+CREATE INDEX ix_cards_nid ON cards (nid);
+CREATE INDEX ix_cards_sched ON cards (did, queue, due);
+CREATE INDEX ix_revlog_cid ON revlog (cid);
+CREATE INDEX ix_notes_csum ON notes (csum);
+'''
+
+MODEL_ID = 1700000000001  # fixed so repeated exports share one note type in Anki
+DECK_ID_BASE = 1700000000000  # deck id = base + set id
+NOTE_ID_BASE = 1700000000000  # note and card id = base + card id
+
+def basic_model(now):
+    field = lambda name, ord_: {'name': name, 'ord': ord_, 'sticky': False, 'rtl': False,
+                                'font': 'Arial', 'size': 20, 'media': []}
+    return {
+        'id': MODEL_ID, 'name': 'Rafifi Basic', 'type': 0, 'mod': now, 'usn': -1,
+        'sortf': 0, 'did': 1, 'tags': [], 'vers': [],
+        'flds': [field('Front', 0), field('Back', 1)],
+        'tmpls': [{'name': 'Card 1', 'ord': 0, 'qfmt': '{{Front}}',
+                   'afmt': '{{FrontSide}}<hr id=answer>{{Back}}',
+                   'did': None, 'bqfmt': '', 'bafmt': ''}],
+        'req': [[0, 'any', [0]]],
+        'css': '.card { font-family: arial; font-size: 20px; text-align: center; }',
+        'latexPre': '\\documentclass[12pt]{article}\n\\special{papersize=3in,5in}\n'
+                    '\\usepackage{amssymb,amsmath}\n\\pagestyle{empty}\n'
+                    '\\setlength{\\parindent}{0in}\n\\begin{document}\n',
+        'latexPost': '\\end{document}',
+    }
+
+def deck(deck_id, name, now):
+    return {'id': deck_id, 'name': name, 'desc': '', 'mod': now, 'usn': -1, 'dyn': 0,
+            'conf': 1, 'collapsed': False, 'extendNew': 10, 'extendRev': 50,
+            'newToday': [0, 0], 'revToday': [0, 0], 'lrnToday': [0, 0], 'timeToday': [0, 0]}
+
+DECK_CONFIG = {'1': {
+    'id': 1, 'name': 'Default', 'mod': 0, 'usn': 0, 'maxTaken': 60, 'autoplay': True,
+    'timer': 0, 'replayq': True, 'dyn': False,
+    'new': {'delays': [1, 10], 'ints': [1, 4, 7], 'initialFactor': 2500, 'order': 1,
+            'perDay': 20, 'bury': False},
+    'lapse': {'delays': [10], 'mult': 0, 'minInt': 1, 'leechFails': 8, 'leechAction': 0},
+    'rev': {'perDay': 200, 'ease4': 1.3, 'fuzz': 0.05, 'maxIvl': 36500, 'ivlFct': 1,
+            'bury': False, 'hardFactor': 1.2},
+}}
+
+class CollectionWriter:
+    """Builds a legacy Anki collection from batches of cards
+
+    Every card becomes a new Basic note in a deck named folder::set, tagged
+    with its difficulty. Methods are blocking; callers run them with
+    asyncio.to_thread.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        self.now = int(time.time())
+        self.decks = {'1': deck(1, 'Default', self.now)}
+        self.position = 0
+
+    def add_batch(self, rows):
+        """rows are (set id, set name, folder, card id, front, back, difficulty)"""
+        notes, cards = [], []
+        for set_id, name, folder, card_id, front, back, difficulty in rows:
+            deck_id = DECK_ID_BASE + set_id
+            if str(deck_id) not in self.decks:
+                self.decks[str(deck_id)] = deck(deck_id, f'{folder or DEFAULT_FOLDER}'
+                                                f'{DECK_SEPARATOR}{name}', self.now)
+            note_id = NOTE_ID_BASE + card_id
+            first = text_to_html(front)
+            checksum = int(hashlib.sha1(front.encode()).hexdigest()[:8], 16)
+            self.position += 1
+            notes.append((note_id, f'rafifi-{card_id}', MODEL_ID, self.now, -1,
+                          f' {DIFFICULTY_TAG}{difficulty or "medium"} ',
+                          first + FIELD_SEPARATOR + text_to_html(back), front, checksum, 0, ''))
+            cards.append((note_id, note_id, deck_id, 0, self.now, -1, 0, 0, self.position,
+                          0, DIFFICULTY_FACTORS.get(difficulty, 2500), 0, 0, 0, 0, 0, 0, ''))
+        self.conn.executemany('INSERT INTO notes VALUES (?,?,?,?,?,?,?,?,?,?,?)', notes)
+        self.conn.executemany('INSERT INTO cards VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)', cards)
+
+    def close(self):
+        models = {str(MODEL_ID): basic_model(self.now)}
+        self.conn.execute(
+            'INSERT INTO col VALUES (1, ?, ?, ?, 11, 0, 0, 0, ?, ?, ?, ?, ?)',
+            (self.now, self.now * 1000, self.now * 1000,
+             json.dumps({'nextPos': self.position + 1, 'curModel': str(MODEL_ID)}),
+             json.dumps(models), json.dumps(self.decks), json.dumps(DECK_CONFIG), '{}')
+        )
+        self.conn.commit()
+        self.conn.close()
+
+def write_package(collection_path, package_path):
+    """Zip a collection into a .apkg file"""
+    with zipfile.ZipFile(package_path, 'w', compression=zipfile.ZIP_DEFLATED) as package:
+        package.write(collection_path, 'collection.anki2')
+        package.writestr('media', '{}')
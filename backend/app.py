@@ -3,8 +3,17 @@ from quart_cors import cors
 from routes.auth import auth_bp
 from routes.timetable import timetable_bp
 from routes.flashcards import flashcard_bp
-from models import Base
+from routes.classes import class_bp
+from routes.admin import admin_bp
+from routes.user import user_bp
+from reviews import schedule_compaction
+import migrations
+from jobs import jobs
+from loop_monitor import loop_monitor
+from json_provider import FastJSONProvider
+import compression
 from sqlalchemy.ext.asyncio import create_async_engine
+from utils import DATABASE_URL, SQL_ECHO
 import logging
 
 # Set up logging
@@ -13,21 +22,38 @@ logger = logging.getLogger(__name__)
 
 app = Quart(__name__)
 app = cors(app, allow_origin="*")
+app.json = FastJSONProvider(app)
 
 # Register blueprints
 app.register_blueprint(auth_bp, url_prefix='/auth')
 app.register_blueprint(timetable_bp, url_prefix='/timetable')
 app.register_blueprint(flashcard_bp, url_prefix='/flashcard')  # Match frontend URL
+app.register_blueprint(class_bp, url_prefix='/class')
+app.register_blueprint(admin_bp, url_prefix='/admin')
+app.register_blueprint(user_bp, url_prefix='/user')
+
+# Watch for handlers that block the event loop
+loop_monitor.init_app(app)
+
+# Compress large responses (e.g. whole decks) for clients that accept it
+compression.init_app(app)
 
 # Use database path relative to current directory
-engine = create_async_engine('sqlite+aiosqlite:///database/rafifi.db', echo=True)
+engine = create_async_engine(DATABASE_URL, echo=SQL_ECHO)
 
 @app.before_serving
 async def startup():
-    # Create all tables
+    # Create the schema, or migrate an existing database to the latest revision
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-        logger.info("Database tables created successfully")
+        await conn.run_sync(migrations.upgrade)
+        logger.info("Database schema is up to date")
+    # Started after the upgrade, since it needs the jobs table
+    await jobs.start()
+    await schedule_compaction()
+
+@app.after_serving
+async def shutdown():
+    await jobs.stop()
 
 if __name__ == '__main__':
     app.run(host='127.0.0.1', port=5000)
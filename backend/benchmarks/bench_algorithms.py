@@ -0,0 +1,78 @@
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+# utils.py shadows the utils/ directory, so import the algorithms module directly
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'utils'))
+
+from models import Flashcard
+from flashcard_algorithms import (PriorityQueue, merge_sort, create_test_queue,
+                                  merge_flashcard_sets)
+from runner import run_suite
+
+SIZES = [100, 1000, 10000]
+SET_COUNTS = [4, 32]  # number of sets merged by merge_flashcard_sets
+SEED = 1234
+# Same skew as generate_data.py: most cards are low priority
+PRIORITY_WEIGHTS = {1: 50, 2: 30, 3: 12, 4: 6, 5: 2}
+
+def make_cards(n, rng):
+    priorities = list(PRIORITY_WEIGHTS)
+    weights = list(PRIORITY_WEIGHTS.values())
+    now = datetime.utcnow()
+    return [
+        Flashcard(
+            id=i,
+            set_id=1,
+            front=f'Question {i}',
+            back=f'Answer {i}',
+            priority=rng.choices(priorities, weights)[0],
+            hash_key='',
+            incorrect_count=min(int(rng.expovariate(0.7)), 20),
+            last_reviewed=(now - timedelta(hours=rng.randint(1, 24 * 60))
+                           if rng.random() < 0.8 else None)
+        )
+        for i in range(n)
+    ]
+
+def bench_priority_queue(cards):
+    def run():
+        queue = PriorityQueue()
+        for card in cards:
+            queue.push(card.id, card.priority)
+        while not queue.is_empty():
+            queue.pop()
+    return run
+
+def bench_merge_sort(cards):
+    return lambda: merge_sort(cards)
+
+def bench_create_test_queue(cards):
+    return lambda: create_test_queue(cards, min_priority=2)
+
+def bench_merge_flashcard_sets(cards, set_count):
+    size = len(cards) // set_count
+    sets = [cards[i * size:(i + 1) * size] for i in range(set_count)]
+    return lambda: merge_flashcard_sets(sets)
+
+def build_benchmarks():
+    benchmarks = {}
+    for n in SIZES:
+        # Every benchmark gets its own copy of the same cards, since
+        # create_test_queue updates their priorities; timings then do not
+        # depend on which benchmarks ran before or were filtered out
+        def cards(n=n):
+            return make_cards(n, random.Random(SEED + n))
+        benchmarks[f'priority_queue[n={n}]'] = bench_priority_queue(cards())
+        benchmarks[f'merge_sort[n={n}]'] = bench_merge_sort(cards())
+        benchmarks[f'create_test_queue[n={n}]'] = bench_create_test_queue(cards())
+        for set_count in SET_COUNTS:
+            benchmarks[f'merge_flashcard_sets[n={n},sets={set_count}]'] = \
+                bench_merge_flashcard_sets(cards(), set_count)
+    return benchmarks
+
+if __name__ == '__main__':
+    run_suite(build_benchmarks(), 'Benchmark the flashcard scheduling algorithms')
@@ -0,0 +1,89 @@
+import json
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from json_provider import dumps_bytes, orjson
+from runner import run_suite
+
+SEED = 1234
+SET_LIST_SIZES = [100, 1000, 10000]  # rows in GET /flashcard/sets
+CARD_COUNTS = [100, 1000]  # cards in GET /flashcard/sets/<id>
+MAX_TEXT = 1000  # front/back column length
+
+def make_sets(n, rng):
+    now = datetime.utcnow()
+    return [{
+        'id': i,
+        'name': f'Set {i}',
+        'folder': rng.choice(['General', 'Maths', 'Biology', 'History']),
+        'card_count': rng.randint(0, 200),
+        'created_at': now - timedelta(seconds=rng.randint(0, 10 ** 7))
+    } for i in range(n)]
+
+def make_cards(n, rng):
+    now = datetime.utcnow()
+    return [{
+        'id': i,
+        'front': 'q' * rng.randint(10, MAX_TEXT),
+        'back': 'a' * rng.randint(10, MAX_TEXT),
+        'difficulty': rng.choice(['easy', 'medium', 'hard']),
+        'created_at': now - timedelta(seconds=rng.randint(0, 10 ** 7))
+    } for i in range(n)]
+
+def stdlib_set_list(sets):
+    # What the routes did before: isoformat per row, then the stdlib encoder
+    def run():
+        body = [{**s, 'created_at': s['created_at'].isoformat()} for s in sets]
+        return json.dumps(body, separators=(',', ':')).encode('utf-8')
+    return run
+
+def fast_set_list(sets):
+    def run():
+        body = [dict(s) for s in sets]
+        return dumps_bytes(body)
+    return run
+
+def stdlib_set_detail(cards):
+    def run():
+        body = {
+            'id': 1,
+            'name': 'Set',
+            'folder': 'General',
+            'flashcards': [{**c, 'created_at': c['created_at'].isoformat()} for c in cards],
+            'created_at': datetime.utcnow().isoformat()
+        }
+        return json.dumps(body, separators=(',', ':')).encode('utf-8')
+    return run
+
+def fast_set_detail(cards):
+    def run():
+        body = {
+            'id': 1,
+            'name': 'Set',
+            'folder': 'General',
+            'flashcards': [dict(c) for c in cards],
+            'created_at': datetime.utcnow()
+        }
+        return dumps_bytes(body)
+    return run
+
+def build_benchmarks():
+    rng = random.Random(SEED)
+    encoder = 'orjson' if orjson else 'stdlib-fallback'
+    benchmarks = {}
+    for n in SET_LIST_SIZES:
+        sets = make_sets(n, rng)
+        benchmarks[f'set_list[n={n},stdlib]'] = stdlib_set_list(sets)
+        benchmarks[f'set_list[n={n},{encoder}]'] = fast_set_list(sets)
+    for n in CARD_COUNTS:
+        cards = make_cards(n, rng)
+        benchmarks[f'set_detail[cards={n},stdlib]'] = stdlib_set_detail(cards)
+        benchmarks[f'set_detail[cards={n},{encoder}]'] = fast_set_detail(cards)
+    return benchmarks
+
+if __name__ == '__main__':
+    run_suite(build_benchmarks(), 'Benchmark JSON encoding of the large listing responses')
@@ -0,0 +1,94 @@
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import timeit
+
+DEFAULT_REPEAT = 7
+DEFAULT_THRESHOLD = 0.10  # 10% slower than baseline counts as a regression
+MIN_RUN_TIME = 0.2  # seconds per repeat, used to pick the loop count
+
+def time_function(func, repeat=DEFAULT_REPEAT):
+    """Time func like pyperf: calibrate loops, warm up, then repeat runs
+
+    Returns per-call timings in seconds for each repeat.
+    """
+    timer = timeit.Timer(func)
+    loops = 1
+    while True:
+        elapsed = timer.timeit(loops)
+        if elapsed >= MIN_RUN_TIME or loops >= 1_000_000:
+            break
+        loops *= 2 if elapsed == 0 else max(2, int(MIN_RUN_TIME / elapsed) + 1)
+    return [t / loops for t in timer.repeat(repeat=repeat, number=loops)]
+
+def summarize(timings):
+    return {
+        'median': statistics.median(timings),
+        'min': min(timings),
+        'stdev': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        'runs': len(timings),
+    }
+
+def format_time(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f'{seconds / scale:.2f} {unit}'
+    return f'{seconds / 1e-9:.0f} ns'
+
+def compare(results, baseline, threshold):
+    """Return (name, baseline median, current median, change) for regressions"""
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get('benchmarks', {}).get(name)
+        if not old:
+            continue
+        change = result['median'] / old['median'] - 1
+        if change > threshold:
+            regressions.append((name, old['median'], result['median'], change))
+    return regressions
+
+def run_suite(benchmarks, description):
+    """Command-line entry point shared by the benchmark scripts
+
+    benchmarks maps a name such as "merge_sort[n=1000]" to a callable.
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--filter', default='', help='only run benchmarks containing this text')
+    parser.add_argument('--save', metavar='FILE', help='write results as a JSON baseline')
+    parser.add_argument('--compare', metavar='FILE', help='compare against a JSON baseline')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='allowed slowdown before failing, as a fraction')
+    args = parser.parse_args()
+
+    results = {}
+    for name, func in benchmarks.items():
+        if args.filter not in name:
+            continue
+        results[name] = summarize(time_function(func, args.repeat))
+        r = results[name]
+        print(f"{name:<45} {format_time(r['median']):>12} +- {format_time(r['stdev'])}")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'python': sys.version.split()[0],
+                'platform': platform.platform(),
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'benchmarks': results,
+            }, f, indent=2)
+        print(f"\nSaved baseline to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\nRegressions beyond {args.threshold:.0%}:")
+            for name, old, new, change in regressions:
+                print(f"  {name}: {format_time(old)} -> {format_time(new)} (+{change:.1%})")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.threshold:.0%} against {args.compare}")
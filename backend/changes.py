@@ -0,0 +1,40 @@
+from datetime import datetime
+from sqlalchemy import select, insert, literal
+from models import ChangeLog, Flashcard
+
+def record_change(session, user_id, entity, entity_id, op='upsert', set_id=None):
+    """Append a change for a set or card to the user's change log"""
+    session.add(ChangeLog(
+        user_id=user_id,
+        entity=entity,
+        entity_id=entity_id,
+        set_id=set_id,
+        op=op
+    ))
+
+def record_changes(session, user_id, entity, entity_ids, op='upsert', set_id=None):
+    """Append the same change for several entities"""
+    session.add_all([
+        ChangeLog(user_id=user_id, entity=entity, entity_id=entity_id,
+                  set_id=set_id, op=op)
+        for entity_id in entity_ids
+    ])
+
+async def record_new_cards(session, user_id, set_ids, after_id):
+    """Log an upsert for every card of set_ids with an id above after_id
+
+    Done with one INSERT ... SELECT, so bulk imports do not have to keep the
+    ids of the cards they inserted.
+    """
+    await session.execute(
+        insert(ChangeLog).from_select(
+            ['user_id', 'entity', 'entity_id', 'set_id', 'op', 'changed_at'],
+            select(
+                literal(user_id), literal('card'), Flashcard.id, Flashcard.set_id,
+                literal('upsert'), literal(datetime.utcnow())
+            )
+            .where(Flashcard.set_id.in_(set_ids))
+            .where(Flashcard.id > after_id)
+            .order_by(Flashcard.id)
+        )
+    )
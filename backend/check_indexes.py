@@ -0,0 +1,101 @@
+import argparse
+import asyncio
+import re
+import sqlite3
+import sys
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from check_routes import CheckFailed, run_checks, scenario_names, scratch_database
+
+# SQLite reports a full table (or index) scan as "SCAN <table>", and older
+# versions as "SCAN TABLE <table>". Scans of VALUES rows and of the schema
+# table (read to find the review log partitions) are not table scans.
+FULL_SCAN = re.compile(
+    r'^SCAN (?:TABLE )?(?!CONSTANT ROW|\d+ CONSTANT ROWS|sqlite_(?:master|schema)\b)(\w+)')
+PLANNED = ('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT')  # statements that can scan
+
+class QueryLog:
+    """Every statement the app sends to SQLite, with the routes that sent it
+
+    Listens to before_cursor_execute on all engines, so it sees the SQL and
+    parameters exactly as the routes and the jobs they queue issue them.
+    """
+    def __init__(self):
+        self.queries = {}  # statement -> (first parameters, routes that ran it)
+        self.routes = set()
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith(PLANNED):
+            return
+        if executemany and parameters and isinstance(parameters[0], (tuple, list, dict)):
+            # Batched INSERT ... RETURNING comes through flagged as executemany
+            # one row at a time, so only a list of rows is cut down to its first
+            parameters = parameters[0]
+        route = current_route()
+        self.routes.add(route)
+        self.queries.setdefault(statement, (parameters, set()))[1].add(route)
+
+def current_route():
+    # Imported late so the environment configures the database first
+    from quart import has_request_context, request
+    if has_request_context() and request.url_rule is not None:
+        return f'{request.method} {request.url_rule.rule}'
+    return 'background'
+
+def explain(path, queries):
+    """(statement, routes, plan lines, scanned tables) for every captured query"""
+    conn = sqlite3.connect(path)
+    try:
+        results = []
+        for statement, (parameters, routes) in queries.items():
+            plan = [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {statement}', parameters)]
+            scans = [m.group(1) for m in map(FULL_SCAN.match, plan) if m]
+            results.append((statement, sorted(routes), plan, scans))
+        return results
+    finally:
+        conn.close()
+
+def unexercised_routes(routes):
+    from app import app
+    rules = {f'{method} {rule.rule}' for rule in app.url_map.iter_rules()
+             for method in rule.methods - {'HEAD', 'OPTIONS'} if rule.endpoint != 'static'}
+    return sorted(rules - routes)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Run the route scenarios and fail if any query they issue '
+                    'scans a whole table instead of using an index')
+    parser.add_argument('--verbose', action='store_true', help='print every query plan')
+    args, names = scenario_names(parser)
+
+    log = QueryLog()
+    with scratch_database() as path:
+        event.listen(Engine, 'before_cursor_execute', log.before_cursor_execute)
+        try:
+            asyncio.run(run_checks(names, log=lambda line: None))
+        except CheckFailed as e:
+            print(f'FAILED: {e}')
+            sys.exit(1)
+        finally:
+            event.remove(Engine, 'before_cursor_execute', log.before_cursor_execute)
+        results = explain(path, log.queries)
+
+    failed = 0
+    for statement, routes, plan, scans in results:
+        if scans or args.verbose:
+            status = f"SCANS {', '.join(scans)}" if scans else 'ok'
+            print(f"{', '.join(routes)}: {status}")
+            print(f"    {' '.join(statement.split())}")
+            for line in plan:
+                print(f'        {line}')
+        failed += bool(scans)
+    missed = unexercised_routes(log.routes)
+    if missed:
+        print(f"Routes the scenarios do not reach: {', '.join(missed)}")
+    print(f'{failed} of {len(results)} queries scan a table')
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,309 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+PASSWORD = 'Password123'
+JOB_WAIT = 5.0  # seconds to wait for background jobs to show their effect
+
+class CheckFailed(Exception):
+    pass
+
+class Client:
+    """A test client logged in as its own freshly registered user"""
+    def __init__(self, client, username):
+        self.client = client
+        self.username = username
+        self.headers = {}
+
+    async def register(self):
+        response = await self.client.post('/auth/register', json={
+            'username': self.username, 'password': PASSWORD,
+            'email': f'{self.username}@example.com'
+        })
+        expect(response, 201, 'POST /auth/register')
+        response = await self.client.post('/auth/login', json={
+            'username': self.username, 'password': PASSWORD
+        })
+        expect(response, 200, 'POST /auth/login')
+        token = (await response.get_json())['token']
+        self.headers = {'Authorization': f'Bearer {token}'}
+        return self
+
+    async def call(self, method, path, status=200, **kwargs):
+        """Send a request, check its status and return the decoded JSON reply or the body"""
+        response = await self.client.open(path, method=method, headers=self.headers, **kwargs)
+        body = await response.get_data()
+        expect(response, status, f'{method} {path}', body.decode(errors='replace'))
+        return await response.get_json() if response.mimetype == 'application/json' else body
+
+def expect(response, status, what, body=''):
+    if response.status_code != status:
+        raise CheckFailed(f'{what} returned {response.status_code}, expected {status}: {body[:300]}')
+
+def check(condition, message):
+    if not condition:
+        raise CheckFailed(message)
+
+async def eventually(probe, message, timeout=JOB_WAIT):
+    """Call probe() until it returns a true value, for work done by jobs"""
+    deadline = time.monotonic() + timeout
+    while True:
+        result = await probe()
+        if result:
+            return result
+        if time.monotonic() > deadline:
+            raise CheckFailed(message)
+        await asyncio.sleep(0.1)
+
+# Scenarios, run in order, each with its own users
+
+SCENARIOS = {}
+
+def scenario(func):
+    SCENARIOS[func.__name__] = func
+    return func
+
+@scenario
+async def targets(client):
+    user = await Client(client, 'planner').register()
+    monday = date.today() - timedelta(days=date.today().weekday())
+    await user.call('POST', '/timetable/', 201, json={
+        'week_start': monday.isoformat(), 'targets': {'6': ['Revise biology']}
+    })
+    current = await user.call('GET', '/timetable/current')
+    target_id = current['targets']['6'][0]['id']
+    weeks = await user.call('GET', '/timetable/')
+    check([week['id'] for week in weeks] == [current['id']], f'the recent weeks are {weeks}')
+    await user.call('GET', '/timetable/history')
+
+    completed = await user.call('POST', f'/timetable/target/{target_id}/complete')
+    check(completed['xp_gained'] == 50, f'an on-time target gave {completed["xp_gained"]} XP')
+    again = await user.call('POST', f'/timetable/target/{target_id}/complete')
+    check(again['xp_gained'] == 0, 'completing a target twice gave XP again')
+
+    async def titles():
+        held = {t['title'] for t in await user.call('GET', '/user/titles')}
+        return held >= {'Planner', 'Punctual', 'Week Finisher'} and held
+    await eventually(titles, 'the target titles were not awarded')
+    profile = await eventually(
+        lambda: user_with_xp(user, 50), 'the target XP was not awarded exactly once')
+    check(profile['xp'] == 50, f'XP is {profile["xp"]} after one target')
+
+@scenario
+async def imports(client):
+    user = await Client(client, 'importer').register()
+    # A quote inside an unquoted field is a character; quoted fields may span lines
+    csv_file = ('front,back\n'
+                'He said "hi,there\n'
+                'Capital of France,Paris\n'
+                '"Two\nlines",back\n'
+                'Largest planet,Jupiter\n')
+    result = await user.call('POST', '/flashcard/import?format=csv&name=Quotes&import_id=quotes',
+                             201, data=csv_file.encode())
+    progress = await user.call('GET', '/flashcard/import/quotes')
+    check(progress['state'] == 'done', f'the finished import is {progress["state"]}')
+    check(result['imported'] == 4 and not result['errors'],
+          f'CSV import kept {result["imported"]} of 4 cards: {result["errors"]}')
+    cards = await user.call('GET', f'/flashcard/sets/{result["set_id"]}/cards')
+    check({'He said "hi', 'Two\nlines'} <= {c['question'] for c in cards},
+          'quoted CSV fields were not read as written')
+
+    tsv_file = '5" screen\tbig\nsmall\t3" screen\n'
+    result = await user.call('POST', '/flashcard/import?format=tsv&name=Screens', 201,
+                             data=tsv_file.encode())
+    check(result['imported'] == 2, f'TSV import kept {result["imported"]} of 2 cards')
+
+@scenario
+async def sets(client):
+    user = await Client(client, 'collector').register()
+    await user.call('POST', '/flashcard/sets/batch', 201, json={
+        'name': 'Elements', 'folder': 'Chemistry', 'cards': [
+            {'front': 'H', 'back': 'Hydrogen'}, {'front': 'He', 'back': 'Helium'},
+        ]
+    })
+    await user.call('POST', '/flashcard/sets', 201, json={'name': 'Empty'})
+    counts = {s['name']: s['card_count'] for s in await user.call('GET', '/flashcard/sets')}
+    check(counts == {'Elements': 2, 'Empty': 0}, f'the sets list has the card counts {counts}')
+    found = await user.call('GET', '/flashcard/search?q=elem&folder=Chemistry')
+    check([(s['name'], s['card_count']) for s in found] == [('Elements', 2)],
+          f'searching for the set found {found}')
+
+@scenario
+async def copies(client):
+    owner = await Client(client, 'copier').register()
+    other = await Client(client, 'stranger').register()
+    created = await owner.call('POST', '/flashcard/sets/batch', 201, json={
+        'name': 'Capitals', 'cards': [
+            {'front': 'France', 'back': 'Paris'},
+            {'front': 'Japan', 'back': 'Tokyo', 'difficulty': 'hard'},
+        ]
+    })
+    copy = await owner.call('POST', '/flashcard/sets/copy', 201, json={'set_id': created['id']})
+    check(copy['name'] == 'Capitals (Copy)', f'the copy is named {copy["name"]!r}')
+    cards = await owner.call('GET', f'/flashcard/sets/{copy["id"]}/cards')
+    check({(c['question'], c['answer']) for c in cards} == {('France', 'Paris'), ('Japan', 'Tokyo')},
+          f'the copy has the cards {cards}')
+    await other.call('POST', '/flashcard/sets/copy', 404, json={'set_id': created['id']})
+
+@scenario
+async def exports(client):
+    user = await Client(client, 'exporter').register()
+    # More cards than one export batch, with a set without cards in between
+    sizes = {'Long': 1500, 'Empty': 0, 'Short': 2}
+    for name, size in sizes.items():
+        await user.call('POST', '/flashcard/sets/batch', 201, json={
+            'name': name, 'cards': [{'front': f'{name} {i}', 'back': str(i)} for i in range(size)]
+        })
+    body = await user.call('GET', '/flashcard/export?format=jsonl')
+    fronts = [json.loads(line)['front'] for line in body.decode().splitlines()]
+    expected = [f'{name} {i}' for name, size in sizes.items() for i in range(size)]
+    check(fronts == expected,
+          f'the export has {len(fronts)} cards ({len(set(fronts))} different), expected {len(expected)}')
+
+@scenario
+async def cards(client):
+    user = await Client(client, 'editor').register()
+    created = await user.call('POST', '/flashcard/sets', 201,
+                              json={'name': 'Verbs', 'folder': 'French'})
+    set_id = created['id']
+    path = f'/flashcard/sets/{set_id}'
+    card_ids = []
+    for front, back in [('to be', 'etre'), ('to have', 'avoir'), ('to be', 'etre')]:
+        card = await user.call('POST', f'{path}/cards', 201, json={'front': front, 'back': back})
+        card_ids.append(card['id'])
+    await user.call('PUT', f'{path}/cards/{card_ids[1]}', json={'difficulty': 'hard'})
+    await user.call('GET', path)
+    await user.call('GET', f'{path}/cards')
+    check(await user.call('GET', '/flashcard/folders') == ['French'], 'the folder list is wrong')
+
+    found = await user.call('POST', '/flashcard/lookup',
+                            json={'cards': [{'front': 'to be', 'back': 'etre'}]})
+    check(len(next(iter(found['cards'].values()), [])) == 2,
+          f'looking up a card twice in the set found {found}')
+    duplicates = await user.call('GET', '/flashcard/duplicates')
+    check(len(duplicates) == 1, f'the duplicates are {duplicates}')
+    await user.call('GET', f'/flashcard/duplicates?set_id={set_id}')
+
+    await user.call('POST', f'{path}/test', 201, json={
+        'score': 50, 'duration': 30, 'answers': [
+            {'card_id': card_ids[0], 'grade': 1, 'latency_ms': 900},
+            {'card_id': card_ids[1], 'grade': 0},
+        ]
+    })
+
+    async def reviews():
+        history = await user.call('GET', f'{path}/cards/{card_ids[1]}/reviews')
+        return history['reviews']
+    await eventually(reviews, 'the test answers did not reach the review log')
+
+    snapshot = await user.call('GET', '/flashcard/changes')
+    await user.call('PUT', path, json={'name': 'Irregular verbs', 'folder': 'French'})
+    await user.call('PUT', f'{path}/cards', json={'cards': [
+        {'id': card_ids[0], 'front': 'to be', 'back': 'etre'},
+        {'front': 'to go', 'back': 'aller'},
+    ]})
+    await user.call('DELETE', f'{path}/cards/{card_ids[0]}', 204)
+    changes = await user.call('GET', f'/flashcard/changes?since={snapshot["version"]}')
+    check(card_ids[0] in changes['deleted_cards'], f'the changes since the snapshot are {changes}')
+    await user.call('DELETE', path, 204)
+    await user.call('GET', path, 404)
+
+@scenario
+async def anki(client):
+    user = await Client(client, 'ankist').register()
+    await user.call('POST', '/flashcard/sets/batch', 201, json={
+        'name': 'Rivers', 'folder': 'Geography',
+        'cards': [{'front': 'Longest', 'back': 'Nile'}, {'front': 'Widest', 'back': 'Amazon'}]
+    })
+    package = await user.call('GET', '/flashcard/anki/export')
+    other = await Client(client, 'ankist2').register()
+    result = await other.call('POST', '/flashcard/anki/import', 201, data=package)
+    check(result['imported'] == 2, f'importing the package gave {result}')
+
+@scenario
+async def classes(client):
+    leader = await Client(client, 'teacher').register()
+    pupil = await Client(client, 'pupil').register()
+    created = await leader.call('POST', '/class/', 201, json={'name': 'Year 9'})
+    class_id = created['id']
+    await pupil.call('POST', '/class/join', json={'code': created['code']})
+    members = await leader.call('GET', f'/class/{class_id}/members')
+    check(len(members) == 2, f'the class has the members {members}')
+    classes = await pupil.call('GET', '/class/')
+    check([c['id'] for c in classes] == [class_id], f'the pupil is in the classes {classes}')
+
+    pupil_id = (await pupil.call('GET', '/user/profile'))['id']
+    await leader.call('DELETE', f'/class/{class_id}/members/{pupil_id}', 204)
+    await pupil.call('POST', '/class/join', json={'code': created['code']})
+    await pupil.call('POST', f'/class/{class_id}/leave', 204)
+    await pupil.call('GET', '/user/tests')
+    await pupil.call('GET', '/user/titles')
+
+@scenario
+async def accounts(client):
+    user = await Client(client, 'forgetful').register()
+    await user.call('POST', '/auth/change-recovery-email',
+                    json={'recovery_email': 'backup@example.com'})
+    await user.call('POST', '/auth/change-password', json={
+        'old_password': PASSWORD, 'new_password': 'Password456'
+    })
+    anonymous = Client(client, 'anonymous')
+    await anonymous.call('POST', '/auth/reset-password', json={
+        'email': 'forgetful@example.com', 'recovery_email': 'backup@example.com'
+    })
+
+async def user_with_xp(user, xp):
+    profile = await user.call('GET', '/user/profile')
+    return profile if profile['xp'] >= xp else None
+
+async def run_checks(names, log=print):
+    """Run the named scenarios against the app; the environment picks the database"""
+    # Imported late so the environment configures the database first
+    from app import app
+
+    async with app.test_app() as test_app:
+        client = test_app.test_client()
+        for name in names:
+            start = time.perf_counter()
+            await SCENARIOS[name](client)
+            log(f'{name:<20} ok ({time.perf_counter() - start:.1f}s)')
+
+@contextmanager
+def scratch_database():
+    """Point the app at a new database in a temporary directory and yield its path"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'check.db')
+        os.environ['RAFIFI_DATABASE_URL'] = f'sqlite+aiosqlite:///{path}'
+        os.environ['RAFIFI_SQL_ECHO'] = '0'
+        yield path
+
+def scenario_names(parser):
+    """Scenarios named on the command line, all of them by default"""
+    parser.add_argument('scenarios', nargs='*',
+                        help=f"scenarios to run (default: all of {', '.join(SCENARIOS)})")
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    return args, args.scenarios or list(SCENARIOS)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Drive the routes through the test client against a scratch database')
+    _, names = scenario_names(parser)
+
+    with scratch_database():
+        try:
+            asyncio.run(run_checks(names))
+        except CheckFailed as e:
+            print(f'FAILED: {e}')
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
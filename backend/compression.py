@@ -0,0 +1,142 @@
+import asyncio
+import gzip
+import hashlib
+import logging
+from collections import OrderedDict
+
+from quart import request
+from quart.wrappers.response import DataBody
+
+logger = logging.getLogger(__name__)
+
+# brotli and zstandard are optional; gzip is always available
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESS_MIN_SIZE = 1024  # bytes; smaller bodies are sent as they are
+THREAD_MIN_SIZE = 64 * 1024  # compress bodies this large off the event loop
+CACHE_MAX_BYTES = 32 * 1024 * 1024
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/plain', 'text/csv', 'text/html'}
+
+def _gzip(data):
+    return gzip.compress(data, compresslevel=6)
+
+def _brotli(data):
+    return brotli.compress(data, quality=5)
+
+def _zstd(data):
+    return zstandard.ZstdCompressor(level=6).compress(data)
+
+# Server preference when the client accepts several encodings equally
+COMPRESSORS = OrderedDict()
+if zstandard is not None:
+    COMPRESSORS['zstd'] = _zstd
+if brotli is not None:
+    COMPRESSORS['br'] = _brotli
+COMPRESSORS['gzip'] = _gzip
+
+def choose_encoding(accept_encoding):
+    """Pick the best supported encoding from an Accept-Encoding header"""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+
+    best, best_q = None, 0.0
+    for encoding in COMPRESSORS:
+        q = weights.get(encoding, weights.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+class CompressedBodyCache:
+    """LRU cache of compressed bodies keyed by body digest, bounded by bytes
+
+    An unchanged deck produces the same JSON, so repeat downloads reuse the
+    compressed bytes instead of compressing again.
+    """
+    def __init__(self, max_bytes=CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+        self._entries[key] = value
+        self.size += len(value)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+compressed_cache = CompressedBodyCache()
+
+async def compress_body(body, encoding):
+    key = (hashlib.blake2b(body, digest_size=16).digest(), encoding)
+    compressed = compressed_cache.get(key)
+    if compressed is None:
+        compress = COMPRESSORS[encoding]
+        if len(body) >= THREAD_MIN_SIZE:
+            compressed = await asyncio.to_thread(compress, body)
+        else:
+            compressed = compress(body)
+        compressed_cache.put(key, compressed)
+    return compressed
+
+def init_app(app):
+    """Compress large responses according to the client's Accept-Encoding"""
+    @app.after_request
+    async def compress_response(response):
+        if (request.method == 'HEAD'
+                or response.status_code != 200
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES
+                or not isinstance(response.response, DataBody)):  # Leave streams alone
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+        if encoding is None:
+            return response
+
+        body = await response.get_data()
+        if len(body) < COMPRESS_MIN_SIZE:
+            return response
+
+        compressed = await compress_body(body, encoding)
+        if len(compressed) >= len(body):
+            return response
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        # The compressed bytes differ from the identity body, so the tag is weak
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
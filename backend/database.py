@@ -7,9 +7,9 @@ class Database:
         self._engine = None
         self._session_factory = None
         
-    def init(self, database_url: str):
+    def init(self, database_url: str, echo: bool = True):
         """Initialize the database connection"""
-        self._engine = create_async_engine(database_url, echo=True)
+        self._engine = create_async_engine(database_url, echo=echo)
         self._session_factory = sessionmaker(
             self._engine, 
             class_=AsyncSession, 
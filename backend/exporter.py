@@ -0,0 +1,119 @@
+import csv
+import io
+import json
+import re
+import zipfile
+
+EXPORT_BATCH_SIZE = 1000  # rows read from the database at a time
+ZIP_FLUSH_BYTES = 64 * 1024  # compressed bytes collected before a zip chunk is sent
+CSV_COLUMNS = ('set', 'folder', 'front', 'back', 'difficulty', 'created_at')
+CARD_COLUMNS = ('front', 'back', 'difficulty')  # the columns importer.py reads
+
+# Each exporter takes an async iterator of row batches, where a row is
+# (set id, set name, folder, front, back, difficulty, created_at) ordered by
+# set and then card, and yields the encoded file in chunks. Sets without
+# cards come through with front set to None.
+
+async def export_jsonl(batches):
+    """One JSON object per card, importable with format=jsonl"""
+    async for rows in batches:
+        lines = [json.dumps({
+            'set_id': set_id,
+            'set': name,
+            'folder': folder,
+            'front': front,
+            'back': back,
+            'difficulty': difficulty,
+            'created_at': created_at.isoformat() if created_at else None
+        }) for set_id, name, folder, front, back, difficulty, created_at in rows
+            if front is not None]
+        if lines:
+            yield ('\n'.join(lines) + '\n').encode()
+
+async def export_csv(batches):
+    """One CSV row per card with a header, importable with format=csv"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    async for rows in batches:
+        writer.writerows(
+            (name, folder, front, back, difficulty, created_at.isoformat() if created_at else '')
+            for _, name, folder, front, back, difficulty, created_at in rows
+            if front is not None
+        )
+        data = drain(buffer)
+        if data:
+            yield data
+    data = drain(buffer)
+    if data:
+        yield data
+
+async def export_zip(batches):
+    """A zip archive holding one CSV file per set, under a folder per folder"""
+    sink = ZipSink()
+    archive = zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    current_set, member = None, None
+    async for rows in batches:
+        for set_id, name, folder, front, back, difficulty, _ in rows:
+            if set_id != current_set:
+                if member is not None:
+                    member.write(drain(buffer))
+                    member.close()
+                current_set = set_id
+                member = archive.open(archive_name(set_id, name, folder), 'w', force_zip64=True)
+                writer.writerow(CARD_COLUMNS)
+            if front is not None:
+                writer.writerow((front, back, difficulty))
+        if member is not None:
+            member.write(drain(buffer))
+        if sink.size >= ZIP_FLUSH_BYTES:
+            yield sink.drain()
+    if member is not None:
+        member.close()
+    archive.close()
+    yield sink.drain()
+
+def drain(buffer):
+    data = buffer.getvalue().encode()
+    buffer.seek(0)
+    buffer.truncate()
+    return data
+
+def archive_name(set_id, name, folder):
+    """Path of a set's file in the archive; the id keeps equal names apart"""
+    return f'{safe_filename(folder or "General")}/{safe_filename(name)}-{set_id}.csv'
+
+def safe_filename(name):
+    return re.sub(r'[^\w\- ]+', '_', name).strip() or 'untitled'
+
+class ZipSink:
+    """Write-only file for zipfile whose contents are handed out as they come
+
+    zipfile notices that it cannot seek and writes sizes after each member
+    instead, so the archive never has to be held in memory.
+    """
+    def __init__(self):
+        self._chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        self.size = 0
+        return data
+
+EXPORTERS = {
+    'jsonl': (export_jsonl, 'application/x-ndjson'),
+    'csv': (export_csv, 'text/csv'),
+    'zip': (export_zip, 'application/zip'),
+}
@@ -0,0 +1,231 @@
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+import bcrypt
+from sqlalchemy import create_engine
+
+# Import models
+from models import (Base, User, FlashcardSet, Flashcard, Test, TestResult,
+                   Timetable, Target, UserTitle, Class, ClassMember, UserStats)
+from hashing import EMPTY_DIGEST, add_to_digest, card_hash_key, set_hash_key
+from stats import add_score
+import migrations
+
+DEFAULT_DATABASE = 'database/loadtest.db'
+DEFAULT_PASSWORD = 'Password123'
+BATCH_SIZE = 5000  # rows per executemany
+
+WORDS = (
+    'algorithm queue heap merge sort graph tree node edge vector matrix cell '
+    'protein enzyme osmosis mitosis photosynthesis respiration atom molecule '
+    'bond energy force velocity momentum wave frequency circuit voltage '
+    'revolution empire treaty parliament monarchy democracy economy trade '
+    'poem metaphor sonnet narrator theme verb noun clause tense derivative '
+    'integral limit function equation variable theorem proof probability'
+).split()
+FOLDERS = ['General', 'Maths', 'Biology', 'Chemistry', 'Physics', 'History',
+           'English', 'Computer Science', 'Geography', 'Languages']
+# Most cards are low priority; a few are marked as hard
+PRIORITY_WEIGHTS = {1: 50, 2: 30, 3: 12, 4: 6, 5: 2}
+
+def sentence(rng, min_words, max_words):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words)))
+
+def insert_batches(conn, table, rows):
+    """Insert rows with executemany in fixed-size batches"""
+    for start in range(0, len(rows), BATCH_SIZE):
+        conn.execute(table.insert(), rows[start:start + BATCH_SIZE])
+
+def generate(database=DEFAULT_DATABASE, users=100, sets_per_user=10,
+             cards_per_set=50, classes=10, weeks=4, tests_per_user=20, seed=42):
+    """Create a fresh database filled with reproducible synthetic data"""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    this_monday = (now - timedelta(days=now.weekday())).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    priorities = list(PRIORITY_WEIGHTS)
+    weights = list(PRIORITY_WEIGHTS.values())
+
+    os.makedirs(os.path.dirname(database) or '.', exist_ok=True)
+    engine = create_engine(f'sqlite:///{database}')
+    Base.metadata.drop_all(engine)
+    with engine.begin() as conn:
+        migrations.upgrade(conn)
+
+    # bcrypt is deliberately slow, so every synthetic user shares one hash
+    password = bcrypt.hashpw(DEFAULT_PASSWORD.encode('utf-8'), bcrypt.gensalt())
+
+    # Ids are assigned here so related rows can be built without reading back
+    user_rows, title_rows = [], []
+    for user_id in range(1, users + 1):
+        user_rows.append({
+            'id': user_id,
+            'username': f'user{user_id}',
+            'password': password,
+            'email': f'user{user_id}@example.com',
+            'xp': rng.randint(0, 20000),
+            'created_at': now - timedelta(days=rng.randint(0, 365))
+        })
+        title_rows.append({'user_id': user_id, 'title': 'Beginner', 'earned_at': now})
+
+    set_rows, card_rows = [], []
+    card_id = 0
+    for user_id in range(1, users + 1):
+        for n in range(sets_per_user):
+            set_id = len(set_rows) + 1
+            name = f'{sentence(rng, 1, 3).title()} {n + 1}'
+            set_rows.append({
+                'id': set_id,
+                'user_id': user_id,
+                'name': name,
+                'description': sentence(rng, 3, 10),
+                'folder': rng.choice(FOLDERS),
+                'priority': rng.choices(priorities, weights)[0],
+                'created_at': now - timedelta(minutes=rng.randint(0, 525600))
+            })
+            cards_digest = EMPTY_DIGEST
+            for _ in range(cards_per_set):
+                card_id += 1
+                front = sentence(rng, 3, 12) + '?'
+                back = sentence(rng, 5, 40)
+                hash_key = card_hash_key(front, back)
+                cards_digest = add_to_digest(cards_digest, hash_key)
+                card_rows.append({
+                    'id': card_id,
+                    'set_id': set_id,
+                    'front': front,
+                    'back': back,
+                    'priority': rng.choices(priorities, weights)[0],
+                    'hash_key': hash_key,
+                    'incorrect_count': min(int(rng.expovariate(0.7)), 20),
+                    'last_reviewed': (now - timedelta(hours=rng.randint(1, 24 * 60))
+                                      if rng.random() < 0.8 else None)
+                })
+            set_rows[-1]['cards_digest'] = cards_digest
+            set_rows[-1]['hash_key'] = set_hash_key(cards_digest)
+
+    timetable_rows, target_rows = [], []
+    for user_id in range(1, users + 1):
+        for week in range(weeks):
+            timetable_id = len(timetable_rows) + 1
+            week_start = this_monday - timedelta(weeks=week)
+            timetable_rows.append({
+                'id': timetable_id,
+                'user_id': user_id,
+                'week_start': week_start,
+                'created_at': week_start
+            })
+            for day in range(7):
+                max_targets = 5 if day >= 5 else 3  # 5 for weekends, 3 for weekdays
+                for _ in range(rng.randint(0, max_targets)):
+                    completed = week > 0 and rng.random() < 0.7
+                    target_rows.append({
+                        'timetable_id': timetable_id,
+                        'day': day,
+                        'description': f'Review {sentence(rng, 1, 4)}',
+                        'completed': completed,
+                        'completed_at': week_start + timedelta(days=day) if completed else None
+                    })
+
+    test_rows, result_rows, stats_rows = [], [], []
+    for user_id in range(1, users + 1):
+        taken = sorted(now - timedelta(minutes=rng.randint(0, 60 * 24 * 90))
+                       for _ in range(tests_per_user))
+        stats = {'user_id': user_id, 'test_count': 0, 'mean_score': 0.0,
+                 'recent_scores': '[]', 'daily_xp': 0}
+        for taken_at in taken:
+            test_id = len(test_rows) + 1
+            test_rows.append({
+                'id': test_id,
+                'user_id': user_id,
+                'name': f'Test {test_id}',
+                'description': 'Synthetic test',
+                'created_at': taken_at
+            })
+            score = round(min(100.0, max(0.0, rng.gauss(70, 15))), 1)
+            result_rows.append({
+                'test_id': test_id,
+                'user_id': user_id,
+                'score': score,
+                'duration': rng.randint(60, 1800),
+                'completed_at': taken_at
+            })
+            stats.update(add_score(stats['test_count'], stats['mean_score'],
+                                   stats['recent_scores'], score, taken_at))
+        stats_rows.append(stats)
+
+    class_rows, member_rows = [], []
+    for class_id in range(1, min(classes, users) + 1):
+        leader_id = rng.randint(1, users)
+        class_rows.append({
+            'id': class_id,
+            'name': f'Class {class_id}',
+            'code': f'{class_id:06X}',
+            'leader_id': leader_id,
+            'created_at': now - timedelta(days=rng.randint(0, 180))
+        })
+        members = {leader_id} | set(rng.sample(range(1, users + 1), min(users, 30)))
+        for user_id in sorted(members):
+            member_rows.append({'class_id': class_id, 'user_id': user_id, 'created_at': now})
+
+    with engine.begin() as conn:
+        for table, rows in [
+            (User.__table__, user_rows),
+            (UserTitle.__table__, title_rows),
+            (FlashcardSet.__table__, set_rows),
+            (Flashcard.__table__, card_rows),
+            (Timetable.__table__, timetable_rows),
+            (Target.__table__, target_rows),
+            (Test.__table__, test_rows),
+            (TestResult.__table__, result_rows),
+            (UserStats.__table__, stats_rows),
+            (Class.__table__, class_rows),
+            (ClassMember.__table__, member_rows),
+        ]:
+            insert_batches(conn, table, rows)
+
+    return {
+        'users': len(user_rows),
+        'sets': len(set_rows),
+        'cards': len(card_rows),
+        'timetables': len(timetable_rows),
+        'targets': len(target_rows),
+        'tests': len(test_rows),
+        'classes': len(class_rows),
+        'class_members': len(member_rows),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic database for load testing')
+    parser.add_argument('--database', default=DEFAULT_DATABASE)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--sets-per-user', type=int, default=10)
+    parser.add_argument('--cards-per-set', type=int, default=50)
+    parser.add_argument('--classes', type=int, default=10)
+    parser.add_argument('--weeks', type=int, default=4)
+    parser.add_argument('--tests-per-user', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = generate(
+        database=args.database,
+        users=args.users,
+        sets_per_user=args.sets_per_user,
+        cards_per_set=args.cards_per_set,
+        classes=args.classes,
+        weeks=args.weeks,
+        tests_per_user=args.tests_per_user,
+        seed=args.seed
+    )
+    elapsed = time.perf_counter() - start
+    print(f"Generated {args.database} in {elapsed:.1f}s")
+    for table, count in counts.items():
+        print(f"  {table}: {count}")
+
+if __name__ == '__main__':
+    main()
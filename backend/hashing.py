@@ -0,0 +1,44 @@
+import hashlib
+
+def generate_hash_key(prefix, *args):
+    """Deterministic hash key for database objects: equal arguments, equal key"""
+    data = '\x1f'.join([prefix, *(str(arg) for arg in args)])
+    return hashlib.sha256(data.encode()).hexdigest()
+
+def card_hash_key(front, back):
+    """Content hash of a card; identical cards share it in whatever set they are"""
+    return generate_hash_key('card', front, back)
+
+def set_hash_key(cards_digest):
+    """Content hash of a set, which follows from the cards it holds"""
+    return generate_hash_key('set', cards_digest)
+
+# A set's cards digest is the sum of its card hash_keys modulo 2**256. Adding
+# or removing a card updates it in O(1) without reading the other cards, and
+# the result does not depend on card order.
+DIGEST_MODULUS = 2 ** 256
+EMPTY_DIGEST = '0' * 64
+
+def add_to_digest(digest, *hash_keys):
+    """Return digest with the given card hash keys added"""
+    value = int(digest, 16)
+    for key in hash_keys:
+        value += int(key, 16)
+    return format(value % DIGEST_MODULUS, '064x')
+
+def remove_from_digest(digest, *hash_keys):
+    """Return digest with the given card hash keys removed"""
+    value = int(digest, 16)
+    for key in hash_keys:
+        value -= int(key, 16)
+    return format(value % DIGEST_MODULUS, '064x')
+
+def set_etag(flashcard_set):
+    """Entity tag for a set: changes with every write to the set or its cards
+
+    The digest only covers card content, so the set's version is tagged too;
+    it also moves when a card's difficulty or id changes.
+    """
+    data = (f"{flashcard_set.name}:{flashcard_set.folder}:"
+            f"{flashcard_set.cards_digest}:{flashcard_set.version}")
+    return hashlib.sha256(data.encode()).hexdigest()[:32]
@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+from quart import Response
+from sqlalchemy import select, delete
+
+from models import IdempotencyKey
+
+KEY_TTL = timedelta(days=30)  # how long after the first attempt a request can be sent again
+MAX_KEY_LENGTH = 64
+
+# Requests that create something take an optional idempotency_key, a random
+# string the client picks once and sends with every attempt. The reply is
+# stored in the same transaction as the work, so an attempt whose reply was
+# lost (a read timeout, say) leaves either nothing or both behind, and a
+# later attempt is answered from the store instead of doing the work again.
+
+def valid_key(key):
+    return key is None or (isinstance(key, str) and 0 < len(key) <= MAX_KEY_LENGTH)
+
+async def replay(session, user_id, key):
+    """The stored reply to an earlier attempt with key, or None"""
+    if key is None:
+        return None
+    stored = await session.scalar(
+        select(IdempotencyKey)
+        .where(IdempotencyKey.user_id == user_id)
+        .where(IdempotencyKey.key == key)
+        .where(IdempotencyKey.created_at >= datetime.utcnow() - KEY_TTL)
+    )
+    if stored is None:
+        return None
+    return Response(stored.response, status=stored.status_code, mimetype='application/json')
+
+async def remember(session, user_id, key, response):
+    """Store response as the reply to key; call before the work commits"""
+    if key is None:
+        return
+    now = datetime.utcnow()
+    # The user's expired keys go first, so a reused key starts afresh
+    await session.execute(
+        delete(IdempotencyKey)
+        .where(IdempotencyKey.user_id == user_id)
+        .where(IdempotencyKey.created_at < now - KEY_TTL)
+    )
+    session.add(IdempotencyKey(
+        user_id=user_id,
+        key=key,
+        status_code=response.status_code,
+        response=await response.get_data(as_text=True),
+        created_at=now
+    ))
@@ -0,0 +1,172 @@
+import asyncio
+import csv
+import itertools
+import json
+import uuid
+from collections import OrderedDict
+
+FORMATS = ('csv', 'tsv', 'jsonl')
+CONTENT_TYPES = {
+    'text/csv': 'csv',
+    'text/tab-separated-values': 'tsv',
+    'application/jsonl': 'jsonl',
+    'application/x-ndjson': 'jsonl',
+}
+COLUMNS = ('front', 'back', 'difficulty')  # column order when there is no header row
+DIFFICULTIES = ('easy', 'medium', 'hard')
+MAX_FIELD_LENGTH = 1000  # matches the front/back column size
+MAX_RECORD_LENGTH = 64 * 1024  # a longer field is an unterminated quote, not a card
+RECORD_BATCH_SIZE = 500  # rows parsed per trip to the worker thread
+MAX_REPORTED_ERRORS = 100  # row errors kept per import; the rest are only counted
+MAX_FINISHED_IMPORTS = 100  # finished imports kept around for progress lookups
+
+# Process-wide, but nothing else here reads CSV with longer fields
+csv.field_size_limit(MAX_RECORD_LENGTH)
+
+class RowError(ValueError):
+    """A row that could not be turned into a card"""
+
+def detect_format(fmt, content_type):
+    """Upload format from the format parameter, falling back to the Content-Type"""
+    if fmt:
+        fmt = fmt.lower()
+        return fmt if fmt in FORMATS else None
+    mimetype = (content_type or '').split(';')[0].strip().lower()
+    return CONTENT_TYPES.get(mimetype)
+
+def read_records(f, fmt):
+    """Yield (line number, card dict or RowError) for every row of a text file
+
+    CSV and TSV rows are front, back and an optional difficulty, with an
+    optional header row naming the columns; csv.reader handles quoted
+    fields spanning lines, and a quote inside an unquoted field is just a
+    character. JSONL rows are objects with the same keys. Blank lines are
+    skipped. f is opened with newline=''.
+    """
+    if fmt == 'jsonl':
+        for line_no, line in enumerate(f, 1):
+            if line.strip():
+                yield line_no, catch_row_error(parse_json, line)
+        return
+    reader = csv.reader(f, 'excel-tab' if fmt == 'tsv' else 'excel')
+    columns = None
+    start = 1  # line the next record starts on
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error:
+            # An unterminated quote ran past MAX_RECORD_LENGTH; carry on after it
+            yield start, RowError('Unterminated quoted field')
+            start = reader.line_num + 1
+            continue
+        line_no, start = start, reader.line_num + 1
+        if not any(cell.strip() for cell in row):
+            continue
+        if columns is None:
+            columns = header_columns(row)
+            if columns:
+                continue
+            columns = COLUMNS
+        yield line_no, catch_row_error(parse_row, row, columns)
+
+async def iter_records(path, fmt):
+    """read_records() over the file at path, read in a worker thread in batches"""
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        records = read_records(f, fmt)
+        while batch := await asyncio.to_thread(list, itertools.islice(records, RECORD_BATCH_SIZE)):
+            for record in batch:
+                yield record
+
+def catch_row_error(parse, *args):
+    try:
+        return parse(*args)
+    except RowError as e:
+        return e
+
+def header_columns(row):
+    """Column names if row is a header naming the front and back columns"""
+    names = tuple(cell.strip().lower() for cell in row)
+    if 'front' in names and 'back' in names:
+        return names
+    return None
+
+def parse_row(row, columns):
+    return validate_card(dict(zip(columns, row)))
+
+def parse_json(line):
+    try:
+        data = json.loads(line)
+    except ValueError as e:
+        raise RowError(f'Invalid JSON: {e}')
+    if not isinstance(data, dict):
+        raise RowError('Expected a JSON object')
+    return validate_card(data)
+
+def validate_card(data):
+    """Card fields from a parsed row, or RowError if they are unusable"""
+    card = {}
+    for field in ('front', 'back'):
+        value = data.get(field)
+        if not isinstance(value, str) or not value.strip():
+            raise RowError(f'Missing {field}')
+        if len(value) > MAX_FIELD_LENGTH:
+            raise RowError(f'{field.capitalize()} is longer than {MAX_FIELD_LENGTH} characters')
+        card[field] = value.strip()
+    difficulty = data.get('difficulty') or 'medium'
+    if not isinstance(difficulty, str) or difficulty.strip().lower() not in DIFFICULTIES:
+        raise RowError(f'Difficulty must be one of {", ".join(DIFFICULTIES)}')
+    card['difficulty'] = difficulty.strip().lower()
+    return card
+
+class ImportProgress:
+    """Progress of imports, so a client can poll while its upload runs
+
+    Running imports are always kept; finished ones are forgotten oldest
+    first once there are more than MAX_FINISHED_IMPORTS of them.
+    """
+    def __init__(self, max_finished=MAX_FINISHED_IMPORTS):
+        self.max_finished = max_finished
+        self._imports = OrderedDict()  # import id -> status dict
+
+    def start(self, user_id, import_id=None):
+        import_id = import_id or uuid.uuid4().hex
+        status = {
+            'id': import_id,
+            'user_id': user_id,
+            'state': 'running',
+            'set_id': None,
+            'rows': 0,
+            'imported': 0,
+            'duplicates': 0,
+            'error_count': 0,
+            'errors': [],
+            'message': None,
+        }
+        self._imports[import_id] = status
+        return status
+
+    def valid_id(self, import_id):
+        """Whether a client-chosen import id (None for a generated one) can be used"""
+        if import_id is None:
+            return True
+        return (0 < len(import_id) <= 32 and import_id.isalnum()
+                and import_id not in self._imports)
+
+    def get(self, import_id):
+        return self._imports.get(import_id)
+
+    def add_error(self, status, line_no, error):
+        status['error_count'] += 1
+        if len(status['errors']) < MAX_REPORTED_ERRORS:
+            status['errors'].append({'line': line_no, 'message': str(error)})
+
+    def finish(self, status, state, message=None):
+        status['state'] = state
+        status['message'] = message
+        finished = [k for k, s in self._imports.items() if s['state'] != 'running']
+        for import_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._imports[import_id]
+
+imports = ImportProgress()
@@ -2,24 +2,20 @@ from sqlalchemy import create_engine
 from sqlalchemy.sql import text
 from datetime import datetime, timedelta
 import bcrypt
-import hashlib
 import os
+from hashing import EMPTY_DIGEST, add_to_digest, card_hash_key, set_hash_key
+import migrations
 
 # Import models
 from models import (Base, User, FlashcardSet, Flashcard, Test,
                    TestQuestion, TestResult, Timetable, Target, UserTitle)
 
-def generate_hash_key(prefix, *args):
-    """Generate a hash key for database objects"""
-    timestamp = datetime.utcnow().timestamp()
-    data = f"{prefix}:{':'.join(str(arg) for arg in args)}:{timestamp}"
-    return hashlib.sha256(data.encode()).hexdigest()
-
 def init_db():
     # Use relative path from current directory
     engine = create_engine('sqlite:///database/rafifi.db')
     Base.metadata.drop_all(engine)  # Drop all tables first
-    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        migrations.upgrade(conn)  # Fresh schema, stamped with the latest revision
     
     # Create sample data
     with engine.connect() as conn:
@@ -52,7 +48,6 @@ def init_db():
         )
         
         # Create sample flashcard set
-        set_hash = generate_hash_key('set', user_id, 'Sample Set')
         conn.execute(
             FlashcardSet.__table__.insert(),
             {
@@ -61,7 +56,7 @@ def init_db():
                 'description': 'A sample flashcard set',
                 'folder': 'General',
                 'priority': 1,
-                'hash_key': set_hash,
+                'hash_key': set_hash_key(EMPTY_DIGEST),
                 'created_at': datetime.utcnow()
             }
         )
@@ -71,28 +66,34 @@ def init_db():
         set_id = result.scalar()
         
         # Create sample flashcards
+        cards = [
+            {
+                'set_id': set_id,
+                'front': 'What is a Priority Queue?',
+                'back': 'A data structure where elements have priorities and higher priority elements are served first',
+                'priority': 3,
+                'incorrect_count': 0,
+                'last_reviewed': datetime.utcnow() - timedelta(days=7)
+            },
+            {
+                'set_id': set_id,
+                'front': 'What is Merge Sort?',
+                'back': 'A divide-and-conquer sorting algorithm with O(n log n) time complexity',
+                'priority': 2,
+                'incorrect_count': 0,
+                'last_reviewed': datetime.utcnow() - timedelta(days=3)
+            }
+        ]
+        for card in cards:
+            card['hash_key'] = card_hash_key(card['front'], card['back'])
+        conn.execute(Flashcard.__table__.insert(), cards)
+        
+        # Keep the set's ETag digest and content hash in line with its cards
+        cards_digest = add_to_digest(EMPTY_DIGEST, *(c['hash_key'] for c in cards))
         conn.execute(
-            Flashcard.__table__.insert(),
-            [
-                {
-                    'set_id': set_id,
-                    'front': 'What is a Priority Queue?',
-                    'back': 'A data structure where elements have priorities and higher priority elements are served first',
-                    'priority': 3,
-                    'hash_key': generate_hash_key('card', set_id, 'Priority Queue'),
-                    'incorrect_count': 0,
-                    'last_reviewed': datetime.utcnow() - timedelta(days=7)
-                },
-                {
-                    'set_id': set_id,
-                    'front': 'What is Merge Sort?',
-                    'back': 'A divide-and-conquer sorting algorithm with O(n log n) time complexity',
-                    'priority': 2,
-                    'hash_key': generate_hash_key('card', set_id, 'Merge Sort'),
-                    'incorrect_count': 0,
-                    'last_reviewed': datetime.utcnow() - timedelta(days=3)
-                }
-            ]
+            FlashcardSet.__table__.update()
+            .where(FlashcardSet.__table__.c.id == set_id)
+            .values(cards_digest=cards_digest, hash_key=set_hash_key(cards_digest))
         )
         
         # Create sample test
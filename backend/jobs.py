@@ -0,0 +1,209 @@
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, delete, func, event
+
+from database import db
+from models import Job
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 1.0  # seconds between looks for due jobs when nothing wakes the runner
+MAX_CONCURRENT_JOBS = 4  # jobs running at once, over all kinds
+DEFAULT_MAX_ATTEMPTS = 5
+RETRY_DELAY = 2  # seconds before the first retry; doubles with every attempt
+MAX_RETRY_DELAY = 300  # seconds
+KEEP_DONE = timedelta(days=1)  # how long finished jobs stay in the table
+PRUNE_INTERVAL = 3600  # seconds between deletions of old finished jobs
+
+class JobQueue:
+    """In-process runner for work a request does not have to wait for
+
+    Handlers enqueue jobs in their own session, so a job exists exactly when
+    the request's changes are committed, and it survives a restart. A runner
+    task claims due jobs and runs at most `concurrency` of them at a time,
+    fewer for kinds registered with a lower limit. Each job runs in a new
+    session that also marks it done, so its work is committed once or not at
+    all. Failed jobs are retried with exponential backoff until they run out
+    of attempts; jobs left running by a stopped server are run again.
+    """
+    def __init__(self, concurrency=MAX_CONCURRENT_JOBS, poll_interval=POLL_INTERVAL):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._handlers = {}  # kind -> (coroutine function, concurrency limit)
+        self._running = {}  # asyncio task -> job kind
+        self._wake = None
+        self._runner = None
+        self._last_prune = 0.0
+
+    def handler(self, kind, concurrency=None):
+        """Register a coroutine function(session, **payload) for a job kind"""
+        def register(func):
+            self._handlers[kind] = (func, concurrency or self.concurrency)
+            return func
+        return register
+
+    def enqueue(self, session, kind, delay=0, max_attempts=DEFAULT_MAX_ATTEMPTS, **payload):
+        """Add a job to session; it runs after the session commits
+
+        The payload is passed to the handler as keyword arguments and has
+        to be JSON serialisable.
+        """
+        if kind not in self._handlers:
+            raise ValueError(f'No handler registered for job kind {kind!r}')
+        job = Job(
+            kind=kind,
+            payload=json.dumps(payload),
+            max_attempts=max_attempts,
+            run_at=datetime.utcnow() + timedelta(seconds=delay)
+        )
+        session.add(job)
+        # Start the job as soon as it is committed rather than at the next poll
+        event.listen(session.sync_session, 'after_commit', self._notify, once=True)
+        return job
+
+    def _notify(self, *args):
+        if self._wake is not None:
+            self._wake.set()
+
+    async def start(self):
+        self._wake = asyncio.Event()
+        async with db.session() as session:
+            # Nothing is running yet, so these were cut off by the last shutdown
+            result = await session.execute(
+                update(Job).where(Job.state == 'running').values(state='pending')
+            )
+            if result.rowcount:
+                logger.info(f"Requeued {result.rowcount} interrupted jobs")
+        self._runner = asyncio.create_task(self._run())
+        logger.info(f"Job runner started ({self.concurrency} at a time)")
+
+    async def stop(self):
+        tasks = [self._runner, *self._running] if self._runner else list(self._running)
+        for task in tasks:
+            task.cancel()
+        # Cancelled jobs roll back and are run again on the next start
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._runner = None
+        self._wake = None
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            try:
+                if time.monotonic() - self._last_prune > PRUNE_INTERVAL:
+                    await self._prune()
+                for job_id, kind, payload, attempts, max_attempts in await self._claim():
+                    task = asyncio.create_task(
+                        self._execute(job_id, kind, payload, attempts, max_attempts))
+                    self._running[task] = kind
+                    task.add_done_callback(self._finished)
+            except Exception:
+                logger.exception("Could not claim jobs")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def _finished(self, task):
+        self._running.pop(task, None)
+        self._notify()  # A slot is free
+
+    def _busy(self, kind):
+        return sum(1 for running in self._running.values() if running == kind)
+
+    async def _claim(self):
+        """Mark up to the free number of due jobs as running and return them"""
+        free = self.concurrency - len(self._running)
+        if free <= 0:
+            return []
+        busy = {kind: self._busy(kind) for kind in self._handlers}
+        full = [kind for kind, (_, limit) in self._handlers.items() if busy[kind] >= limit]
+        query = (
+            select(Job)
+            .where(Job.state == 'pending')
+            .where(Job.run_at <= datetime.utcnow())
+            .order_by(Job.run_at, Job.id)
+            .limit(free)
+        )
+        if full:
+            query = query.where(Job.kind.not_in(full))
+        claimed = []
+        async with db.session() as session:
+            for job in (await session.execute(query)).scalars():
+                if job.kind in self._handlers:
+                    # Leave jobs beyond their kind's limit for a later round
+                    if busy[job.kind] >= self._handlers[job.kind][1]:
+                        continue
+                    busy[job.kind] += 1
+                job.state = 'running'
+                job.attempts += 1
+                claimed.append((job.id, job.kind, job.payload, job.attempts, job.max_attempts))
+        return claimed
+
+    async def _execute(self, job_id, kind, payload, attempts, max_attempts):
+        if kind not in self._handlers:
+            # Retrying cannot help a kind this server has no handler for
+            await self._failed(job_id, max_attempts, max_attempts,
+                               LookupError(f'No handler registered for job kind {kind!r}'))
+            return
+        func, _ = self._handlers[kind]
+        try:
+            async with db.session() as session:
+                await func(session, **json.loads(payload))
+                await session.execute(
+                    update(Job).where(Job.id == job_id)
+                    .values(state='done', last_error=None, finished_at=datetime.utcnow())
+                )
+        except Exception as e:
+            logger.exception(f"Job {job_id} ({kind}) failed on attempt {attempts}")
+            await self._failed(job_id, attempts, max_attempts, e)
+
+    async def _failed(self, job_id, attempts, max_attempts, error):
+        values = {'last_error': f'{type(error).__name__}: {error}'[:1000]}
+        if attempts >= max_attempts:
+            values.update(state='failed', finished_at=datetime.utcnow())
+        else:
+            delay = min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+            values.update(state='pending', run_at=datetime.utcnow() + timedelta(seconds=delay))
+        async with db.session() as session:
+            await session.execute(update(Job).where(Job.id == job_id).values(**values))
+
+    async def _prune(self):
+        self._last_prune = time.monotonic()
+        async with db.session() as session:
+            await session.execute(
+                delete(Job)
+                .where(Job.state == 'done')
+                .where(Job.finished_at < datetime.utcnow() - KEEP_DONE)
+            )
+
+    async def stats(self):
+        async with db.session() as session:
+            counts = dict((await session.execute(
+                select(Job.state, func.count()).group_by(Job.state)
+            )).all())
+            failed = (await session.execute(
+                select(Job)
+                .where(Job.state == 'failed')
+                .order_by(Job.finished_at.desc())
+                .limit(10)
+            )).scalars().all()
+        return {
+            'counts': counts,
+            'running_here': len(self._running),
+            'concurrency': self.concurrency,
+            'recent_failures': [{
+                'id': job.id,
+                'kind': job.kind,
+                'attempts': job.attempts,
+                'error': job.last_error,
+                'finished_at': job.finished_at.isoformat() if job.finished_at else None
+            } for job in failed],
+        }
+
+# Global queue instance
+jobs = JobQueue()
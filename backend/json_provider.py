@@ -0,0 +1,61 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from quart.json.provider import DefaultJSONProvider
+
+# orjson is optional; without it responses use the stdlib encoder
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _default(o):
+    """Encode the types our routes return that JSON has no native form for"""
+    # datetimes are ISO 8601, matching what the clients parse with fromisoformat
+    if isinstance(o, (datetime, date)):
+        return o.isoformat()
+    if isinstance(o, (set, frozenset)):
+        return list(o)
+    if isinstance(o, Decimal):
+        return str(o)
+    raise TypeError(f'Object of type {type(o).__name__} is not JSON serializable')
+
+if orjson is not None:
+    # Non-string keys (e.g. day numbers in timetables) become strings as in the stdlib
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps_bytes(obj) -> bytes:
+        """Serialize obj to compact UTF-8 JSON"""
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+
+    def loads(s):
+        return orjson.loads(s)
+else:
+    _encoder = json.JSONEncoder(default=_default, separators=(',', ':'), ensure_ascii=False)
+
+    def dumps_bytes(obj) -> bytes:
+        """Serialize obj to compact UTF-8 JSON"""
+        return _encoder.encode(obj).encode('utf-8')
+
+    def loads(s):
+        return json.loads(s)
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider using orjson when available, with ISO 8601 datetimes"""
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            # Formatting options such as indent are only supported by the stdlib
+            kwargs.setdefault('default', _default)
+            return json.dumps(obj, **kwargs)
+        return dumps_bytes(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return json.loads(s, **kwargs)
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        # Build the body as bytes directly instead of going through a str
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj), mimetype=self.mimetype)
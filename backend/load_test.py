@@ -0,0 +1,172 @@
+import argparse
+import asyncio
+import os
+import random
+import time
+from collections import defaultdict
+
+DEFAULT_DATABASE = 'database/loadtest.db'
+DEFAULT_PASSWORD = 'Password123'  # Matches generate_data.DEFAULT_PASSWORD
+
+# Relative weights of each user scenario in the traffic mix
+SCENARIOS = {
+    'study': 35,
+    'test': 20,
+    'timetable': 20,
+    'leaderboard': 15,
+    'progress': 10,
+}
+
+class Stats:
+    """Latency samples and error counts grouped by endpoint"""
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, endpoint, seconds, status):
+        self.latencies[endpoint].append(seconds)
+        if status >= 400:
+            self.errors[endpoint] += 1
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+class VirtualUser:
+    def __init__(self, client, stats, rng, username):
+        self.client = client
+        self.stats = stats
+        self.rng = rng
+        self.username = username
+        self.headers = {}
+        self.set_ids = []
+        self.class_ids = []
+
+    async def request(self, method, path, endpoint, **kwargs):
+        """Send a request and record its latency under the endpoint template"""
+        start = time.perf_counter()
+        response = await self.client.open(path, method=method, headers=self.headers, **kwargs)
+        await response.get_data()
+        self.stats.record(f'{method} {endpoint}', time.perf_counter() - start, response.status_code)
+        return response
+
+    async def login(self):
+        response = await self.client.post(
+            '/auth/login', json={'username': self.username, 'password': DEFAULT_PASSWORD}
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f'Login failed for {self.username}: {response.status_code}')
+        data = await response.get_json()
+        self.headers = {'Authorization': f"Bearer {data['token']}"}
+
+        # A user who cannot list their sets or classes would skip most scenarios
+        self.set_ids = [s['id'] for s in await self.setup_get('/flashcard/sets')]
+        self.class_ids = [c['id'] for c in await self.setup_get('/class/')]
+
+    async def setup_get(self, path):
+        response = await self.client.get(path, headers=self.headers)
+        if response.status_code != 200:
+            raise RuntimeError(f'GET {path} failed for {self.username}: {response.status_code}')
+        return await response.get_json()
+
+    async def study(self):
+        await self.request('GET', '/flashcard/sets', '/flashcard/sets')
+        if self.set_ids:
+            set_id = self.rng.choice(self.set_ids)
+            await self.request('GET', f'/flashcard/sets/{set_id}', '/flashcard/sets/<id>')
+
+    async def test(self):
+        if not self.set_ids:
+            return
+        set_id = self.rng.choice(self.set_ids)
+        await self.request('GET', f'/flashcard/sets/{set_id}/cards', '/flashcard/sets/<id>/cards')
+        await self.request(
+            'POST', f'/flashcard/sets/{set_id}/test', '/flashcard/sets/<id>/test',
+            json={'score': round(self.rng.uniform(30, 100), 1), 'duration': self.rng.randint(60, 900)}
+        )
+
+    async def timetable(self):
+        await self.request('GET', '/timetable/current', '/timetable/current')
+        await self.request('GET', '/timetable/history', '/timetable/history')
+
+    async def leaderboard(self):
+        await self.request('GET', '/class/', '/class/')
+        if self.class_ids:
+            class_id = self.rng.choice(self.class_ids)
+            await self.request('GET', f'/class/{class_id}/members', '/class/<id>/members')
+
+    async def progress(self):
+        await self.request('GET', '/user/profile', '/user/profile')
+        await self.request('GET', '/user/titles', '/user/titles')
+        await self.request('GET', '/user/tests', '/user/tests')
+
+    async def run(self, deadline, think_time):
+        names = list(SCENARIOS)
+        weights = list(SCENARIOS.values())
+        while time.perf_counter() < deadline:
+            scenario = self.rng.choices(names, weights)[0]
+            await getattr(self, scenario)()
+            if think_time:
+                await asyncio.sleep(self.rng.uniform(0, think_time))
+
+async def run_load_test(users, duration, think_time, user_count, seed):
+    # Imported late so the environment configures the database first
+    from app import app
+
+    stats = Stats()
+    rng = random.Random(seed)
+    async with app.test_app() as test_app:
+        client = test_app.test_client()
+        vusers = [
+            VirtualUser(client, stats, random.Random(rng.random()),
+                        f'user{rng.randint(1, user_count)}')
+            for _ in range(users)
+        ]
+        # Logins hit bcrypt, so they happen before measurement starts
+        await asyncio.gather(*(v.login() for v in vusers))
+
+        start = time.perf_counter()
+        deadline = start + duration
+        await asyncio.gather(*(v.run(deadline, think_time) for v in vusers))
+        elapsed = time.perf_counter() - start
+
+    return stats, elapsed
+
+def print_report(stats, elapsed):
+    total = sum(len(v) for v in stats.latencies.values())
+    print(f"\n{total} requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s)\n")
+    header = f"{'endpoint':<40}{'count':>8}{'err':>6}{'req/s':>9}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}"
+    print(header)
+    print('-' * len(header))
+    for endpoint in sorted(stats.latencies):
+        values = sorted(stats.latencies[endpoint])
+        ms = [percentile(values, p) * 1000 for p in (50, 90, 99, 100)]
+        print(f"{endpoint:<40}{len(values):>8}{stats.errors[endpoint]:>6}"
+              f"{len(values) / elapsed:>9.1f}" + ''.join(f"{v:>9.1f}" for v in ms))
+    print('\nLatencies in milliseconds')
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a realistic traffic mix against the app in-process')
+    parser.add_argument('--database', default=DEFAULT_DATABASE,
+                        help='database created by generate_data.py')
+    parser.add_argument('--users', type=int, default=20, help='concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=30, help='seconds to run')
+    parser.add_argument('--think-time', type=float, default=0.0,
+                        help='maximum random pause between scenarios, in seconds')
+    parser.add_argument('--user-count', type=int, default=100,
+                        help='number of users in the generated database')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    os.environ['RAFIFI_DATABASE_URL'] = f'sqlite+aiosqlite:///{args.database}'
+    os.environ['RAFIFI_SQL_ECHO'] = '0'
+
+    stats, elapsed = asyncio.run(run_load_test(
+        args.users, args.duration, args.think_time, args.user_count, args.seed
+    ))
+    print_report(stats, elapsed)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Heartbeat period and how late a heartbeat may be before it counts as a stall
+CHECK_INTERVAL = 0.05  # seconds
+STALL_THRESHOLD = 0.2  # seconds
+MAX_STALLS_KEPT = 100
+
+class LoopMonitor:
+    """Watchdog that measures event-loop lag and reports what blocks the loop
+
+    A heartbeat coroutine on the loop records when it last ran. A separate
+    thread checks the heartbeat; when it is older than the threshold the loop
+    is blocked, so the thread grabs the loop thread's current stack and the
+    route of the task that is running on it.
+    """
+    def __init__(self, interval=CHECK_INTERVAL, threshold=STALL_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self.stalls = deque(maxlen=MAX_STALLS_KEPT)
+        self.max_lag = 0.0
+        self.avg_lag = 0.0
+        self._routes = {}  # asyncio task -> "METHOD /rule"
+        self._loop = None
+        self._loop_thread_id = None
+        self._last_beat = 0.0
+        self._heartbeat_task = None
+        self._watchdog = None
+        self._stopping = threading.Event()
+
+    def init_app(self, app):
+        """Register request tracking and start/stop hooks on the Quart app"""
+        from quart import request
+
+        @app.before_serving
+        async def _start_loop_monitor():
+            self.start()
+
+        @app.after_serving
+        async def _stop_loop_monitor():
+            await self.stop()
+
+        @app.before_request
+        async def _track_route():
+            rule = request.url_rule.rule if request.url_rule else request.path
+            self.track(asyncio.current_task(), f"{request.method} {rule}")
+
+        @app.teardown_request
+        async def _untrack_route(exc):
+            self.untrack(asyncio.current_task())
+
+    def track(self, task, route):
+        if task is not None:
+            self._routes[task] = route
+
+    def untrack(self, task):
+        self._routes.pop(task, None)
+
+    @property
+    def loop_thread_id(self):
+        return self._loop_thread_id
+
+    def current_route(self):
+        """Return the route of the task currently running on the loop, if any"""
+        if self._loop is None:
+            return None
+        # Read from another thread: asyncio keeps the running task in a plain dict
+        task = asyncio.current_task(self._loop)
+        return self._routes.get(task)
+
+    def loop_stack(self):
+        """Return the current stack frames of the loop thread (outermost first)"""
+        frame = sys._current_frames().get(self._loop_thread_id)
+        return traceback.extract_stack(frame) if frame else []
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopping.clear()
+        self._heartbeat_task = self._loop.create_task(self._heartbeat())
+        self._watchdog = threading.Thread(
+            target=self._watch, name='loop-watchdog', daemon=True
+        )
+        self._watchdog.start()
+        logger.info(f"Loop monitor started (threshold {self.threshold * 1000:.0f} ms)")
+
+    async def stop(self):
+        self._stopping.set()
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            try:
+                await self._heartbeat_task
+            except asyncio.CancelledError:
+                pass
+        if self._watchdog:
+            self._watchdog.join(timeout=1)
+        self._loop = None
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self.max_lag = max(self.max_lag, lag)
+            # Exponentially weighted moving average of scheduling lag
+            self.avg_lag = 0.9 * self.avg_lag + 0.1 * lag
+            self._last_beat = now
+
+    def _watch(self):
+        reported_beat = None
+        while not self._stopping.wait(self.interval):
+            beat = self._last_beat
+            blocked_for = time.monotonic() - beat
+            # Report each stall once, while the loop is still stuck in it
+            if blocked_for < self.threshold or beat == reported_beat:
+                continue
+            reported_beat = beat
+            self._report(blocked_for)
+
+    def _report(self, blocked_for):
+        route = self.current_route()
+        stack = self.loop_stack()
+        stall = {
+            'detected_at': datetime.utcnow().isoformat(),
+            'blocked_ms': round(blocked_for * 1000, 1),
+            'route': route,
+            'stack': traceback.format_list(stack),
+        }
+        self.stalls.append(stall)
+        logger.warning(
+            f"Event loop blocked for {stall['blocked_ms']} ms in {route or 'no request'}\n"
+            + ''.join(stall['stack'][-15:])
+        )
+
+    def stats(self):
+        return {
+            'avg_lag_ms': round(self.avg_lag * 1000, 2),
+            'max_lag_ms': round(self.max_lag * 1000, 2),
+            'stall_count': len(self.stalls),
+            'recent_stalls': list(self.stalls)[-10:],
+        }
+
+# Global monitor instance
+loop_monitor = LoopMonitor()
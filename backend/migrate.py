@@ -0,0 +1,30 @@
+import argparse
+import logging
+import time
+
+from sqlalchemy import create_engine
+
+import migrations
+
+DEFAULT_DATABASE = 'database/rafifi.db'
+
+def main():
+    parser = argparse.ArgumentParser(description='Upgrade a database to the latest schema revision')
+    parser.add_argument('--database', default=DEFAULT_DATABASE)
+    parser.add_argument('--status', action='store_true',
+                        help='only print the current and latest revision')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    engine = create_engine(f'sqlite:///{args.database}')
+    with engine.begin() as conn:
+        version = migrations.current_version(conn)
+        print(f'Database is at revision {version}, latest is {migrations.HEAD}')
+        if args.status:
+            return
+        start = time.perf_counter()
+        migrations.upgrade(conn)
+    print(f'Upgraded to revision {migrations.HEAD} in {time.perf_counter() - start:.1f}s')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Versioned schema migrations for the SQLite database
+
+The schema version lives in SQLite's user_version pragma. A new database is
+created from the models and stamped with the latest revision. An existing
+one gets any new tables from create_all(), then runs every migration in
+migrations/versions newer than its version, in order and in the caller's
+transaction, so a failed upgrade leaves the database as it was.
+
+A migration is a module named <revision>_<name>.py with an integer
+revision, a one-line description and upgrade(conn) taking a synchronous
+connection. create_all() never changes tables that exist, so every column
+added to a model needs a migration that adds it (see add_columns).
+"""
+import importlib
+import logging
+import pkgutil
+
+from sqlalchemy import inspect
+
+from models import Base
+
+logger = logging.getLogger(__name__)
+
+# Defined before the versions are loaded, since they import it
+def create_indexes(conn, *names):
+    """Create the named indexes as the models declare them, unless they exist"""
+    indexes = {index.name: index
+               for table in Base.metadata.tables.values()
+               for index in table.indexes}
+    for name in names:
+        indexes[name].create(conn, checkfirst=True)
+
+def add_columns(conn, table_name, *definitions):
+    """Add each column, given as 'name TYPE ...' SQL, unless the table has it
+
+    create_all() only makes missing tables, so a column added to a model
+    needs a migration calling this.
+    """
+    existing = {column['name'] for column in inspect(conn).get_columns(table_name)}
+    for definition in definitions:
+        if definition.split()[0] not in existing:
+            conn.exec_driver_sql(f'ALTER TABLE {table_name} ADD COLUMN {definition}')
+
+def load_migrations():
+    """Migration modules from migrations/versions, ordered by revision"""
+    package = importlib.import_module(f'{__name__}.versions')
+    modules = [importlib.import_module(f'{package.__name__}.{info.name}')
+               for info in pkgutil.iter_modules(package.__path__)]
+    return sorted(modules, key=lambda module: module.revision)
+
+MIGRATIONS = load_migrations()
+HEAD = MIGRATIONS[-1].revision if MIGRATIONS else 0
+
+def current_version(conn):
+    return conn.exec_driver_sql('PRAGMA user_version').scalar()
+
+def stamp(conn, version=HEAD):
+    conn.exec_driver_sql(f'PRAGMA user_version = {int(version)}')
+
+def upgrade(conn):
+    """Bring the database up to HEAD; async engines pass this to run_sync"""
+    fresh = not inspect(conn).get_table_names()
+    Base.metadata.create_all(conn)
+    if fresh:
+        stamp(conn)
+        logger.info(f"Created database schema at revision {HEAD}")
+        return
+    version = current_version(conn)
+    for migration in MIGRATIONS:
+        if migration.revision > version:
+            logger.info(f"Applying migration {migration.revision}: {migration.description}")
+            migration.upgrade(conn)
+            stamp(conn, migration.revision)
@@ -0,0 +1,19 @@
+from hashing import EMPTY_DIGEST
+from migrations import add_columns
+
+revision = 1
+description = 'Add the set digest and the card difficulty and creation time columns'
+
+def upgrade(conn):
+    # 0002 computes the real digests from the cards
+    add_columns(conn, 'flashcard_sets',
+                f"cards_digest VARCHAR(64) NOT NULL DEFAULT '{EMPTY_DIGEST}'")
+    add_columns(conn, 'flashcards',
+                "difficulty VARCHAR(10) DEFAULT 'medium'",
+                'created_at DATETIME')
+    # Cards made before this have no creation time; their set's is the best guess
+    conn.exec_driver_sql(
+        'UPDATE flashcards SET created_at = '
+        '(SELECT created_at FROM flashcard_sets WHERE flashcard_sets.id = flashcards.set_id) '
+        'WHERE created_at IS NULL'
+    )
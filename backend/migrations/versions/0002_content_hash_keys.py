@@ -0,0 +1,55 @@
+from collections import defaultdict
+
+from sqlalchemy import select, update, bindparam
+
+from models import Flashcard, FlashcardSet
+from hashing import DIGEST_MODULUS, card_hash_key, set_hash_key
+from migrations import create_indexes
+
+revision = 2
+description = 'Recompute card and set hash keys from content and index them'
+
+BATCH_SIZE = 5000  # cards read and updated per statement
+
+def upgrade(conn):
+    # Keys used to mix in a timestamp, so duplicate lookups would never match
+    create_indexes(conn, 'ix_flashcards_hash_key', 'ix_flashcard_sets_hash_key')
+    cards_table, sets_table = Flashcard.__table__, FlashcardSet.__table__
+
+    digests = defaultdict(int)  # set id -> sum of its card keys
+    update_card = (
+        update(cards_table)
+        .where(cards_table.c.id == bindparam('card_id'))
+        .values(hash_key=bindparam('new_key'))
+    )
+    last_id = 0
+    while True:
+        # Keyset pages, so updating rows never disturbs an open cursor
+        rows = conn.execute(
+            select(cards_table.c.id, cards_table.c.set_id, cards_table.c.front,
+                   cards_table.c.back)
+            .where(cards_table.c.id > last_id)
+            .order_by(cards_table.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        params = []
+        for card_id, set_id, front, back in rows:
+            key = card_hash_key(front, back)
+            digests[set_id] += int(key, 16)
+            params.append({'card_id': card_id, 'new_key': key})
+        conn.execute(update_card, params)
+        last_id = rows[-1][0]
+
+    update_set = (
+        update(sets_table)
+        .where(sets_table.c.id == bindparam('set_id'))
+        .values(cards_digest=bindparam('digest'), hash_key=bindparam('new_key'))
+    )
+    params = []
+    for set_id in conn.execute(select(sets_table.c.id)).scalars():
+        digest = format(digests[set_id] % DIGEST_MODULUS, '064x')
+        params.append({'set_id': set_id, 'digest': digest, 'new_key': set_hash_key(digest)})
+    if params:
+        conn.execute(update_set, params)
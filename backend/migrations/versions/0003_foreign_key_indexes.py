@@ -0,0 +1,27 @@
+from migrations import create_indexes
+
+revision = 3
+description = 'Index foreign keys for the route query patterns'
+
+def upgrade(conn):
+    # The membership index is unique; keep the first of any repeated joins
+    conn.exec_driver_sql(
+        'DELETE FROM class_members WHERE id NOT IN '
+        '(SELECT MIN(id) FROM class_members GROUP BY class_id, user_id)'
+    )
+    create_indexes(
+        conn,
+        'ix_flashcard_sets_user_id_created_at',
+        'ix_flashcards_set_id_hash_key',
+        'ix_tests_user_id_created_at',
+        'ix_test_questions_test_id',
+        'ix_test_results_user_id_completed_at',
+        'ix_test_results_test_id',
+        'ix_timetables_user_id_week_start',
+        'ix_targets_timetable_id_day',
+        'ix_classes_leader_id',
+        'ix_class_members_class_id_user_id',
+        'ix_class_members_user_id',
+        'ix_leaderboards_class_id_end_date',
+        'ix_change_log_user_id_id',
+    )
@@ -0,0 +1,14 @@
+from migrations import create_indexes
+
+revision = 4
+description = 'Make user titles unique per user for the title engine'
+
+def upgrade(conn):
+    # Keep the earliest award of any title held more than once
+    conn.exec_driver_sql(
+        'DELETE FROM user_titles WHERE id NOT IN '
+        '(SELECT MIN(id) FROM user_titles GROUP BY user_id, title)'
+    )
+    # The new index starts with user_id, so it replaces the old one
+    conn.exec_driver_sql('DROP INDEX IF EXISTS ix_user_titles_user_id')
+    create_indexes(conn, 'ix_user_titles_user_id_title')
@@ -0,0 +1,31 @@
+from sqlalchemy import select, insert
+
+from models import TestResult, UserStats
+from stats import add_score
+
+revision = 5
+description = 'Fill the new user_stats table from existing test results'
+
+BATCH_SIZE = 1000  # users inserted at a time
+
+def upgrade(conn):
+    # create_all() has just made the table; replay each user's results in order
+    results = conn.execute(
+        select(TestResult.user_id, TestResult.score, TestResult.completed_at)
+        .order_by(TestResult.user_id, TestResult.completed_at)
+    )
+    rows = []
+    current = None
+    for user_id, score, completed_at in results:
+        if current is None or current['user_id'] != user_id:
+            current = {'user_id': user_id, 'test_count': 0, 'mean_score': 0.0,
+                       'recent_scores': '[]', 'daily_xp': 0}
+            rows.append(current)
+        current.update(add_score(current['test_count'], current['mean_score'],
+                                 current['recent_scores'], score, completed_at))
+        if len(rows) > BATCH_SIZE:
+            # The last row may still get results; keep it for the next batch
+            conn.execute(insert(UserStats), rows[:-1])
+            rows = rows[-1:]
+    if rows:
+        conn.execute(insert(UserStats), rows)
@@ -0,0 +1,7 @@
+from migrations import add_columns
+
+revision = 6
+description = 'Add a version to flashcard sets, bumped on every write, for ETags'
+
+def upgrade(conn):
+    add_columns(conn, 'flashcard_sets', 'version INTEGER NOT NULL DEFAULT 0')
@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean, Float, LargeBinary
-from sqlalchemy.orm import relationship, declarative_base
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Date, Boolean, Float, LargeBinary, Index
+from sqlalchemy.orm import relationship, declarative_base, validates
 from datetime import datetime
+from hashing import EMPTY_DIGEST, set_hash_key
 
 Base = declarative_base()
 
@@ -21,9 +22,13 @@ class User(Base):
     timetables = relationship('Timetable', back_populates='user', cascade='all, delete-orphan')
     titles = relationship('UserTitle', back_populates='user', cascade='all, delete-orphan')
     class_memberships = relationship('ClassMember', back_populates='user', cascade='all, delete-orphan')
+    stats = relationship('UserStats', back_populates='user', uselist=False, cascade='all, delete-orphan')
 
 class FlashcardSet(Base):
     __tablename__ = 'flashcard_sets'
+    __table_args__ = (
+        Index('ix_flashcard_sets_user_id_created_at', 'user_id', 'created_at'),  # Newest sets first
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
@@ -31,30 +36,67 @@ class FlashcardSet(Base):
     description = Column(String(500))
     folder = Column(String(100))
     priority = Column(Integer, default=1)
-    hash_key = Column(String(64), nullable=False)
+    # Content hash derived from cards_digest, so sets with the same cards share it
+    hash_key = Column(String(64), nullable=False, index=True, default=set_hash_key(EMPTY_DIGEST))
+    cards_digest = Column(String(64), nullable=False, default=EMPTY_DIGEST)  # See hashing.py
+    # Bumped on every write to the set or its cards; ETags are built from it
+    version = Column(Integer, nullable=False, default=0)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
     user = relationship('User', back_populates='flashcard_sets')
     flashcards = relationship('Flashcard', back_populates='flashcard_set', cascade='all, delete-orphan')
+    
+    @validates('cards_digest')
+    def update_hash_key(self, key, digest):
+        """Keep the set's content hash in step with every change to its digest
+
+        Every write to the cards assigns the digest, even when it comes out
+        the same (cards replaced by equal ones get new ids), so this is also
+        where the version moves on.
+        """
+        self.hash_key = set_hash_key(digest)
+        self.bump_version()
+        return digest
+    
+    def bump_version(self):
+        self.version = (self.version or 0) + 1
 
 class Flashcard(Base):
     __tablename__ = 'flashcards'
+    __table_args__ = (
+        Index('ix_flashcards_set_id_hash_key', 'set_id', 'hash_key'),  # A set's cards, and duplicates in it
+    )
     
     id = Column(Integer, primary_key=True)
     set_id = Column(Integer, ForeignKey('flashcard_sets.id'), nullable=False)
     front = Column(String(1000), nullable=False)
     back = Column(String(1000), nullable=False)
     priority = Column(Integer, default=1)
-    hash_key = Column(String(64), nullable=False)
+    difficulty = Column(String(10), default='medium')
+    hash_key = Column(String(64), nullable=False, index=True)  # hashing.card_hash_key(front, back)
     incorrect_count = Column(Integer, default=0)
     last_reviewed = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
     flashcard_set = relationship('FlashcardSet', back_populates='flashcards')
+    
+    def update_priority(self):
+        """Recalculate priority from incorrect answers and time since last review"""
+        priority = 1 + (self.incorrect_count or 0)
+        if self.last_reviewed is None:
+            priority += 3  # Never reviewed
+        else:
+            # One extra point per week without review, up to three
+            priority += min((datetime.utcnow() - self.last_reviewed).days // 7, 3)
+        self.priority = min(priority, 10)
 
 class Test(Base):
     __tablename__ = 'tests'
+    __table_args__ = (
+        Index('ix_tests_user_id_created_at', 'user_id', 'created_at'),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
@@ -69,6 +111,9 @@ class Test(Base):
 
 class TestQuestion(Base):
     __tablename__ = 'test_questions'
+    __table_args__ = (
+        Index('ix_test_questions_test_id', 'test_id'),
+    )
     
     id = Column(Integer, primary_key=True)
     test_id = Column(Integer, ForeignKey('tests.id'), nullable=False)
@@ -82,6 +127,10 @@ class TestQuestion(Base):
 
 class TestResult(Base):
     __tablename__ = 'test_results'
+    __table_args__ = (
+        Index('ix_test_results_user_id_completed_at', 'user_id', 'completed_at'),
+        Index('ix_test_results_test_id', 'test_id'),
+    )
     
     id = Column(Integer, primary_key=True)
     test_id = Column(Integer, ForeignKey('tests.id'), nullable=False)
@@ -94,8 +143,26 @@ class TestResult(Base):
     test = relationship('Test', back_populates='results')
     user = relationship('User')
 
+# Per-user aggregates, updated as tests and XP come in (see stats.py), so
+# progress screens never read a user's whole history
+class UserStats(Base):
+    __tablename__ = 'user_stats'
+    
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    test_count = Column(Integer, nullable=False, default=0)
+    mean_score = Column(Float, nullable=False, default=0.0)
+    recent_scores = Column(String, nullable=False, default='[]')  # JSON, newest last
+    daily_xp = Column(Integer, nullable=False, default=0)
+    daily_xp_date = Column(Date)  # UTC day daily_xp was earned on
+    
+    # Relationships
+    user = relationship('User', back_populates='stats')
+
 class Timetable(Base):
     __tablename__ = 'timetables'
+    __table_args__ = (
+        Index('ix_timetables_user_id_week_start', 'user_id', 'week_start'),  # Weeks newest first
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
@@ -108,6 +175,9 @@ class Timetable(Base):
 
 class Target(Base):
     __tablename__ = 'targets'
+    __table_args__ = (
+        Index('ix_targets_timetable_id_day', 'timetable_id', 'day'),
+    )
     
     id = Column(Integer, primary_key=True)
     timetable_id = Column(Integer, ForeignKey('timetables.id'), nullable=False)
@@ -121,6 +191,10 @@ class Target(Base):
 
 class UserTitle(Base):
     __tablename__ = 'user_titles'
+    __table_args__ = (
+        # A title is held once; titles.py relies on this to award idempotently
+        Index('ix_user_titles_user_id_title', 'user_id', 'title', unique=True),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
@@ -132,6 +206,9 @@ class UserTitle(Base):
 
 class Class(Base):
     __tablename__ = 'classes'
+    __table_args__ = (
+        Index('ix_classes_leader_id', 'leader_id'),
+    )
     
     id = Column(Integer, primary_key=True)
     name = Column(String(100), nullable=False)
@@ -146,6 +223,11 @@ class Class(Base):
 
 class ClassMember(Base):
     __tablename__ = 'class_members'
+    __table_args__ = (
+        # A user joins a class at most once
+        Index('ix_class_members_class_id_user_id', 'class_id', 'user_id', unique=True),
+        Index('ix_class_members_user_id', 'user_id'),  # Classes of a user
+    )
     
     id = Column(Integer, primary_key=True)
     class_id = Column(Integer, ForeignKey('classes.id'), nullable=False)
@@ -158,6 +240,9 @@ class ClassMember(Base):
 
 class Leaderboard(Base):
     __tablename__ = 'leaderboards'
+    __table_args__ = (
+        Index('ix_leaderboards_class_id_end_date', 'class_id', 'end_date'),
+    )
     
     id = Column(Integer, primary_key=True)
     class_id = Column(Integer, ForeignKey('classes.id'), nullable=False)
@@ -167,3 +252,64 @@ class Leaderboard(Base):
     
     # Relationships
     class_ = relationship('Class', back_populates='leaderboards')
+
+class ChangeLog(Base):
+    __tablename__ = 'change_log'
+    __table_args__ = (
+        Index('ix_change_log_user_id_id', 'user_id', 'id'),  # A user's changes since a version
+        # AUTOINCREMENT so ids are never reused and always increase
+        {'sqlite_autoincrement': True},
+    )
+    
+    id = Column(Integer, primary_key=True)  # Change sequence number
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    entity = Column(String(10), nullable=False)  # 'set' or 'card'
+    entity_id = Column(Integer, nullable=False)
+    set_id = Column(Integer)  # Parent set of a card
+    op = Column(String(10), nullable=False)  # 'upsert' or 'delete'
+    changed_at = Column(DateTime, default=datetime.utcnow)
+
+class Job(Base):
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        Index('ix_jobs_state_run_at', 'state', 'run_at'),  # Due jobs, oldest first
+    )
+    
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(50), nullable=False)  # Name a handler is registered under in jobs.py
+    payload = Column(String, nullable=False, default='{}')  # JSON keyword arguments
+    state = Column(String(10), nullable=False, default='pending')  # pending, running, done or failed
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_at = Column(DateTime, nullable=False, default=datetime.utcnow)  # Not picked up before this
+    last_error = Column(String(1000))
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime)
+
+# Review history older than the retention period, folded out of the monthly
+# review_log_YYYYMM partitions (see reviews.py). Cards are not foreign keys,
+# since history is kept after a card is deleted.
+class ReviewSummary(Base):
+    __tablename__ = 'review_summary'
+    
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    card_id = Column(Integer, primary_key=True)
+    reviews = Column(Integer, nullable=False, default=0)
+    total_grade = Column(Float, nullable=False, default=0.0)  # Sum of grades; divide by reviews
+    last_reviewed_at = Column(DateTime)
+
+# Replies to requests sent with an idempotency_key (see idempotency.py), so a
+# request sent again, such as one replayed from a client's offline outbox
+# after a timeout, is answered without being done twice
+class IdempotencyKey(Base):
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (
+        Index('ix_idempotency_keys_user_id_key', 'user_id', 'key', unique=True),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    key = Column(String(64), nullable=False)  # Chosen by the client, unique per user
+    status_code = Column(Integer, nullable=False)
+    response = Column(String, nullable=False)  # JSON body of the first reply
+    created_at = Column(DateTime, default=datetime.utcnow)
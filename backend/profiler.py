@@ -0,0 +1,109 @@
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from loop_monitor import loop_monitor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SAMPLE_INTERVAL = 0.005  # seconds between samples
+MAX_DURATION = 300  # never sample for longer than 5 minutes
+
+class SamplingProfiler:
+    """Statistical profiler that samples the event-loop thread's stack
+
+    Samples are aggregated as collapsed stacks ("frame;frame;frame count"),
+    the input format of flamegraph.pl and speedscope. Sampling can be limited
+    to requests whose route starts with a prefix.
+    """
+    def __init__(self):
+        self.stacks = Counter()
+        self.samples = 0
+        self.started_at = None
+        self.ends_at = None
+        self.route_prefix = None
+        self._thread = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds, route_prefix=None, interval=DEFAULT_SAMPLE_INTERVAL):
+        """Start sampling for the given number of seconds, discarding old samples"""
+        if self.running:
+            raise RuntimeError('Profiler is already running')
+        if loop_monitor.loop_thread_id is None:
+            raise RuntimeError('Event loop is not being monitored')
+
+        seconds = min(float(seconds), MAX_DURATION)
+        with self._lock:
+            self.stacks = Counter()
+            self.samples = 0
+        self.route_prefix = route_prefix
+        self.started_at = time.time()
+        self.ends_at = self.started_at + seconds
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(interval,), name='sampling-profiler', daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Profiler started for {seconds}s (route prefix: {route_prefix or 'any'})")
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread:
+            self._thread.join(timeout=1)
+
+    def _run(self, interval):
+        thread_id = loop_monitor.loop_thread_id
+        while not self._stopping.wait(interval) and time.time() < self.ends_at:
+            route = loop_monitor.current_route()
+            if self.route_prefix:
+                # Route is "METHOD /rule"; match on the path part
+                if not route or not route.split(' ', 1)[-1].startswith(self.route_prefix):
+                    continue
+            frame = sys._current_frames().get(thread_id)
+            if frame is None:
+                continue
+            key = self._collapse(frame, route)
+            with self._lock:
+                self.stacks[key] += 1
+                self.samples += 1
+        logger.info(f"Profiler stopped after {self.samples} samples")
+
+    @staticmethod
+    def _collapse(frame, route):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        names.reverse()
+        if route:
+            names.insert(0, route)
+        # Semicolons separate frames in the collapsed format
+        return ';'.join(name.replace(';', ':') for name in names)
+
+    def collapsed(self):
+        """Return aggregated samples as collapsed-stack text"""
+        with self._lock:
+            items = self.stacks.most_common()
+        return '\n'.join(f"{stack} {count}" for stack, count in items)
+
+    def status(self):
+        return {
+            'running': self.running,
+            'samples': self.samples,
+            'unique_stacks': len(self.stacks),
+            'route_prefix': self.route_prefix,
+            'started_at': self.started_at,
+            'ends_at': self.ends_at,
+        }
+
+# Global profiler instance
+profiler = SamplingProfiler()
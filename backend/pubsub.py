@@ -0,0 +1,116 @@
+import asyncio
+import json
+from collections import defaultdict
+
+from sqlalchemy import select, func, event
+
+from models import ClassMember, User
+
+MAX_QUEUED_EVENTS = 100  # per subscriber; one that falls further behind is told to resync
+HEARTBEAT_INTERVAL = 15  # seconds between keep-alive comments on an idle stream
+
+class Subscription:
+    """One subscriber's bounded queue of messages from a channel"""
+    def __init__(self, channel, max_queued):
+        self.channel = channel
+        self.queue = asyncio.Queue(max_queued)
+        self.dropped = 0
+
+    def put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Too far behind to catch up message by message: swap the backlog
+            # for a single resync, so the publisher never waits on this client
+            while not self.queue.empty():
+                self.queue.get_nowait()
+                self.dropped += 1
+            self.queue.put_nowait({'type': 'resync'})
+
+    async def get(self):
+        return await self.queue.get()
+
+class PubSub:
+    """In-process publish/subscribe between request handlers and open streams
+
+    Publishing never blocks: every subscriber has its own bounded queue,
+    and one that overflows has its backlog replaced by a resync message
+    telling the client to reload instead. Channels only exist in this
+    process, which is all the single-process server needs.
+    """
+    def __init__(self, max_queued=MAX_QUEUED_EVENTS):
+        self.max_queued = max_queued
+        self._channels = defaultdict(set)  # channel -> subscriptions
+        self.dropped = 0  # messages dropped by subscriptions that are gone
+
+    def subscribe(self, channel):
+        subscription = Subscription(channel, self.max_queued)
+        self._channels[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscriptions = self._channels.get(subscription.channel)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._channels[subscription.channel]
+        self.dropped += subscription.dropped
+
+    def publish(self, channel, message):
+        for subscription in list(self._channels.get(channel, ())):
+            subscription.put(message)
+
+    def publish_after_commit(self, session, channel, message):
+        """Publish once session commits, so nobody hears of a rolled back change"""
+        event.listen(session.sync_session, 'after_commit',
+                     lambda _: self.publish(channel, message), once=True)
+
+    def stats(self):
+        subscriptions = [s for subs in self._channels.values() for s in subs]
+        return {
+            'channels': len(self._channels),
+            'subscribers': len(subscriptions),
+            'queued': sum(s.queue.qsize() for s in subscriptions),
+            'dropped': self.dropped + sum(s.dropped for s in subscriptions),
+        }
+
+# Global broker instance
+pubsub = PubSub()
+
+def class_channel(class_id):
+    return f'class:{class_id}'
+
+def encode_sse(message):
+    """A message as a server-sent event named after its type"""
+    return f"event: {message['type']}\ndata: {json.dumps(message)}\n\n".encode()
+
+async def publish_xp_change(session, user_id, amount, xp):
+    """Tell every class of the user about an XP gain and any change of rank
+
+    A member's rank is one more than the number of classmates with more XP,
+    counted before and after the gain for all the user's classes at once.
+    """
+    previous_xp = xp - amount
+    result = await session.execute(
+        select(
+            ClassMember.class_id,
+            # The user is left out: their own row already holds the new XP
+            func.count().filter(User.id != user_id, User.xp > xp),
+            func.count().filter(User.id != user_id, User.xp > previous_xp)
+        )
+        .join(User, User.id == ClassMember.user_id)
+        .where(ClassMember.class_id.in_(
+            select(ClassMember.class_id).where(ClassMember.user_id == user_id)
+        ))
+        .group_by(ClassMember.class_id)
+    )
+    for class_id, above, above_before in result:
+        channel = class_channel(class_id)
+        pubsub.publish_after_commit(session, channel, {
+            'type': 'xp', 'user_id': user_id, 'gained': amount, 'xp': xp
+        })
+        if above != above_before:
+            pubsub.publish_after_commit(session, channel, {
+                'type': 'rank', 'user_id': user_id,
+                'rank': above + 1, 'previous_rank': above_before + 1
+            })
@@ -0,0 +1,175 @@
+import logging
+from datetime import datetime
+
+from sqlalchemy import MetaData, Table, Column, Integer, Float, DateTime, Index, select, insert, func, text, true
+from sqlalchemy.dialects.sqlite import insert as upsert
+
+from database import db
+from jobs import jobs
+from models import Job, ReviewSummary
+
+logger = logging.getLogger(__name__)
+
+PARTITION_PREFIX = 'review_log_'  # followed by YYYYMM
+RETENTION_MONTHS = 12  # older partitions are folded into review_summary and dropped
+COMPACT_INTERVAL = 24 * 3600  # seconds between compaction runs
+MAX_HISTORY = 200  # reviews returned for a card
+MAX_ANSWERS = 1000  # answers accepted with one test
+
+# The review log is append-only and split into one table per month, created
+# when the first review of the month is written. Hot tables never carry the
+# history, reads only touch the months they need, and retention drops whole
+# tables instead of deleting rows. Partitions live in their own MetaData so
+# create_all() and the migrations leave them alone.
+partition_metadata = MetaData()
+
+def partition_name(when):
+    return f'{PARTITION_PREFIX}{when:%Y%m}'
+
+def months_before(when, months):
+    """The first day of the month `months` before when's month"""
+    index = when.year * 12 + when.month - 1 - months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+def partition_table(name):
+    table = partition_metadata.tables.get(name)
+    if table is None:
+        table = Table(
+            name, partition_metadata,
+            Column('id', Integer, primary_key=True),
+            Column('user_id', Integer, nullable=False),
+            Column('card_id', Integer, nullable=False),
+            Column('set_id', Integer, nullable=False),
+            Column('grade', Float, nullable=False),  # 0 wrong, 0.5 partly right, 1 right
+            Column('latency_ms', Integer),  # time from showing the card to the answer
+            Column('reviewed_at', DateTime, nullable=False),
+            Index(f'ix_{name}_user_id_card_id_reviewed_at', 'user_id', 'card_id', 'reviewed_at'),
+        )
+    return table
+
+async def list_partitions(session):
+    """Names of the existing partitions, oldest first"""
+    result = await session.execute(
+        text("SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB :pattern "
+             "ORDER BY name"),
+        {'pattern': f'{PARTITION_PREFIX}[0-9]*'}
+    )
+    return result.scalars().all()
+
+def validate_answers(answers):
+    """Answers from a test submission, or ValueError if they are malformed"""
+    if not isinstance(answers, list) or len(answers) > MAX_ANSWERS:
+        raise ValueError(f'answers must be a list of at most {MAX_ANSWERS} items')
+    valid = []
+    for answer in answers:
+        if not isinstance(answer, dict):
+            raise ValueError('Each answer must be an object')
+        card_id, grade = answer.get('card_id'), answer.get('grade')
+        latency = answer.get('latency_ms')
+        if not isinstance(card_id, int) or isinstance(card_id, bool):
+            raise ValueError('card_id must be an integer')
+        if not isinstance(grade, (int, float)) or isinstance(grade, bool) or not 0 <= grade <= 1:
+            raise ValueError('grade must be between 0 and 1')
+        if latency is not None and (not isinstance(latency, int) or latency < 0):
+            raise ValueError('latency_ms must be a whole number of milliseconds')
+        valid.append({'card_id': card_id, 'grade': float(grade), 'latency_ms': latency})
+    return valid
+
+def record_reviews(session, user_id, set_id, answers, reviewed_at):
+    """Queue a test's answers (card_id, grade, latency_ms) for the review log
+
+    All the answers of a test are written together by one job, in a single
+    executemany, so submitting a test never waits on the log.
+    """
+    if answers:
+        jobs.enqueue(session, 'record_reviews', user_id=user_id, set_id=set_id,
+                     answers=answers, reviewed_at=reviewed_at.isoformat())
+
+@jobs.handler('record_reviews')
+async def record_reviews_job(session, user_id, set_id, answers, reviewed_at):
+    reviewed_at = datetime.fromisoformat(reviewed_at)
+    table = partition_table(partition_name(reviewed_at))
+    conn = await session.connection()
+    await conn.run_sync(table.create, checkfirst=True)
+    await session.execute(insert(table), [{
+        'user_id': user_id,
+        'card_id': answer['card_id'],
+        'set_id': set_id,
+        'grade': answer['grade'],
+        'latency_ms': answer.get('latency_ms'),
+        'reviewed_at': reviewed_at
+    } for answer in answers])
+
+async def card_history(session, user_id, card_id, limit=MAX_HISTORY):
+    """A card's most recent reviews, newest first, and its compacted summary
+
+    Partitions are read newest first and only until limit reviews are found.
+    """
+    reviews = []
+    for name in reversed(await list_partitions(session)):
+        table = partition_table(name)
+        result = await session.execute(
+            select(table.c.grade, table.c.latency_ms, table.c.reviewed_at)
+            .where(table.c.user_id == user_id)
+            .where(table.c.card_id == card_id)
+            .order_by(table.c.reviewed_at.desc())
+            .limit(limit - len(reviews))
+        )
+        reviews.extend(dict(row._mapping) for row in result)
+        if len(reviews) >= limit:
+            break
+    summary = await session.get(ReviewSummary, (user_id, card_id))
+    return reviews, summary
+
+async def compact(session, now=None):
+    """Fold partitions past the retention period into review_summary and drop them
+
+    Returns the names of the dropped partitions.
+    """
+    cutoff = partition_name(months_before(now or datetime.utcnow(), RETENTION_MONTHS))
+    dropped = []
+    conn = await session.connection()
+    for name in await list_partitions(session):
+        if name >= cutoff:
+            break
+        table = partition_table(name)
+        totals = upsert(ReviewSummary).from_select(
+            ['user_id', 'card_id', 'reviews', 'total_grade', 'last_reviewed_at'],
+            select(table.c.user_id, table.c.card_id, func.count(),
+                   func.sum(table.c.grade), func.max(table.c.reviewed_at))
+            .where(true())  # SQLite needs a WHERE before an upsert's ON CONFLICT
+            .group_by(table.c.user_id, table.c.card_id)
+        )
+        await session.execute(totals.on_conflict_do_update(
+            index_elements=['user_id', 'card_id'],
+            set_={
+                'reviews': ReviewSummary.reviews + totals.excluded.reviews,
+                'total_grade': ReviewSummary.total_grade + totals.excluded.total_grade,
+                'last_reviewed_at': func.max(ReviewSummary.last_reviewed_at,
+                                             totals.excluded.last_reviewed_at),
+            }
+        ))
+        await conn.run_sync(table.drop)
+        partition_metadata.remove(table)
+        dropped.append(name)
+    return dropped
+
+@jobs.handler('compact_reviews', concurrency=1)
+async def compact_reviews_job(session):
+    dropped = await compact(session)
+    if dropped:
+        logger.info(f"Compacted review log partitions {', '.join(dropped)}")
+    # The next run is queued in the same transaction, so there is always one
+    jobs.enqueue(session, 'compact_reviews', delay=COMPACT_INTERVAL)
+
+async def schedule_compaction():
+    """Queue a compaction run unless one is already waiting"""
+    async with db.session() as session:
+        queued = await session.execute(
+            select(Job.id)
+            .where(Job.state.in_(['pending', 'running']))
+            .where(Job.kind == 'compact_reviews')
+            .limit(1)
+        )
+        if queued.first() is None:
+            jobs.enqueue(session, 'compact_reviews')
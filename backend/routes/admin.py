@@ -0,0 +1,61 @@
+from quart import Blueprint, request, jsonify, Response
+from utils import admin_required
+from profiler import profiler, DEFAULT_SAMPLE_INTERVAL
+from loop_monitor import loop_monitor
+from jobs import jobs
+from pubsub import pubsub
+
+admin_bp = Blueprint('admin', __name__)
+
+@admin_bp.route('/profiler/start', methods=['POST'])
+@admin_required
+async def start_profiler(current_user):
+    data = await request.get_json() or {}
+
+    try:
+        seconds = float(data.get('seconds', 30))
+        interval = float(data.get('interval', DEFAULT_SAMPLE_INTERVAL))
+    except (TypeError, ValueError):
+        return jsonify({'message': 'seconds and interval must be numbers'}), 400
+
+    if seconds <= 0 or interval <= 0:
+        return jsonify({'message': 'seconds and interval must be positive'}), 400
+
+    try:
+        profiler.start(seconds, route_prefix=data.get('route_prefix'), interval=interval)
+    except RuntimeError as e:
+        return jsonify({'message': str(e)}), 409
+
+    return jsonify(profiler.status()), 202
+
+@admin_bp.route('/profiler/stop', methods=['POST'])
+@admin_required
+async def stop_profiler(current_user):
+    profiler.stop()
+    return jsonify(profiler.status())
+
+@admin_bp.route('/profiler', methods=['GET'])
+@admin_required
+async def get_profiler_status(current_user):
+    return jsonify(profiler.status())
+
+@admin_bp.route('/profiler/stacks', methods=['GET'])
+@admin_required
+async def get_profiler_stacks(current_user):
+    # Collapsed stacks, ready for flamegraph.pl or speedscope
+    return Response(profiler.collapsed(), mimetype='text/plain')
+
+@admin_bp.route('/loop', methods=['GET'])
+@admin_required
+async def get_loop_stats(current_user):
+    return jsonify(loop_monitor.stats())
+
+@admin_bp.route('/jobs', methods=['GET'])
+@admin_required
+async def get_job_stats(current_user):
+    return jsonify(await jobs.stats())
+
+@admin_bp.route('/pubsub', methods=['GET'])
+@admin_required
+async def get_pubsub_stats(current_user):
+    return jsonify(pubsub.stats())
@@ -1,7 +1,9 @@
-from quart import Blueprint, request, jsonify
+from quart import Blueprint, request, jsonify, Response
 from sqlalchemy import select
 from models import Class, ClassMember, User
 from utils import token_required, async_session
+from pubsub import pubsub, class_channel, encode_sse, HEARTBEAT_INTERVAL
+import asyncio
 import secrets
 
 class_bp = Blueprint('class', __name__)
@@ -33,7 +35,7 @@ async def get_classes(current_user):
                 'code': class_.code,
                 'is_leader': class_.leader_id == current_user.id,
                 'member_count': count,
-                'created_at': class_.created_at.isoformat()
+                'created_at': class_.created_at
             })
         
         return jsonify(response)
@@ -78,7 +80,7 @@ async def create_class(current_user):
             'code': new_class.code,
             'is_leader': True,
             'member_count': 1,
-            'created_at': new_class.created_at.isoformat()
+            'created_at': new_class.created_at
         }), 201
 
 @class_bp.route('/join', methods=['POST'])
@@ -115,6 +117,10 @@ async def join_class(current_user):
         )
         session.add(member)
         await session.commit()
+        pubsub.publish(class_channel(class_.id), {
+            'type': 'member_joined', 'user_id': current_user.id,
+            'username': current_user.username, 'xp': current_user.xp or 0
+        })
         
         # Get updated member count
         member_count = await session.execute(
@@ -129,7 +135,7 @@ async def join_class(current_user):
             'code': class_.code,
             'is_leader': False,
             'member_count': count,
-            'created_at': class_.created_at.isoformat()
+            'created_at': class_.created_at
         })
 
 @class_bp.route('/<int:class_id>/members', methods=['GET'])
@@ -164,13 +170,14 @@ async def get_class_members(current_user, class_id):
                 'id': class_.id,
                 'name': class_.name,
                 'code': class_.code,
-                'created_at': class_.created_at.isoformat()
+                'created_at': class_.created_at
             },
             'members': [{
                 'id': user.id,
                 'username': user.username,
                 'is_leader': user.id == class_.leader_id,
-                'joined_at': member.created_at.isoformat()
+                'xp': user.xp or 0,
+                'joined_at': member.created_at
             } for user, member in members]
         })
 
@@ -204,6 +211,7 @@ async def remove_member(current_user, class_id, user_id):
         
         await session.delete(member)
         await session.commit()
+        pubsub.publish(class_channel(class_id), {'type': 'member_left', 'user_id': user_id})
         
         return '', 204
 
@@ -237,5 +245,47 @@ async def leave_class(current_user, class_id):
         
         await session.delete(member)
         await session.commit()
+        pubsub.publish(class_channel(class_id), {'type': 'member_left', 'user_id': current_user.id})
         
         return '', 204
+
+@class_bp.route('/<int:class_id>/events', methods=['GET'])
+@token_required
+async def class_events(current_user, class_id):
+    """Server-sent events for a class, replacing polling for changes
+
+    Events are member_joined, member_left, xp and rank, plus resync when
+    the client fell too far behind and should reload the class instead.
+    A comment is sent every HEARTBEAT_INTERVAL seconds while it is quiet.
+    The stream ends when the user leaves or is removed from the class.
+    """
+    async with async_session() as session:
+        member_result = await session.execute(
+            select(ClassMember)
+            .where(ClassMember.class_id == class_id)
+            .where(ClassMember.user_id == current_user.id)
+        )
+        if not member_result.scalar_one_or_none():
+            return jsonify({'message': 'Class not found'}), 404
+    
+    async def stream():
+        # Subscribed here, so a client that never reads cannot leak a queue
+        subscription = pubsub.subscribe(class_channel(class_id))
+        try:
+            yield b': connected\n\n'
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscription.get(), HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield b': keep-alive\n\n'
+                    continue
+                yield encode_sse(message)
+                if message['type'] == 'member_left' and message['user_id'] == current_user.id:
+                    return
+        finally:
+            pubsub.unsubscribe(subscription)
+    
+    response = Response(stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.timeout = None  # The stream stays open for as long as the client listens
+    return response
@@ -1,30 +1,67 @@
-from quart import Blueprint, request, jsonify
-from sqlalchemy import select, func, desc, delete
-from models import FlashcardSet, Flashcard, Test, User
-from utils import token_required, generate_hash_key
+from quart import Blueprint, request, jsonify, Response
+from sqlalchemy import select, func, desc, delete, insert, and_, or_
+from models import FlashcardSet, Flashcard, Test, TestResult, User, ChangeLog
+from utils import token_required
+from hashing import EMPTY_DIGEST, add_to_digest, remove_from_digest, set_etag, card_hash_key
+from changes import record_change, record_changes, record_new_cards
+from importer import RowError, detect_format, iter_records, imports
+from exporter import EXPORTERS, EXPORT_BATCH_SIZE
+from titles import award_xp, publish
+from stats import record_test
+from reviews import validate_answers, record_reviews, card_history
+from anki import CollectionReader, CollectionWriter, PackageError, extract_collection, \
+    split_deck_name, write_package
+from idempotency import valid_key, replay, remember
 from database import db
 from datetime import datetime
+from collections import defaultdict
+import asyncio
+import os
+import shutil
+import tempfile
 
 flashcard_bp = Blueprint('flashcard', __name__)
 
+CHANGES_PAGE_SIZE = 1000  # change log rows per /changes response
+MAX_BATCH_CARDS = 5000  # cards accepted by one /sets/batch request
+IMPORT_BATCH_SIZE = 500  # cards per executemany while importing
+MAX_IMPORT_BYTES = 256 * 1024 * 1024
+IMPORT_BODY_TIMEOUT = 600  # seconds to receive a whole upload
+FILE_CHUNK_SIZE = 64 * 1024  # bytes per chunk when reading or sending a file
+MAX_LOOKUP_KEYS = 1000  # cards or sets looked up by one /lookup request
+MAX_DUPLICATE_GROUPS = 500  # groups of identical cards returned by /duplicates
+
+def not_modified(etag):
+    """Empty 304 response for a conditional GET that matched"""
+    response = Response('', status=304)
+    response.set_etag(etag)
+    return response
+
+def card_count():
+    """A set's number of cards, to select next to FlashcardSet in one query"""
+    return (
+        select(func.count(Flashcard.id))
+        .where(Flashcard.set_id == FlashcardSet.id)
+        .scalar_subquery()
+    )
+
 @flashcard_bp.route('/sets', methods=['GET'])
 @token_required
 async def get_flashcard_sets(current_user):
     async with db.session() as session:
         result = await session.execute(
-            select(FlashcardSet)
+            select(FlashcardSet, card_count())
             .where(FlashcardSet.user_id == current_user.id)
             .order_by(FlashcardSet.created_at.desc())
         )
-        sets = result.scalars().all()
         
         return jsonify([{
             'id': s.id,
             'name': s.name,
             'folder': s.folder,
-            'card_count': len(s.flashcards),
-            'created_at': s.created_at.isoformat()
-        } for s in sets])
+            'card_count': count,
+            'created_at': s.created_at
+        } for s, count in result])
 
 @flashcard_bp.route('/sets', methods=['POST'])
 @token_required
@@ -39,9 +76,11 @@ async def create_flashcard_set(current_user):
             name=data['name'],
             folder=data.get('folder', 'General'),
             user_id=current_user.id,
-            hash_key=generate_hash_key('set', current_user.id, data['name'])
+            cards_digest=EMPTY_DIGEST
         )
         session.add(new_set)
+        await session.flush()  # Get new set ID
+        record_change(session, current_user.id, 'set', new_set.id)
         await session.commit()
         await session.refresh(new_set)
         
@@ -50,9 +89,451 @@ async def create_flashcard_set(current_user):
             'name': new_set.name,
             'folder': new_set.folder,
             'card_count': 0,
-            'created_at': new_set.created_at.isoformat()
+            'created_at': new_set.created_at
         }), 201
 
+@flashcard_bp.route('/sets/batch', methods=['POST'])
+@token_required
+async def create_flashcard_set_batch(current_user):
+    """Create a set together with all of its cards in one transaction
+
+    Sending the same idempotency_key again returns the first reply instead
+    of creating a second set.
+    """
+    data = await request.get_json()
+    
+    if 'name' not in data:
+        return jsonify({'message': 'Missing name'}), 400
+    key = data.get('idempotency_key')
+    if not valid_key(key):
+        return jsonify({'message': 'Invalid idempotency_key'}), 400
+    cards = data.get('cards', [])
+    if len(cards) > MAX_BATCH_CARDS:
+        return jsonify({'message': f'At most {MAX_BATCH_CARDS} cards per request'}), 400
+    for i, card_data in enumerate(cards):
+        if not all(card_data.get(k) for k in ['front', 'back']):
+            return jsonify({'message': f'Card {i + 1} is missing front or back content'}), 400
+    
+    async with db.session() as session:
+        replayed = await replay(session, current_user.id, key)
+        if replayed is not None:
+            return replayed
+        
+        new_set = FlashcardSet(
+            name=data['name'],
+            folder=data.get('folder', 'General'),
+            user_id=current_user.id,
+            cards_digest=EMPTY_DIGEST
+        )
+        session.add(new_set)
+        await session.flush()  # Get new set ID
+        
+        now = datetime.utcnow()
+        rows = [{
+            'set_id': new_set.id,
+            'front': card_data['front'],
+            'back': card_data['back'],
+            'difficulty': card_data.get('difficulty', 'medium'),
+            'hash_key': card_hash_key(card_data['front'], card_data['back']),
+            'created_at': now
+        } for card_data in cards]
+        card_ids = []
+        if rows:
+            # One executemany instead of an INSERT per card
+            result = await session.scalars(
+                insert(Flashcard).returning(Flashcard.id, sort_by_parameter_order=True),
+                rows
+            )
+            card_ids = result.all()
+        new_set.cards_digest = add_to_digest(EMPTY_DIGEST, *(row['hash_key'] for row in rows))
+        record_change(session, current_user.id, 'set', new_set.id)
+        record_changes(session, current_user.id, 'card', card_ids, set_id=new_set.id)
+        
+        response = jsonify({
+            'id': new_set.id,
+            'name': new_set.name,
+            'folder': new_set.folder,
+            'card_count': len(rows),
+            'flashcards': [{
+                'id': card_id,
+                'front': row['front'],
+                'back': row['back'],
+                'difficulty': row['difficulty'],
+                'created_at': row['created_at']
+            } for card_id, row in zip(card_ids, rows)],
+            'created_at': new_set.created_at
+        })
+        response.status_code = 201
+        response.set_etag(set_etag(new_set))
+        await remember(session, current_user.id, key, response)
+        await session.commit()
+        return response
+
+@flashcard_bp.route('/import', methods=['POST'])
+@token_required
+async def import_flashcards(current_user):
+    """Import cards from a CSV, TSV or JSONL upload sent as the request body
+
+    The body is spooled to disk before the transaction starts, so a slow
+    upload never holds the database's write lock. The file is then parsed
+    in chunks and cards are inserted in batches of IMPORT_BATCH_SIZE, so
+    memory use does not grow with the file. Rows that fail validation are
+    skipped and reported, and cards the set already holds are skipped and
+    counted; everything else is committed in one transaction. Pass set_id
+    to append to an existing set, otherwise a new set called name is
+    created in folder.
+    """
+    fmt = detect_format(request.args.get('format'), request.content_type)
+    if fmt is None:
+        return jsonify({'message': 'Format must be csv, tsv or jsonl'}), 400
+    set_id = request.args.get('set_id', type=int)
+    name = request.args.get('name')
+    if set_id is None and not name:
+        return jsonify({'message': 'Missing name'}), 400
+    import_id = request.args.get('import_id')
+    if not imports.valid_id(import_id):
+        return jsonify({'message': 'Invalid import_id'}), 400
+    
+    request.max_content_length = MAX_IMPORT_BYTES
+    request.body_timeout = IMPORT_BODY_TIMEOUT
+    
+    directory = await asyncio.to_thread(tempfile.mkdtemp, prefix='import-')
+    try:
+        upload_path = os.path.join(directory, f'upload.{fmt}')
+        await spool_body(upload_path)
+        
+        async with db.session() as session:
+            if set_id is not None:
+                result = await session.execute(
+                    select(FlashcardSet)
+                    .where(FlashcardSet.id == set_id)
+                    .where(FlashcardSet.user_id == current_user.id)
+                )
+                flashcard_set = result.scalar_one_or_none()
+                if not flashcard_set:
+                    return jsonify({'message': 'Set not found'}), 404
+            else:
+                flashcard_set = FlashcardSet(
+                    name=name,
+                    folder=request.args.get('folder', 'General'),
+                    user_id=current_user.id,
+                    cards_digest=EMPTY_DIGEST
+                )
+                session.add(flashcard_set)
+                await session.flush()  # Get new set ID
+            
+            status = imports.start(current_user.id, import_id)
+            status['set_id'] = flashcard_set.id
+            # Cards inserted by this import are the set's cards above this id
+            last_card_id = await session.scalar(select(func.max(Flashcard.id))) or 0
+            digest = flashcard_set.cards_digest or EMPTY_DIGEST
+            batch = []
+            
+            async def flush_batch():
+                nonlocal digest
+                rows = await skip_existing_cards(session, flashcard_set.id, batch)
+                status['duplicates'] += len(batch) - len(rows)
+                if rows:
+                    await session.execute(insert(Flashcard), rows)
+                    digest = add_to_digest(digest, *(row['hash_key'] for row in rows))
+                status['imported'] += len(rows)
+                batch.clear()
+            
+            try:
+                async for line_no, card in iter_records(upload_path, fmt):
+                    status['rows'] += 1
+                    if isinstance(card, RowError):
+                        imports.add_error(status, line_no, card)
+                        continue
+                    batch.append({
+                        'set_id': flashcard_set.id,
+                        'front': card['front'],
+                        'back': card['back'],
+                        'difficulty': card['difficulty'],
+                        'hash_key': card_hash_key(card['front'], card['back']),
+                        'created_at': datetime.utcnow()
+                    })
+                    if len(batch) >= IMPORT_BATCH_SIZE:
+                        await flush_batch()
+                if batch:
+                    await flush_batch()
+            except UnicodeDecodeError:
+                await session.rollback()
+                imports.finish(status, 'failed', 'File is not valid UTF-8')
+                return jsonify(status), 400
+            except Exception:
+                await session.rollback()
+                imports.finish(status, 'failed', 'Import failed')
+                raise
+            
+            if not status['imported'] and set_id is None:
+                await session.rollback()
+                imports.finish(status, 'failed', 'No valid cards found')
+                status['set_id'] = None
+                return jsonify(status), 400
+            
+            flashcard_set.cards_digest = digest
+            record_change(session, current_user.id, 'set', flashcard_set.id)
+            await record_new_cards(session, current_user.id, [flashcard_set.id], last_card_id)
+            await session.commit()
+            imports.finish(status, 'done')
+            
+            response = jsonify(status)
+            response.status_code = 201 if set_id is None else 200
+            response.set_etag(set_etag(flashcard_set))
+            return response
+    finally:
+        await asyncio.to_thread(shutil.rmtree, directory, True)
+
+async def spool_body(path):
+    """Write the request body to path as it arrives, off the event loop"""
+    f = await asyncio.to_thread(open, path, 'wb')
+    try:
+        async for chunk in request.body:
+            await asyncio.to_thread(f.write, chunk)
+    finally:
+        await asyncio.to_thread(f.close)
+
+@flashcard_bp.route('/anki/import', methods=['POST'])
+@token_required
+async def import_anki(current_user):
+    """Import an Anki .apkg package sent as the request body
+
+    Each Anki deck becomes a set, with its parent decks as the folder. A
+    deck whose set already exists is merged into it, skipping cards with
+    the same front and back as one already there. The package is spooled
+    to disk, its collection is read in batches off the event loop and the
+    cards are inserted in batches of IMPORT_BATCH_SIZE in one transaction.
+    """
+    import_id = request.args.get('import_id')
+    if not imports.valid_id(import_id):
+        return jsonify({'message': 'Invalid import_id'}), 400
+    
+    request.max_content_length = MAX_IMPORT_BYTES
+    request.body_timeout = IMPORT_BODY_TIMEOUT
+    
+    directory = await asyncio.to_thread(tempfile.mkdtemp, prefix='anki-')
+    reader = None
+    try:
+        package_path = os.path.join(directory, 'upload.apkg')
+        await spool_body(package_path)
+        try:
+            collection_path = await asyncio.to_thread(extract_collection, package_path, directory)
+            reader = await asyncio.to_thread(CollectionReader, collection_path)
+        except PackageError as e:
+            return jsonify({'message': str(e)}), 400
+        
+        status = imports.start(current_user.id, import_id)
+        async with db.session() as session:
+            last_card_id = await session.scalar(select(func.max(Flashcard.id))) or 0
+            sets = {}  # set id -> set, for every set that received cards
+            deck_id, target = None, None  # deck being read and the set it goes into
+            batch = []
+            
+            async def flush_batch():
+                rows = await skip_existing_cards(session, target.id, batch)
+                status['duplicates'] += len(batch) - len(rows)
+                if rows:
+                    await session.execute(insert(Flashcard), rows)
+                    target.cards_digest = add_to_digest(
+                        target.cards_digest, *(row['hash_key'] for row in rows))
+                status['imported'] += len(rows)
+                batch.clear()
+            
+            try:
+                while notes := await asyncio.to_thread(reader.read_batch):
+                    for note_deck_id, deck_name, card in notes:
+                        status['rows'] += 1
+                        if isinstance(card, RowError):
+                            imports.add_error(status, status['rows'], card)
+                            continue
+                        if target is None or note_deck_id != deck_id:
+                            if batch:
+                                await flush_batch()
+                            deck_id = note_deck_id
+                            target = await open_import_target(session, current_user.id, deck_name)
+                            sets[target.id] = target
+                        batch.append({
+                            'set_id': target.id,
+                            'front': card['front'],
+                            'back': card['back'],
+                            'difficulty': card['difficulty'],
+                            'hash_key': card_hash_key(card['front'], card['back']),
+                            'created_at': datetime.utcnow()
+                        })
+                        if len(batch) >= IMPORT_BATCH_SIZE:
+                            await flush_batch()
+                if batch:
+                    await flush_batch()
+            except Exception:
+                await session.rollback()
+                imports.finish(status, 'failed', 'Import failed')
+                raise
+            
+            for set_id in sets:
+                record_change(session, current_user.id, 'set', set_id)
+            if sets:
+                await record_new_cards(session, current_user.id, list(sets), last_card_id)
+            await session.commit()
+            status['set_ids'] = list(sets)
+            imports.finish(status, 'done')
+            return jsonify(status), 201
+    finally:
+        if reader is not None:
+            await asyncio.to_thread(reader.close)
+        await asyncio.to_thread(shutil.rmtree, directory, True)
+
+async def open_import_target(session, user_id, deck_name):
+    """The set an Anki deck is imported into, created if it does not exist"""
+    name, folder = split_deck_name(deck_name)
+    flashcard_set = await session.scalar(
+        select(FlashcardSet)
+        .where(FlashcardSet.user_id == user_id)
+        .where(FlashcardSet.name == name)
+        .where(FlashcardSet.folder == folder)
+        .order_by(FlashcardSet.id)
+        .limit(1)
+    )
+    if flashcard_set is None:
+        flashcard_set = FlashcardSet(
+            name=name,
+            folder=folder,
+            user_id=user_id,
+            cards_digest=EMPTY_DIGEST
+        )
+        session.add(flashcard_set)
+        await session.flush()  # Get new set ID
+    return flashcard_set
+
+async def skip_existing_cards(session, set_id, rows):
+    """rows without the cards already in the set or repeated earlier in rows
+
+    One lookup on the hash_key index per batch, however big the set is.
+    """
+    result = await session.scalars(
+        select(Flashcard.hash_key)
+        .where(Flashcard.set_id == set_id)
+        .where(Flashcard.hash_key.in_({row['hash_key'] for row in rows}))
+    )
+    seen = set(result)
+    kept = []
+    for row in rows:
+        if row['hash_key'] not in seen:
+            seen.add(row['hash_key'])
+            kept.append(row)
+    return kept
+
+@flashcard_bp.route('/anki/export', methods=['GET'])
+@token_required
+async def export_anki(current_user):
+    """Download sets as an Anki .apkg package (all sets, or those in set_id)
+
+    The package has to be a complete SQLite file before it can be sent, so
+    it is built on disk from a server-side cursor and then streamed.
+    """
+    set_ids = request.args.getlist('set_id', type=int)
+    query = (
+        select(FlashcardSet.id, FlashcardSet.name, FlashcardSet.folder, Flashcard.id,
+               Flashcard.front, Flashcard.back, Flashcard.difficulty)
+        .join(Flashcard, Flashcard.set_id == FlashcardSet.id)
+        .where(FlashcardSet.user_id == current_user.id)
+        .order_by(FlashcardSet.id, Flashcard.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    if set_ids:
+        query = query.where(FlashcardSet.id.in_(set_ids))
+    
+    directory = await asyncio.to_thread(tempfile.mkdtemp, prefix='anki-')
+    collection_path = os.path.join(directory, 'collection.anki2')
+    package_path = os.path.join(directory, 'flashcards.apkg')
+    try:
+        writer = await asyncio.to_thread(CollectionWriter, collection_path)
+        async with db.session() as session:
+            result = await session.stream(query)
+            async for rows in result.partitions():
+                await asyncio.to_thread(writer.add_batch, rows)
+        await asyncio.to_thread(writer.close)
+        await asyncio.to_thread(write_package, collection_path, package_path)
+    except BaseException:
+        await asyncio.to_thread(shutil.rmtree, directory, True)
+        raise
+    
+    async def send():
+        try:
+            with open(package_path, 'rb') as f:
+                while chunk := await asyncio.to_thread(f.read, FILE_CHUNK_SIZE):
+                    yield chunk
+        finally:
+            await asyncio.to_thread(shutil.rmtree, directory, True)
+    
+    response = Response(send(), mimetype='application/octet-stream')
+    response.headers['Content-Disposition'] = 'attachment; filename="flashcards.apkg"'
+    response.content_length = os.path.getsize(package_path)
+    response.timeout = None
+    return response
+
+@flashcard_bp.route('/import/<import_id>', methods=['GET'])
+@token_required
+async def get_import_progress(current_user, import_id):
+    """Progress of a running or recently finished import"""
+    status = imports.get(import_id)
+    if not status or status['user_id'] != current_user.id:
+        return jsonify({'message': 'Import not found'}), 404
+    return jsonify(status)
+
+@flashcard_bp.route('/export', methods=['GET'])
+@token_required
+async def export_flashcards(current_user):
+    """Stream every set and card of the user as JSONL, CSV or a zip of CSVs
+
+    Rows are read EXPORT_BATCH_SIZE at a time, each batch in its own short
+    transaction that ends before the batch is sent, so the collection is
+    never held in memory and a slow download does not keep writers waiting
+    on SQLite's lock. Batches continue after the last set and card id sent,
+    so a card changed during the download may appear as of either side of
+    the change. Pass set_id (repeatable) to export only some sets.
+    """
+    fmt = request.args.get('format', 'jsonl').lower()
+    if fmt not in EXPORTERS:
+        return jsonify({'message': f'Format must be one of {", ".join(EXPORTERS)}'}), 400
+    set_ids = request.args.getlist('set_id', type=int)
+    
+    query = (
+        select(FlashcardSet.id, FlashcardSet.name, FlashcardSet.folder, Flashcard.front,
+               Flashcard.back, Flashcard.difficulty, Flashcard.created_at, Flashcard.id)
+        .outerjoin(Flashcard, Flashcard.set_id == FlashcardSet.id)
+        .where(FlashcardSet.user_id == current_user.id)
+        .order_by(FlashcardSet.id, Flashcard.id)
+        .limit(EXPORT_BATCH_SIZE)
+    )
+    if set_ids:
+        query = query.where(FlashcardSet.id.in_(set_ids))
+    
+    async def batches():
+        # Runs while the response is being sent, after this handler returned
+        page = query
+        while True:
+            async with db.session() as session:
+                rows = (await session.execute(page)).all()
+            if not rows:
+                return
+            # The exporters take the rows without the card id kept for paging
+            yield [row[:-1] for row in rows]
+            if len(rows) < EXPORT_BATCH_SIZE:
+                return
+            set_id, card_id = rows[-1][0], rows[-1][-1]
+            after = FlashcardSet.id > set_id
+            if card_id is not None:
+                # A set without cards is a single row; otherwise its other cards are next
+                after = or_(after, and_(FlashcardSet.id == set_id, Flashcard.id > card_id))
+            page = query.where(after)
+    
+    export, mimetype = EXPORTERS[fmt]
+    response = Response(export(batches()), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="flashcards.{fmt}"'
+    response.timeout = None  # Large collections take longer than RESPONSE_TIMEOUT to send
+    return response
+
 @flashcard_bp.route('/sets/<int:set_id>', methods=['GET'])
 @token_required
 async def get_flashcard_set(current_user, set_id):
@@ -67,7 +548,20 @@ async def get_flashcard_set(current_user, set_id):
         if not set_:
             return jsonify({'message': 'Set not found'}), 404
         
-        return jsonify({
+        # The tag is kept up to date on write, so an unchanged set is
+        # answered without reading its cards
+        etag = set_etag(set_)
+        if request.if_none_match.contains_weak(etag):
+            return not_modified(etag)
+        
+        result = await session.execute(
+            select(Flashcard)
+            .where(Flashcard.set_id == set_id)
+            .order_by(Flashcard.id)
+        )
+        cards = result.scalars().all()
+        
+        response = jsonify({
             'id': set_.id,
             'name': set_.name,
             'folder': set_.folder,
@@ -76,10 +570,12 @@ async def get_flashcard_set(current_user, set_id):
                 'front': card.front,
                 'back': card.back,
                 'difficulty': card.difficulty,
-                'created_at': card.created_at.isoformat()
-            } for card in set_.flashcards],
-            'created_at': set_.created_at.isoformat()
+                'created_at': card.created_at
+            } for card in cards],
+            'created_at': set_.created_at
         })
+        response.set_etag(etag)
+        return response
 
 @flashcard_bp.route('/sets/<int:set_id>/cards', methods=['POST'])
 @token_required
@@ -96,7 +592,8 @@ async def create_flashcard(current_user, set_id):
             .where(FlashcardSet.id == set_id)
             .where(FlashcardSet.user_id == current_user.id)
         )
-        if not result.scalar_one_or_none():
+        set_ = result.scalar_one_or_none()
+        if not set_:
             return jsonify({'message': 'Set not found'}), 404
         
         new_card = Flashcard(
@@ -104,9 +601,13 @@ async def create_flashcard(current_user, set_id):
             back=data['back'],
             difficulty=data.get('difficulty', 'medium'),
             set_id=set_id,
-            hash_key=generate_hash_key('card', set_id, data['front'], data['back'])
+            hash_key=card_hash_key(data['front'], data['back'])
         )
         session.add(new_card)
+        set_.cards_digest = add_to_digest(set_.cards_digest, new_card.hash_key)
+        await session.flush()  # Get new card ID
+        record_change(session, current_user.id, 'card', new_card.id, set_id=set_id)
+        record_change(session, current_user.id, 'set', set_id)
         await session.commit()
         await session.refresh(new_card)
         
@@ -115,7 +616,7 @@ async def create_flashcard(current_user, set_id):
             'front': new_card.front,
             'back': new_card.back,
             'difficulty': new_card.difficulty,
-            'created_at': new_card.created_at.isoformat()
+            'created_at': new_card.created_at
         }), 201
 
 @flashcard_bp.route('/sets/<int:set_id>/cards/<int:card_id>', methods=['PUT'])
@@ -130,7 +631,8 @@ async def update_flashcard(current_user, set_id, card_id):
             .where(FlashcardSet.id == set_id)
             .where(FlashcardSet.user_id == current_user.id)
         )
-        if not result.scalar_one_or_none():
+        set_ = result.scalar_one_or_none()
+        if not set_:
             return jsonify({'message': 'Set not found'}), 404
         
         # Get card
@@ -145,14 +647,22 @@ async def update_flashcard(current_user, set_id, card_id):
             return jsonify({'message': 'Card not found'}), 404
         
         # Update fields
+        old_hash = card.hash_key
         if 'front' in data:
             card.front = data['front']
-            card.hash_key = generate_hash_key('card', set_id, data['front'], card.back)
+            card.hash_key = card_hash_key(data['front'], card.back)
         if 'back' in data:
             card.back = data['back']
-            card.hash_key = generate_hash_key('card', set_id, card.front, data['back'])
+            card.hash_key = card_hash_key(card.front, data['back'])
         if 'difficulty' in data:
             card.difficulty = data['difficulty']
+        if card.hash_key != old_hash:
+            set_.cards_digest = add_to_digest(
+                remove_from_digest(set_.cards_digest, old_hash), card.hash_key
+            )
+        else:
+            set_.bump_version()  # Difficulty is not in the digest but is in the set's tag
+        record_change(session, current_user.id, 'card', card.id, set_id=set_id)
         
         await session.commit()
         
@@ -161,7 +671,7 @@ async def update_flashcard(current_user, set_id, card_id):
             'front': card.front,
             'back': card.back,
             'difficulty': card.difficulty,
-            'created_at': card.created_at.isoformat()
+            'created_at': card.created_at
         })
 
 @flashcard_bp.route('/sets/<int:set_id>/cards/<int:card_id>', methods=['DELETE'])
@@ -174,7 +684,8 @@ async def delete_flashcard(current_user, set_id, card_id):
             .where(FlashcardSet.id == set_id)
             .where(FlashcardSet.user_id == current_user.id)
         )
-        if not result.scalar_one_or_none():
+        set_ = result.scalar_one_or_none()
+        if not set_:
             return jsonify({'message': 'Set not found'}), 404
         
         # Get card
@@ -189,6 +700,9 @@ async def delete_flashcard(current_user, set_id, card_id):
             return jsonify({'message': 'Card not found'}), 404
         
         await session.delete(card)
+        set_.cards_digest = remove_from_digest(set_.cards_digest, card.hash_key)
+        record_change(session, current_user.id, 'card', card.id, op='delete', set_id=set_id)
+        record_change(session, current_user.id, 'set', set_id)
         await session.commit()
         
         return '', 204
@@ -215,7 +729,7 @@ async def search_flashcards(current_user):
     async with db.session() as session:
         # Build base query
         base_query = (
-            select(FlashcardSet)
+            select(FlashcardSet, card_count())
             .where(FlashcardSet.user_id == current_user.id)
         )
         
@@ -228,15 +742,95 @@ async def search_flashcards(current_user):
             base_query = base_query.where(FlashcardSet.name.ilike(f'%{query}%'))
         
         result = await session.execute(base_query)
-        sets = result.scalars().all()
         
         return jsonify([{
             'id': s.id,
             'name': s.name,
             'folder': s.folder,
-            'card_count': len(s.flashcards),
-            'created_at': s.created_at.isoformat()
-        } for s in sets])
+            'card_count': count,
+            'created_at': s.created_at
+        } for s, count in result])
+
+@flashcard_bp.route('/lookup', methods=['POST'])
+@token_required
+async def lookup_content(current_user):
+    """Find the user's cards and sets with the given content
+
+    Cards are given as {front, back} objects in cards or as hash keys in
+    card_keys; sets as hash keys in set_keys. The reply maps every key that
+    matched to where it was found, e.g. to answer "do I already have this
+    card?" before adding it.
+    """
+    data = await request.get_json()
+    card_keys = [card_hash_key(c.get('front', ''), c.get('back', ''))
+                 for c in data.get('cards', [])]
+    card_keys += data.get('card_keys', [])
+    set_keys = data.get('set_keys', [])
+    if len(card_keys) + len(set_keys) > MAX_LOOKUP_KEYS:
+        return jsonify({'message': f'At most {MAX_LOOKUP_KEYS} keys per request'}), 400
+    
+    cards, sets = {}, {}
+    async with db.session() as session:
+        if card_keys:
+            result = await session.execute(
+                select(Flashcard.hash_key, Flashcard.id, Flashcard.set_id)
+                .join(FlashcardSet, Flashcard.set_id == FlashcardSet.id)
+                .where(FlashcardSet.user_id == current_user.id)
+                .where(Flashcard.hash_key.in_(set(card_keys)))
+                .order_by(Flashcard.id)
+            )
+            for hash_key, card_id, set_id in result:
+                cards.setdefault(hash_key, []).append({'id': card_id, 'set_id': set_id})
+        if set_keys:
+            result = await session.execute(
+                select(FlashcardSet.hash_key, FlashcardSet.id)
+                .where(FlashcardSet.user_id == current_user.id)
+                .where(FlashcardSet.hash_key.in_(set(set_keys)))
+                .order_by(FlashcardSet.id)
+            )
+            for hash_key, set_id in result:
+                sets.setdefault(hash_key, []).append(set_id)
+    
+    return jsonify({'cards': cards, 'sets': sets})
+
+@flashcard_bp.route('/duplicates', methods=['GET'])
+@token_required
+async def get_duplicate_cards(current_user):
+    """Groups of identical cards in the user's sets, or in one set with set_id"""
+    set_id = request.args.get('set_id', type=int)
+    
+    async with db.session() as session:
+        owned = (
+            select(Flashcard.hash_key)
+            .join(FlashcardSet, Flashcard.set_id == FlashcardSet.id)
+            .where(FlashcardSet.user_id == current_user.id)
+        )
+        if set_id is not None:
+            owned = owned.where(Flashcard.set_id == set_id)
+        keys = (await session.scalars(
+            owned.group_by(Flashcard.hash_key)
+            .having(func.count() > 1)
+            .limit(MAX_DUPLICATE_GROUPS)
+        )).all()
+        
+        query = (
+            select(Flashcard.hash_key, Flashcard.id, Flashcard.set_id,
+                   Flashcard.front, Flashcard.back)
+            .join(FlashcardSet, Flashcard.set_id == FlashcardSet.id)
+            .where(FlashcardSet.user_id == current_user.id)
+            .where(Flashcard.hash_key.in_(keys))
+            .order_by(Flashcard.hash_key, Flashcard.id)
+        )
+        if set_id is not None:
+            query = query.where(Flashcard.set_id == set_id)
+        groups = {}
+        for hash_key, card_id, card_set_id, front, back in await session.execute(query):
+            group = groups.setdefault(hash_key, {
+                'hash_key': hash_key, 'front': front, 'back': back, 'cards': []
+            })
+            group['cards'].append({'id': card_id, 'set_id': card_set_id})
+    
+    return jsonify(list(groups.values()))
 
 @flashcard_bp.route('/sets/<int:set_id>/cards', methods=['GET'])
 @token_required
@@ -275,35 +869,111 @@ async def submit_test(current_user, set_id):
     if not all(k in data for k in ['score', 'duration']):
         return jsonify({'message': 'Missing score or duration'}), 400
     
+    try:
+        score = float(data['score'])
+        duration = int(data['duration'])
+    except (TypeError, ValueError):
+        return jsonify({'message': 'score and duration must be numbers'}), 400
+    if not 0 <= score <= 100 or duration < 0:
+        return jsonify({'message': 'score must be between 0 and 100 and duration not negative'}), 400
+    
+    # Optional per-card results for the review log
+    try:
+        answers = validate_answers(data.get('answers') or [])
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    # A result sent again with the same key is not counted twice
+    key = data.get('idempotency_key')
+    if not valid_key(key):
+        return jsonify({'message': 'Invalid idempotency_key'}), 400
+    
     async with db.session() as session:
+        replayed = await replay(session, current_user.id, key)
+        if replayed is not None:
+            return replayed
+        
         # Verify set exists and user has access
         result = await session.execute(
             select(FlashcardSet)
             .where(FlashcardSet.id == set_id)
             .where(FlashcardSet.user_id == current_user.id)
         )
-        if not result.scalar_one_or_none():
+        set_ = result.scalar_one_or_none()
+        if not set_:
             return jsonify({'message': 'Set not found'}), 404
         
-        # Create test record
+        # Record the test and its result, and fold it into the user's stats
+        completed_at = datetime.utcnow()
         test = Test(
             user_id=current_user.id,
-            flashcard_set_id=set_id,
-            score=data['score'],
-            duration=data['duration']
+            name=f'{set_.name} test'[:100],
+            created_at=completed_at
         )
+        test.results.append(TestResult(
+            user_id=current_user.id,
+            score=score,
+            duration=duration,
+            completed_at=completed_at
+        ))
         session.add(test)
+        await record_test(session, current_user.id, score, completed_at)
+        
+        if answers:
+            # Cards deleted while the test was running are left out
+            cards = {card.id: card for card in (await session.execute(
+                select(Flashcard)
+                .where(Flashcard.set_id == set_id)
+                .where(Flashcard.id.in_({a['card_id'] for a in answers}))
+            )).scalars()}
+            answers = [a for a in answers if a['card_id'] in cards]
+            for answer in answers:
+                card = cards[answer['card_id']]
+                if answer['grade'] < 1:
+                    card.incorrect_count = (card.incorrect_count or 0) + 1
+                card.last_reviewed = completed_at
+            for card in cards.values():
+                card.update_priority()
+            record_reviews(session, current_user.id, set_id, answers, completed_at)
         
         # Calculate XP gain (example formula)
-        xp_gain = int(data['score'] * 10)  # 10 XP per correct answer
-        current_user.xp += xp_gain
+        xp_gain = int(score * 10)  # 10 XP per percentage point
+        award_xp(session, current_user.id, xp_gain)
+        publish(session, current_user.id, 'test', score=score, duration=duration)
         
+        response = jsonify({
+            'message': 'Test submitted successfully',
+            'xp_gained': xp_gain
+        })
+        response.status_code = 201
+        await remember(session, current_user.id, key, response)
         await session.commit()
+        return response
+
+@flashcard_bp.route('/sets/<int:set_id>/cards/<int:card_id>/reviews', methods=['GET'])
+@token_required
+async def get_card_reviews(current_user, set_id, card_id):
+    """The card's recent answers from the review log, newest first"""
+    async with db.session() as session:
+        result = await session.execute(
+            select(FlashcardSet.id)
+            .where(FlashcardSet.id == set_id)
+            .where(FlashcardSet.user_id == current_user.id)
+        )
+        if result.scalar_one_or_none() is None:
+            return jsonify({'message': 'Set not found'}), 404
+        
+        reviews, summary = await card_history(session, current_user.id, card_id)
         
         return jsonify({
-            'message': 'Test submitted successfully',
-            'xp_gained': xp_gain
-        }), 201
+            'card_id': card_id,
+            'reviews': reviews,
+            # Totals of reviews older than the log keeps
+            'archived': {
+                'reviews': summary.reviews,
+                'mean_grade': summary.total_grade / summary.reviews if summary.reviews else None,
+                'last_reviewed_at': summary.last_reviewed_at
+            } if summary else None
+        })
 
 @flashcard_bp.route('/sets/<int:set_id>', methods=['PUT'])
 @token_required
@@ -328,14 +998,15 @@ async def update_flashcard_set(current_user, set_id):
         # Update set
         set_.name = data['name']
         set_.folder = data.get('folder', 'General')
-        set_.hash_key = generate_hash_key('set', current_user.id, data['name'])
+        set_.bump_version()
+        record_change(session, current_user.id, 'set', set_id)
         await session.commit()
         
         return jsonify({
             'id': set_.id,
             'name': set_.name,
             'folder': set_.folder,
-            'created_at': set_.created_at.isoformat()
+            'created_at': set_.created_at
         })
 
 @flashcard_bp.route('/sets/<int:set_id>/cards', methods=['PUT'])
@@ -358,32 +1029,50 @@ async def update_flashcard_set_cards(current_user, set_id):
         if not set_:
             return jsonify({'message': 'Set not found'}), 404
             
-        # Delete existing cards
-        await session.execute(
-            delete(Flashcard).where(Flashcard.set_id == set_id)
+        # Cards keep their ids, and with them their review history, where
+        # they can: by the id the client sent, else by identical content.
+        # Only the cards left over are deleted.
+        result = await session.execute(
+            select(Flashcard).where(Flashcard.set_id == set_id)
         )
-        
-        # Add new cards
-        for card_data in data['cards']:
-            new_card = Flashcard(
-                front=card_data['front'],
-                back=card_data['back'],
-                difficulty=card_data.get('difficulty', 'medium'),
-                set_id=set_id,
-                hash_key=generate_hash_key('card', set_id, card_data['front'], card_data['back'])
+        existing = {card.id: card for card in result.scalars()}
+        cards_data = data['cards']
+        hash_keys = [card_hash_key(c['front'], c['back']) for c in cards_data]
+        matched = [existing.pop(c['id'], None) if isinstance(c.get('id'), int) else None
+                   for c in cards_data]
+        unmatched = defaultdict(list)  # hash key -> existing cards not claimed by id
+        for card in existing.values():
+            unmatched[card.hash_key].append(card)
+        for i, hash_key in enumerate(hash_keys):
+            if matched[i] is None and unmatched[hash_key]:
+                matched[i] = unmatched[hash_key].pop()
+        removed_ids = [card.id for cards in unmatched.values() for card in cards]
+        if removed_ids:
+            await session.execute(
+                delete(Flashcard).where(Flashcard.id.in_(removed_ids))
             )
-            session.add(new_card)
+            record_changes(session, current_user.id, 'card', removed_ids, op='delete', set_id=set_id)
         
-        await session.commit()
+        # Update kept cards in place and add the new ones
+        cards = []
+        for card, card_data, hash_key in zip(matched, cards_data, hash_keys):
+            if card is None:
+                card = Flashcard(set_id=set_id)
+                session.add(card)
+            card.front = card_data['front']
+            card.back = card_data['back']
+            card.difficulty = card_data.get('difficulty', 'medium')
+            card.hash_key = hash_key
+            cards.append(card)
+        set_.cards_digest = add_to_digest(EMPTY_DIGEST, *hash_keys)
+        await session.flush()  # Get new card IDs
+        record_changes(session, current_user.id, 'card', [c.id for c in cards], set_id=set_id)
+        record_change(session, current_user.id, 'set', set_id)
         
-        # Return updated set
-        result = await session.execute(
-            select(FlashcardSet)
-            .where(FlashcardSet.id == set_id)
-        )
-        set_ = result.scalar_one()
+        await session.commit()
         
-        return jsonify({
+        # Return updated set from the cards just written
+        response = jsonify({
             'id': set_.id,
             'name': set_.name,
             'folder': set_.folder,
@@ -392,10 +1081,12 @@ async def update_flashcard_set_cards(current_user, set_id):
                 'front': card.front,
                 'back': card.back,
                 'difficulty': card.difficulty,
-                'created_at': card.created_at.isoformat()
-            } for card in set_.flashcards],
-            'created_at': set_.created_at.isoformat()
+                'created_at': card.created_at
+            } for card in cards],
+            'created_at': set_.created_at
         })
+        response.set_etag(set_etag(set_))
+        return response
 
 @flashcard_bp.route('/sets/<int:set_id>', methods=['DELETE'])
 @token_required
@@ -413,6 +1104,8 @@ async def delete_flashcard_set(current_user, set_id):
             return jsonify({'message': 'Set not found'}), 404
             
         await session.delete(set_)
+        # Clients drop a deleted set's cards along with it
+        record_change(session, current_user.id, 'set', set_id, op='delete')
         await session.commit()
         
         return '', 204
@@ -426,10 +1119,11 @@ async def copy_flashcard_set(current_user):
         return jsonify({'message': 'Missing set_id'}), 400
     
     async with db.session() as session:
-        # Get original set
+        # Get original set; only the user's own sets can be copied
         result = await session.execute(
             select(FlashcardSet)
             .where(FlashcardSet.id == data['set_id'])
+            .where(FlashcardSet.user_id == current_user.id)
         )
         original_set = result.scalar_one_or_none()
         
@@ -441,21 +1135,30 @@ async def copy_flashcard_set(current_user):
             name=f"{original_set.name} (Copy)",
             folder=original_set.folder,
             user_id=current_user.id,
-            hash_key=generate_hash_key('set', current_user.id, f"{original_set.name} (Copy)")
+            # Same cards, so the digest and content hash carry over unchanged
+            cards_digest=original_set.cards_digest
         )
         session.add(new_set)
         await session.flush()  # Get new set ID
         
-        # Copy cards
-        for card in original_set.flashcards:
-            new_card = Flashcard(
-                front=card.front,
-                back=card.back,
-                difficulty=card.difficulty,
-                set_id=new_set.id,
-                hash_key=generate_hash_key('card', new_set.id, card.front, card.back)
+        # Copy cards, read explicitly since relationships cannot lazy load here
+        result = await session.execute(
+            select(Flashcard.front, Flashcard.back, Flashcard.difficulty, Flashcard.hash_key)
+            .where(Flashcard.set_id == original_set.id)
+            .order_by(Flashcard.id)
+        )
+        now = datetime.utcnow()
+        rows = [{**row._mapping, 'set_id': new_set.id, 'created_at': now} for row in result]
+        card_ids = []
+        if rows:
+            # One executemany instead of an INSERT per card
+            result = await session.scalars(
+                insert(Flashcard).returning(Flashcard.id, sort_by_parameter_order=True),
+                rows
             )
-            session.add(new_card)
+            card_ids = result.all()
+        record_change(session, current_user.id, 'set', new_set.id)
+        record_changes(session, current_user.id, 'card', card_ids, set_id=new_set.id)
         
         await session.commit()
         
@@ -463,5 +1166,132 @@ async def copy_flashcard_set(current_user):
             'id': new_set.id,
             'name': new_set.name,
             'folder': new_set.folder,
-            'created_at': new_set.created_at.isoformat()
+            'created_at': new_set.created_at
         }), 201
+
+@flashcard_bp.route('/changes', methods=['GET'])
+@token_required
+async def get_changes(current_user):
+    """Sets and cards changed since the client's version watermark
+
+    since=0 (or no since) returns a full snapshot, limit cards at a time:
+    the first page has every set, and while more is true the next page is
+    asked for with after set to the cursor of the last one. The client keeps
+    the version of the first page. Otherwise the user's change log is read
+    after the watermark and collapsed to the latest change per entity. A
+    deleted set implies its cards are deleted too.
+    """
+    try:
+        since = int(request.args.get('since', 0))
+        after = int(request.args.get('after', 0))
+        limit = max(1, min(int(request.args.get('limit', CHANGES_PAGE_SIZE)), CHANGES_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'message': 'since, after and limit must be integers'}), 400
+    
+    async with db.session() as session:
+        if since <= 0:
+            result = await session.execute(
+                select(func.max(ChangeLog.id)).where(ChangeLog.user_id == current_user.id)
+            )
+            version = result.scalar() or 0
+            sets = []
+            if after <= 0:
+                result = await session.execute(
+                    select(FlashcardSet).where(FlashcardSet.user_id == current_user.id)
+                )
+                sets = result.scalars().all()
+            # Keyset pages over card ids, so each page is one indexed read
+            result = await session.execute(
+                select(Flashcard)
+                .join(FlashcardSet, Flashcard.set_id == FlashcardSet.id)
+                .where(FlashcardSet.user_id == current_user.id)
+                .where(Flashcard.id > after)
+                .order_by(Flashcard.id)
+                .limit(limit + 1)
+            )
+            cards = result.scalars().all()
+            more = len(cards) > limit
+            cards = cards[:limit]
+            response = await changes_response(
+                session, version, more, sets, cards, [], [], snapshot=True
+            )
+            response['cursor'] = cards[-1].id if cards else after
+            return jsonify(response)
+        
+        result = await session.execute(
+            select(ChangeLog)
+            .where(ChangeLog.user_id == current_user.id)
+            .where(ChangeLog.id > since)
+            .order_by(ChangeLog.id)
+            .limit(limit + 1)
+        )
+        changes = result.scalars().all()
+        more = len(changes) > limit
+        changes = changes[:limit]
+        version = changes[-1].id if changes else since
+        
+        # Only the latest change to each entity matters
+        latest = {}
+        for change in changes:
+            latest[(change.entity, change.entity_id)] = change.op
+        
+        upsert_set_ids = [i for (e, i), op in latest.items() if e == 'set' and op == 'upsert']
+        upsert_card_ids = [i for (e, i), op in latest.items() if e == 'card' and op == 'upsert']
+        deleted_sets = {i for (e, i), op in latest.items() if e == 'set' and op == 'delete'}
+        deleted_cards = {i for (e, i), op in latest.items() if e == 'card' and op == 'delete'}
+        
+        sets, cards = [], []
+        if upsert_set_ids:
+            result = await session.execute(
+                select(FlashcardSet)
+                .where(FlashcardSet.id.in_(upsert_set_ids))
+                .where(FlashcardSet.user_id == current_user.id)
+            )
+            sets = result.scalars().all()
+            # Rows deleted since the change was logged count as deletions
+            deleted_sets |= set(upsert_set_ids) - {s.id for s in sets}
+        if upsert_card_ids:
+            result = await session.execute(
+                select(Flashcard).where(Flashcard.id.in_(upsert_card_ids))
+            )
+            cards = [c for c in result.scalars().all() if c.set_id not in deleted_sets]
+            deleted_cards |= set(upsert_card_ids) - {c.id for c in cards}
+        
+        return jsonify(await changes_response(
+            session, version, more, sets, cards, sorted(deleted_sets), sorted(deleted_cards)
+        ))
+
+async def changes_response(session, version, more, sets, cards, deleted_sets, deleted_cards,
+                           snapshot=False):
+    card_counts = {}
+    if sets:
+        result = await session.execute(
+            select(Flashcard.set_id, func.count(Flashcard.id))
+            .where(Flashcard.set_id.in_([s.id for s in sets]))
+            .group_by(Flashcard.set_id)
+        )
+        card_counts = dict(result.all())
+    
+    return {
+        'version': version,
+        'more': more,
+        'snapshot': snapshot,
+        'sets': [{
+            'id': s.id,
+            'name': s.name,
+            'folder': s.folder,
+            'card_count': card_counts.get(s.id, 0),
+            'etag': set_etag(s),
+            'created_at': s.created_at
+        } for s in sets],
+        'cards': [{
+            'id': c.id,
+            'set_id': c.set_id,
+            'front': c.front,
+            'back': c.back,
+            'difficulty': c.difficulty,
+            'created_at': c.created_at
+        } for c in cards],
+        'deleted_sets': deleted_sets,
+        'deleted_cards': deleted_cards
+    }
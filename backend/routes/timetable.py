@@ -1,7 +1,8 @@
 from quart import Blueprint, request, jsonify
-from sqlalchemy import select
+from sqlalchemy import select, update
 from models import Timetable, Target
 from utils import token_required, async_session
+from titles import award_xp, publish
 from datetime import datetime, timedelta
 
 timetable_bp = Blueprint('timetable', __name__)
@@ -36,12 +37,12 @@ async def get_timetables(current_user):
                     'id': target.id,
                     'description': target.description,
                     'completed': target.completed,
-                    'completed_at': target.completed_at.isoformat() if target.completed_at else None
+                    'completed_at': target.completed_at
                 })
             
             response.append({
                 'id': timetable.id,
-                'week_start': timetable.week_start.isoformat(),
+                'week_start': timetable.week_start,
                 'targets': targets_by_day
             })
         
@@ -106,7 +107,7 @@ async def create_timetable(current_user):
         
         return jsonify({
             'id': new_timetable.id,
-            'week_start': new_timetable.week_start.isoformat(),
+            'week_start': new_timetable.week_start,
             'targets': targets_data
         }), 201
 
@@ -149,12 +150,12 @@ async def get_current_timetable(current_user):
                 'id': target.id,
                 'description': target.description,
                 'completed': target.completed,
-                'completed_at': target.completed_at.isoformat() if target.completed_at else None
+                'completed_at': target.completed_at
             })
             
         return jsonify({
             'id': timetable.id,
-            'week_start': timetable.week_start.isoformat(),
+            'week_start': timetable.week_start,
             'targets': targets_by_day
         })
 
@@ -188,7 +189,7 @@ async def get_timetable_history(current_user):
             
             response.append({
                 'id': timetable.id,
-                'week_start': timetable.week_start.isoformat(),
+                'week_start': timetable.week_start,
                 'total_targets': total_targets,
                 'completed_targets': completed_targets,
                 'completion_rate': completion_rate
@@ -201,25 +202,40 @@ async def get_timetable_history(current_user):
 async def complete_target(current_user, target_id):
     async with async_session() as session:
         # Get target and verify ownership
+        # The week start comes with the target; a lazy load would fail in async code
         result = await session.execute(
-            select(Target)
+            select(Target, Timetable.week_start)
             .join(Timetable)
             .where(Target.id == target_id)
             .where(Timetable.user_id == current_user.id)
         )
-        target = result.scalar_one_or_none()
+        row = result.one_or_none()
         
-        if not target:
+        if not row:
             return jsonify({'message': 'Target not found'}), 404
+        target, week_start = row
         
-        # Complete target
-        target.completed = True
-        target.completed_at = datetime.utcnow()
+        # Complete target. Only the request that flips the flag awards XP,
+        # so completing it again, even concurrently, earns nothing.
+        completed = await session.execute(
+            update(Target)
+            .where(Target.id == target_id)
+            .where(Target.completed.isnot(True))
+            .values(completed=True, completed_at=datetime.utcnow())
+        )
+        if completed.rowcount == 0:
+            return jsonify({
+                'message': 'Target already completed',
+                'xp_gained': 0
+            })
         
         # Calculate XP gained (more XP for completing targets on time)
         today = datetime.now()
-        target_day = target.timetable.week_start + timedelta(days=target.day)
-        xp_gained = 50 if today.date() <= target_day.date() else 25
+        target_day = week_start + timedelta(days=target.day)
+        on_time = today.date() <= target_day.date()
+        xp_gained = 50 if on_time else 25
+        award_xp(session, current_user.id, xp_gained)
+        publish(session, current_user.id, 'target', timetable_id=target.timetable_id, on_time=on_time)
         
         await session.commit()
         
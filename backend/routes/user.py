@@ -0,0 +1,48 @@
+from quart import Blueprint, jsonify
+from sqlalchemy import select
+from models import UserTitle, UserStats
+from utils import token_required, async_session
+from stats import daily_xp, summary
+
+user_bp = Blueprint('user', __name__)
+
+# Everything here reads the user's row, their stats row and their titles,
+# so the cost does not grow with the number of tests they have taken
+
+@user_bp.route('/profile', methods=['GET'])
+@token_required
+async def get_profile(current_user):
+    async with async_session() as session:
+        stats = await session.get(UserStats, current_user.id)
+        
+        return jsonify({
+            'id': current_user.id,
+            'username': current_user.username,
+            'email': current_user.email,
+            'xp': current_user.xp or 0,
+            'daily_xp': daily_xp(stats),
+            'created_at': current_user.created_at
+        })
+
+@user_bp.route('/titles', methods=['GET'])
+@token_required
+async def get_titles(current_user):
+    async with async_session() as session:
+        result = await session.execute(
+            select(UserTitle)
+            .where(UserTitle.user_id == current_user.id)
+            .order_by(UserTitle.earned_at)
+        )
+        
+        return jsonify([{
+            'title': title.title,
+            'unlocked_at': title.earned_at
+        } for title in result.scalars()])
+
+@user_bp.route('/tests', methods=['GET'])
+@token_required
+async def get_test_stats(current_user):
+    async with async_session() as session:
+        stats = await session.get(UserStats, current_user.id)
+        
+        return jsonify(summary(stats))
@@ -0,0 +1,59 @@
+import json
+from datetime import datetime
+
+from models import UserStats
+
+RECENT_SCORES = 10  # scores kept for the progress graph
+
+# Every update is O(1) in the number of tests taken: the mean is a running
+# mean and only the last RECENT_SCORES scores are stored.
+
+def add_score(test_count, mean_score, recent_scores, score, completed_at):
+    """Stats columns after one more test result"""
+    count = test_count + 1
+    recent = json.loads(recent_scores)
+    recent.append({'score': score, 'completed_at': completed_at.isoformat()})
+    return {
+        'test_count': count,
+        'mean_score': mean_score + (score - mean_score) / count,
+        'recent_scores': json.dumps(recent[-RECENT_SCORES:]),
+    }
+
+async def get_stats(session, user_id):
+    """The user's stats row, created if they have none yet"""
+    stats = await session.get(UserStats, user_id)
+    if stats is None:
+        stats = UserStats(user_id=user_id, test_count=0, mean_score=0.0,
+                          recent_scores='[]', daily_xp=0)
+        session.add(stats)
+    return stats
+
+async def record_test(session, user_id, score, completed_at):
+    stats = await get_stats(session, user_id)
+    values = add_score(stats.test_count, stats.mean_score, stats.recent_scores,
+                       score, completed_at)
+    for key, value in values.items():
+        setattr(stats, key, value)
+
+async def record_xp(session, user_id, amount):
+    """Add to today's XP, starting again from zero on a new UTC day"""
+    stats = await get_stats(session, user_id)
+    today = datetime.utcnow().date()
+    if stats.daily_xp_date != today:
+        stats.daily_xp, stats.daily_xp_date = 0, today
+    stats.daily_xp += amount
+
+def daily_xp(stats):
+    if stats is None or stats.daily_xp_date != datetime.utcnow().date():
+        return 0
+    return stats.daily_xp
+
+def summary(stats):
+    """The test statistics the progress screen shows"""
+    if stats is None:
+        return {'test_count': 0, 'mean_score': None, 'recent': []}
+    return {
+        'test_count': stats.test_count,
+        'mean_score': round(stats.mean_score, 1) if stats.test_count else None,
+        'recent': json.loads(stats.recent_scores),
+    }
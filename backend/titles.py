@@ -0,0 +1,135 @@
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import select, update, func
+from sqlalchemy.dialects.sqlite import insert
+
+from jobs import jobs
+from models import User, UserTitle, Target
+from pubsub import publish_xp_change
+from stats import record_xp
+
+class TitleEngine:
+    """Awards titles from rules indexed by the event type they listen to
+
+    An event only runs the rules registered for its type, and only those
+    for titles the user does not hold yet, so the cost of an event is the
+    rules it touches rather than the user's history. A rule is a coroutine
+    check(session, user_id, data) returning whether the event earns its
+    title; most decide from the event data alone. Awards are inserted with
+    ON CONFLICT DO NOTHING on the unique (user_id, title) index, so an event
+    handled twice never awards a title twice.
+    """
+    def __init__(self):
+        self._rules = defaultdict(list)  # event type -> [(title, check)]
+
+    def rule(self, title, *events):
+        """Register a check that awards title when one of events satisfies it"""
+        def register(check):
+            for event in events:
+                self._rules[event].append((title, check))
+            return check
+        return register
+
+    def listens_to(self, event):
+        return event in self._rules
+
+    def titles(self):
+        return sorted({title for rules in self._rules.values() for title, _ in rules})
+
+    async def handle(self, session, user_id, event, data):
+        """Award the titles an event earns; returns the newly earned titles"""
+        rules = self._rules.get(event)
+        if not rules:
+            return []
+        held = set((await session.execute(
+            select(UserTitle.title)
+            .where(UserTitle.user_id == user_id)
+            .where(UserTitle.title.in_([title for title, _ in rules]))
+        )).scalars())
+        earned = []
+        for title, check in rules:
+            if title not in held and title not in earned and await check(session, user_id, data):
+                earned.append(title)
+        if earned:
+            now = datetime.utcnow()
+            await session.execute(
+                insert(UserTitle)
+                .values([{'user_id': user_id, 'title': title, 'earned_at': now} for title in earned])
+                .on_conflict_do_nothing(index_elements=['user_id', 'title'])
+            )
+        return earned
+
+# Global engine instance
+titles = TitleEngine()
+
+# Events are queued as jobs, so they never slow down the request that caused them
+
+def award_xp(session, user_id, amount):
+    """Queue an XP award; the titles the new total unlocks follow from it"""
+    jobs.enqueue(session, 'award_xp', user_id=user_id, amount=amount)
+
+def publish(session, user_id, event, **data):
+    """Queue an event for the title rules that listen to it"""
+    if titles.listens_to(event):
+        jobs.enqueue(session, 'title_event', user_id=user_id, event=event, data=data)
+
+@jobs.handler('award_xp')
+async def award_xp_job(session, user_id, amount):
+    # A single UPDATE, so awards running together cannot overwrite each other
+    await session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(xp=func.coalesce(User.xp, 0) + amount)
+    )
+    xp = (await session.execute(select(User.xp).where(User.id == user_id))).scalar_one_or_none()
+    if xp is not None:
+        await record_xp(session, user_id, amount)
+        await titles.handle(session, user_id, 'xp', {'xp': xp})
+        await publish_xp_change(session, user_id, amount, xp)
+
+@jobs.handler('title_event')
+async def title_event_job(session, user_id, event, data):
+    await titles.handle(session, user_id, event, data)
+
+# Rules. Events and their data:
+#   xp      xp (the user's new total)
+#   test    score (percent), duration (seconds)
+#   target  timetable_id, on_time
+
+XP_TITLES = {'Scholar': 1000, 'Expert': 5000, 'Master': 10000}  # title -> XP needed
+
+def xp_rule(title, needed):
+    async def check(session, user_id, data):
+        return data['xp'] >= needed
+    titles.rule(title, 'xp')(check)
+
+for title, needed in XP_TITLES.items():
+    xp_rule(title, needed)
+
+@titles.rule('Test Taker', 'test')
+async def first_test(session, user_id, data):
+    return True
+
+@titles.rule('Perfectionist', 'test')
+async def perfect_score(session, user_id, data):
+    return data['score'] >= 100
+
+@titles.rule('Planner', 'target')
+async def first_target(session, user_id, data):
+    return True
+
+@titles.rule('Punctual', 'target')
+async def on_time_target(session, user_id, data):
+    return data['on_time']
+
+@titles.rule('Week Finisher', 'target')
+async def week_complete(session, user_id, data):
+    # At most a week of targets, read through ix_targets_timetable_id_day
+    remaining = (await session.execute(
+        select(func.count())
+        .select_from(Target)
+        .where(Target.timetable_id == data['timetable_id'])
+        .where(Target.completed.isnot(True))
+    )).scalar()
+    return remaining == 0
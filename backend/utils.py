@@ -1,22 +1,23 @@
 from functools import wraps
 from quart import request, jsonify
 import jwt
-import hashlib
-from datetime import datetime
+from sqlalchemy import select
+import os
 from database import db
+from hashing import generate_hash_key  # Re-exported; it used to live here
 
 # Configuration
-DATABASE_URL = "sqlite+aiosqlite:///database/rafifi.db"
+DATABASE_URL = os.environ.get("RAFIFI_DATABASE_URL", "sqlite+aiosqlite:///database/rafifi.db")
+SQL_ECHO = os.environ.get("RAFIFI_SQL_ECHO", "1") == "1"  # Log every SQL statement
 SECRET_KEY = "your-secret-key-here"  # Fixed secret key for development
+# Ids of the users allowed to reach /admin endpoints, comma separated. Ids
+# rather than usernames, which anyone can claim by registering first.
+ADMIN_USER_IDS = {int(user_id) for user_id in
+                  os.environ.get("RAFIFI_ADMIN_USER_IDS", "").split(",") if user_id.strip()}
 
 # Initialize database
-db.init(DATABASE_URL)
-
-def generate_hash_key(prefix, *args):
-    """Generate a hash key for database objects"""
-    timestamp = datetime.utcnow().timestamp()
-    data = f"{prefix}:{':'.join(str(arg) for arg in args)}:{timestamp}"
-    return hashlib.sha256(data.encode()).hexdigest()
+db.init(DATABASE_URL, echo=SQL_ECHO)
+async_session = db.session  # Used by the auth, class and timetable routes
 
 def token_required(f):
     @wraps(f)
@@ -37,7 +38,7 @@ def token_required(f):
             from models import User
             async with db.session() as session:
                 result = await session.execute(
-                    select(User).where(User.id == data['id'])
+                    select(User).where(User.id == data['user_id'])
                 )
                 current_user = result.scalar_one_or_none()
                 
@@ -53,3 +54,13 @@ def token_required(f):
             return jsonify({'message': f'Error: {str(e)}'}), 401
     
     return decorated
+
+def admin_required(f):
+    @wraps(f)
+    @token_required
+    async def decorated(current_user, *args, **kwargs):
+        if current_user.id not in ADMIN_USER_IDS:
+            return jsonify({'message': 'Admin access required'}), 403
+        return await f(current_user, *args, **kwargs)
+
+    return decorated
@@ -9,23 +9,26 @@ class PriorityQueue(Generic[T]):
     """Priority queue implementation using a heap"""
     def __init__(self):
         self._heap = []
+        self._count = 0
     
     def push(self, item: T, priority: int):
         """Add item with priority (higher priority = served first)"""
-        # Negate priority because heapq is min-heap
-        heappush(self._heap, (-priority, item))
+        # Negate priority because heapq is min-heap; the counter breaks ties in
+        # insertion order so items themselves are never compared
+        heappush(self._heap, (-priority, self._count, item))
+        self._count += 1
     
     def pop(self) -> T:
         """Remove and return highest priority item"""
         if not self._heap:
             raise IndexError("Queue is empty")
-        return heappop(self._heap)[1]
+        return heappop(self._heap)[2]
     
     def peek(self) -> T:
         """Return highest priority item without removing"""
         if not self._heap:
             raise IndexError("Queue is empty")
-        return self._heap[0][1]
+        return self._heap[0][2]
     
     def is_empty(self) -> bool:
         """Check if queue is empty"""
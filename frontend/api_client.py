@@ -0,0 +1,96 @@
+import logging
+import os
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+API_URL = os.environ.get('RAFIFI_API_URL', 'http://localhost:5000')
+POOL_SIZE = 8  # kept-alive connections; covers the request worker and the sync thread
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.3  # sleeps 0.3s, 0.6s, 1.2s between retries
+RETRY_STATUSES = (502, 503, 504)
+SLOW_REQUEST = 1.0  # seconds; slower requests are logged as warnings
+
+# (connect, read) timeouts in seconds; the longest matching path prefix wins
+DEFAULT_TIMEOUT = (3.05, 10)
+TIMEOUTS = {
+    '/auth/': (3.05, 15),  # password hashing is deliberately slow
+    '/flashcard/changes': (3.05, 30),  # first sync sends a full snapshot
+    '/flashcard/sets/': (3.05, 20),
+    '/flashcard/import': (3.05, 600),  # the reply comes once the whole file is stored
+    '/flashcard/import/': DEFAULT_TIMEOUT,  # progress of a running import
+    '/flashcard/export': (3.05, 60),  # read timeout applies between streamed chunks
+    '/flashcard/anki/': (3.05, 600),  # packages are built completely before they are sent
+}
+
+class ApiClient:
+    """HTTP client shared by every frame
+
+    One requests.Session keeps connections to the server alive between
+    calls. Idempotent requests are retried with exponential backoff on
+    connection errors and gateway errors; POSTs are only retried when the
+    connection could not be made, so they are never sent twice.
+    """
+    def __init__(self, base_url=API_URL, pool_size=POOL_SIZE, retries=MAX_RETRIES):
+        self.base_url = base_url.rstrip('/')
+        self.token = None
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            backoff_factor=BACKOFF_FACTOR,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def timeout_for(self, path):
+        matches = [prefix for prefix in TIMEOUTS if path.startswith(prefix)]
+        if not matches:
+            return DEFAULT_TIMEOUT
+        return TIMEOUTS[max(matches, key=len)]
+
+    def request(self, method, path, headers=None, **kwargs):
+        """Send a request to path on the server and log how long it took
+
+        The session's token is sent unless headers already carry an
+        Authorization header.
+        """
+        headers = dict(headers or {})
+        if self.token and 'Authorization' not in headers:
+            headers['Authorization'] = f'Bearer {self.token}'
+        kwargs.setdefault('timeout', self.timeout_for(path))
+
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, f'{self.base_url}{path}',
+                                            headers=headers, **kwargs)
+        except requests.exceptions.RequestException as e:
+            elapsed = time.perf_counter() - start
+            logger.warning(f"{method} {path} failed after {elapsed * 1000:.0f}ms: {e}")
+            raise
+        elapsed = time.perf_counter() - start
+        log = logger.warning if elapsed >= SLOW_REQUEST else logger.debug
+        log(f"{method} {path} {response.status_code} in {elapsed * 1000:.0f}ms")
+        return response
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request('PUT', path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request('DELETE', path, **kwargs)
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,78 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+FRONTEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a fresh interpreter each time so module imports are cold
+PROBE = '''
+import json, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+app = main.App()
+app.update()  # draw the login screen
+ready = time.perf_counter()
+all_frames = None
+if {all_frames}:
+    # Everything the app used to build before showing the login screen
+    for name in main.FRAME_MODULES:
+        app.get_frame(name)
+    app.update()
+    all_frames = time.perf_counter() - start
+app.sync.set_user(None, None)
+app.destroy()
+print(json.dumps({{'import': imported - start, 'login_screen': ready - start,
+                  'all_frames': all_frames}}))
+'''
+
+def run_probe(all_frames):
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE.format(all_frames=all_frames)],
+        cwd=FRONTEND_DIR, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def slowest_imports(top):
+    """Cumulative import time per module from python -X importtime"""
+    stderr = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import main'],
+        cwd=FRONTEND_DIR, capture_output=True, text=True, check=True
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        # "import time:  self [us] | cumulative | imported package"
+        _, cumulative_us, module = line[len('import time:'):].split('|')
+        rows.append((int(cumulative_us), module.strip()))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure desktop client startup time')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--all-frames', action='store_true',
+                        help='also time building every frame, as eager startup did')
+    parser.add_argument('--top', type=int, default=0,
+                        help='list the N slowest imports of main.py')
+    args = parser.parse_args()
+
+    results = [run_probe(args.all_frames) for _ in range(args.runs)]
+    metrics = ['import', 'login_screen'] + (['all_frames'] if args.all_frames else [])
+    print(f"{'metric':<14}{'min':>10}{'median':>10}{'max':>10}")
+    for metric in metrics:
+        values = [r[metric] * 1000 for r in results]
+        print(f"{metric:<14}{min(values):>8.1f}ms{statistics.median(values):>8.1f}ms"
+              f"{max(values):>8.1f}ms")
+
+    if args.top:
+        print("\nSlowest imports (cumulative):")
+        for cumulative_us, module in slowest_imports(args.top):
+            print(f"  {cumulative_us / 1000:>8.1f}ms  {module}")
+
+if __name__ == '__main__':
+    main()
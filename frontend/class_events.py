@@ -0,0 +1,102 @@
+import json
+import logging
+import threading
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 45  # the server sends a keep-alive every 15 seconds
+RETRY_DELAYS = (1, 2, 5, 10, 30)  # seconds between reconnects; the last one repeats
+
+class ClassEventStream(threading.Thread):
+    """Background thread that listens to the server-sent events of one class
+
+    Events are reported through events (the app's queue.Queue) as
+    ('class_event', (class_id, event)) tuples, for the Tk thread to pick up.
+    watch(class_id) switches to another class, and watch(None) stops
+    listening. A dropped connection is reopened with backoff, followed by a
+    resync event since anything sent in between was missed.
+    """
+    def __init__(self, api, events):
+        super().__init__(name='class-events', daemon=True)
+        self.api = api
+        self.events = events
+        self.class_id = None
+        self._response = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+
+    def watch(self, class_id):
+        with self._lock:
+            if class_id == self.class_id:
+                return
+            self.class_id = class_id
+            # Closing the response ends the blocking read in run()
+            if self._response is not None:
+                self._response.close()
+        self._wake.set()
+
+    def run(self):
+        failures = 0
+        listened_to = None  # class whose stream was open before
+        while True:
+            class_id = self.class_id
+            if class_id is None or not self.api.token:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            try:
+                if self.listen(class_id, resync=class_id == listened_to):
+                    failures = 0
+                    listened_to = class_id
+            except (requests.exceptions.RequestException, AttributeError, ValueError) as e:
+                # AttributeError/ValueError come from reading a response closed by watch()
+                if class_id != self.class_id:
+                    continue
+                logger.info(f'Class event stream dropped: {e}')
+            if class_id != self.class_id:
+                continue
+            delay = RETRY_DELAYS[min(failures, len(RETRY_DELAYS) - 1)]
+            failures += 1
+            self._wake.wait(delay)
+            self._wake.clear()
+
+    def listen(self, class_id, resync):
+        """Read events until the stream ends; True if it was opened"""
+        response = self.api.get(f'/class/{class_id}/events', stream=True,
+                                timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+        with self._lock:
+            if class_id != self.class_id:
+                response.close()
+                return False
+            self._response = response
+        try:
+            if response.status_code != 200:
+                logger.warning(f'Could not listen to class {class_id}: {response.status_code}')
+                if response.status_code == 404:
+                    # No longer a member; retrying will not help
+                    with self._lock:
+                        if self.class_id == class_id:
+                            self.class_id = None
+                return False
+            if resync:
+                # Whatever happened while disconnected was missed
+                self.events.put(('class_event', (class_id, {'type': 'resync'})))
+            data = []
+            for line in response.iter_lines(decode_unicode=True):
+                if line:
+                    if line.startswith('data:'):
+                        data.append(line[5:].strip())
+                    continue
+                # A blank line ends an event; comments have no data
+                if data:
+                    self.events.put(('class_event', (class_id, json.loads('\n'.join(data)))))
+                    data = []
+            return True
+        finally:
+            with self._lock:
+                if self._response is response:
+                    self._response = None
+            response.close()
@@ -0,0 +1,69 @@
+import json
+import time
+from collections import OrderedDict
+
+MAX_BYTES = 16 * 1024 * 1024
+REVALIDATE_AFTER = 30  # seconds before a cached deck is checked with the server again
+
+def normalize_etag(etag):
+    """Strip the weak prefix and quotes so tags from headers and the change feed compare equal"""
+    if not etag:
+        return None
+    if etag.startswith('W/'):
+        etag = etag[2:]
+    return etag.strip('"')
+
+class DeckCache:
+    """LRU cache of opened decks (a set with its cards), bounded by bytes
+
+    Entries remember the set's ETag so they can be revalidated with a
+    conditional GET, and when they were last checked so that flicking
+    between decks does not send a request every time.
+    """
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()  # set id -> entry dict
+
+    def __contains__(self, set_id):
+        return set_id in self._entries
+
+    def get(self, set_id):
+        entry = self._entries.get(set_id)
+        if entry is not None:
+            self._entries.move_to_end(set_id)
+        return entry
+
+    def put(self, set_id, deck, etag, size=None):
+        if size is None:
+            size = len(json.dumps(deck))
+        self.discard(set_id)
+        if size > self.max_bytes:
+            return
+        self._entries[set_id] = {'deck': deck, 'etag': normalize_etag(etag),
+                                 'size': size, 'checked_at': time.monotonic()}
+        self.size += size
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= evicted['size']
+
+    def discard(self, set_id):
+        entry = self._entries.pop(set_id, None)
+        if entry is not None:
+            self.size -= entry['size']
+
+    def mark_checked(self, set_id):
+        entry = self._entries.get(set_id)
+        if entry is not None:
+            entry['checked_at'] = time.monotonic()
+
+    def needs_revalidation(self, set_id):
+        entry = self._entries.get(set_id)
+        return entry is None or time.monotonic() - entry['checked_at'] >= REVALIDATE_AFTER
+
+    def retain(self, etags):
+        """Drop decks that were deleted or changed, given {set id: current etag}"""
+        for set_id in list(self._entries):
+            etag = etags.get(set_id, False)
+            if etag is False or (etag and normalize_etag(etag) != self._entries[set_id]['etag']):
+                self.discard(set_id)
@@ -1,9 +1,10 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 import customtkinter as ctk
-import requests
 from datetime import datetime, timedelta
 
+REFRESH_DELAY_MS = 500  # events arriving together cause a single reload
+
 class ClassFrame(ctk.CTkFrame):
     def __init__(self, parent, controller):
         super().__init__(parent)
@@ -28,6 +29,8 @@ class ClassFrame(ctk.CTkFrame):
         self.join_class_button = ctk.CTkButton(self.header, text="Join Class",
                                             command=self.show_join_class)
         self.join_class_button.pack(side="right", padx=5)
+        
+        self.loading_label = ctk.CTkLabel(self.header, text="Loading...", text_color="gray")
 
         # Main content area
         self.content = ctk.CTkFrame(self)
@@ -51,6 +54,7 @@ class ClassFrame(ctk.CTkFrame):
         self.class_view.grid(row=0, column=1, sticky="nsew")
         
         self.current_class = None
+        self.refresh_job = None
 
     def show_create_class(self):
         dialog = CreateClassDialog(self)
@@ -67,148 +71,188 @@ class ClassFrame(ctk.CTkFrame):
         if self.current_class:
             self.load_class_details(self.current_class)
 
+    def set_loading(self, busy):
+        if busy:
+            self.loading_label.pack(side="left", padx=10)
+        else:
+            self.loading_label.pack_forget()
+
     def load_classes(self):
+        self.controller.worker.submit(
+            self.controller.api.get, '/class/list',
+            owner=self, key='/class/list',
+            on_success=self.show_classes,
+            on_error=lambda e: messagebox.showerror("Error", "Could not fetch classes")
+        )
+
+    def show_classes(self, response):
         # Clear existing classes
         for widget in self.classes_list.winfo_children():
             widget.destroy()
 
-        try:
-            headers = {'Authorization': f'Bearer {self.controller.token}'}
-            response = requests.get('http://localhost:5000/class/list',
-                                 headers=headers)
-            
-            if response.status_code == 200:
-                classes = response.json()
-                for class_data in classes:
-                    btn = ctk.CTkButton(
-                        self.classes_list,
-                        text=class_data['name'],
-                        command=lambda c=class_data: self.load_class_details(c)
-                    )
-                    btn.pack(fill="x", pady=2)
-        except requests.exceptions.RequestException:
-            messagebox.showerror("Error", "Could not fetch classes")
+        if response.status_code == 200:
+            classes = response.json()
+            for class_data in classes:
+                btn = ctk.CTkButton(
+                    self.classes_list,
+                    text=class_data['name'],
+                    command=lambda c=class_data: self.load_class_details(c)
+                )
+                btn.pack(fill="x", pady=2)
+
+    def on_hide(self):
+        self.controller.class_events.watch(None)
+
+    def on_class_event(self, class_id, event):
+        """A member joined or left, or someone's XP or rank changed"""
+        if not self.current_class or self.current_class['id'] != class_id:
+            return
+        if event['type'] == 'member_left' and event['user_id'] == self.controller.user_id:
+            # Removed from the class by its leader
+            self.current_class = None
+            for widget in self.class_view.winfo_children():
+                widget.destroy()
+            self.load_classes()
+            return
+        if self.refresh_job is not None:
+            self.after_cancel(self.refresh_job)
+        self.refresh_job = self.after(REFRESH_DELAY_MS, self.refresh_class)
+
+    def refresh_class(self):
+        self.refresh_job = None
+        if self.current_class:
+            self.load_class_details(self.current_class)
 
     def load_class_details(self, class_data):
         self.current_class = class_data
+        # Changes to this class are pushed from now on instead of fetched again
+        self.controller.class_events.watch(class_data['id'])
+        on_error = lambda e: messagebox.showerror("Error", "Could not load class details")
+        
+        # Members and leaderboard are fetched concurrently; the view is drawn
+        # once both have arrived
+        replies = {}
+        def arrived(name):
+            def callback(response):
+                replies[name] = response
+                if len(replies) == 2 and self.current_class is class_data:
+                    self.show_class_details(class_data, replies['members'],
+                                            replies['leaderboard'])
+            return callback
         
+        members_path = f'/class/{class_data["id"]}/members'
+        leaderboard_path = f'/class/{class_data["id"]}/leaderboard/current'
+        self.controller.worker.submit(
+            self.controller.api.get, members_path,
+            owner=self, key=members_path,
+            on_success=arrived('members'), on_error=on_error
+        )
+        self.controller.worker.submit(
+            self.controller.api.get, leaderboard_path,
+            owner=self, key=leaderboard_path,
+            on_success=arrived('leaderboard'), on_error=on_error
+        )
+
+    def show_class_details(self, class_data, members_response, leaderboard_response):
         # Clear existing view
         for widget in self.class_view.winfo_children():
             widget.destroy()
 
-        try:
-            headers = {'Authorization': f'Bearer {self.controller.token}'}
-            
-            # Get class members
-            response = requests.get(
-                f'http://localhost:5000/class/{class_data["id"]}/members',
-                headers=headers
-            )
-            
-            if response.status_code != 200:
-                messagebox.showerror("Error", "Could not load class details")
-                return
-                
-            members = response.json()
-            
-            # Class header
-            header = ctk.CTkFrame(self.class_view)
-            header.pack(fill="x", padx=20, pady=10)
-            
-            title = ctk.CTkLabel(header, text=class_data['name'],
-                              font=ctk.CTkFont(size=20, weight="bold"))
-            title.pack(side="left")
-            
-            if class_data.get('leader_id') == self.controller.user_id:
-                code_label = ctk.CTkLabel(header,
-                                      text=f"Class Code: {class_data['code']}")
-                code_label.pack(side="right")
-
-            # Members section
-            members_frame = ctk.CTkFrame(self.class_view)
-            members_frame.pack(fill="x", padx=20, pady=10)
-            
-            members_label = ctk.CTkLabel(members_frame, text="Members",
-                                      font=ctk.CTkFont(weight="bold"))
-            members_label.pack(pady=5)
+        if members_response.status_code != 200:
+            messagebox.showerror("Error", "Could not load class details")
+            return
             
-            for member in members:
-                member_frame = ctk.CTkFrame(members_frame)
-                member_frame.pack(fill="x", pady=2)
-                
-                name_label = ctk.CTkLabel(member_frame, text=member['username'])
-                name_label.pack(side="left", padx=10)
-                
-                xp_label = ctk.CTkLabel(member_frame, text=f"XP: {member['xp']}")
-                xp_label.pack(side="right", padx=10)
-                
-                if (class_data.get('leader_id') == self.controller.user_id and
-                    member['id'] != self.controller.user_id):
-                    kick_btn = ctk.CTkButton(
-                        member_frame,
-                        text="Kick",
-                        width=60,
-                        command=lambda m=member: self.kick_member(m['id'])
-                    )
-                    kick_btn.pack(side="right", padx=5)
-
-            # Leaderboard section
-            leaderboard_frame = ctk.CTkFrame(self.class_view)
-            leaderboard_frame.pack(fill="x", padx=20, pady=10)
+        members = members_response.json()
+        
+        # Class header
+        header = ctk.CTkFrame(self.class_view)
+        header.pack(fill="x", padx=20, pady=10)
+        
+        title = ctk.CTkLabel(header, text=class_data['name'],
+                          font=ctk.CTkFont(size=20, weight="bold"))
+        title.pack(side="left")
+        
+        if class_data.get('leader_id') == self.controller.user_id:
+            code_label = ctk.CTkLabel(header,
+                                  text=f"Class Code: {class_data['code']}")
+            code_label.pack(side="right")
+
+        # Members section
+        members_frame = ctk.CTkFrame(self.class_view)
+        members_frame.pack(fill="x", padx=20, pady=10)
+        
+        members_label = ctk.CTkLabel(members_frame, text="Members",
+                                  font=ctk.CTkFont(weight="bold"))
+        members_label.pack(pady=5)
+        
+        for member in members:
+            member_frame = ctk.CTkFrame(members_frame)
+            member_frame.pack(fill="x", pady=2)
             
-            leaderboard_header = ctk.CTkFrame(leaderboard_frame)
-            leaderboard_header.pack(fill="x", pady=5)
+            name_label = ctk.CTkLabel(member_frame, text=member['username'])
+            name_label.pack(side="left", padx=10)
             
-            leaderboard_label = ctk.CTkLabel(leaderboard_header,
-                                          text="Leaderboard",
-                                          font=ctk.CTkFont(weight="bold"))
-            leaderboard_label.pack(side="left")
+            xp_label = ctk.CTkLabel(member_frame, text=f"XP: {member['xp']}")
+            xp_label.pack(side="right", padx=10)
             
-            if class_data.get('leader_id') == self.controller.user_id:
-                create_board_btn = ctk.CTkButton(
-                    leaderboard_header,
-                    text="Create Leaderboard",
-                    command=lambda: self.show_create_leaderboard(class_data['id'])
+            if (class_data.get('leader_id') == self.controller.user_id and
+                member['id'] != self.controller.user_id):
+                kick_btn = ctk.CTkButton(
+                    member_frame,
+                    text="Kick",
+                    width=60,
+                    command=lambda m=member: self.kick_member(m['id'])
                 )
-                create_board_btn.pack(side="right")
+                kick_btn.pack(side="right", padx=5)
 
-            # Get current leaderboard
-            response = requests.get(
-                f'http://localhost:5000/class/{class_data["id"]}/leaderboard/current',
-                headers=headers
+        # Leaderboard section
+        leaderboard_frame = ctk.CTkFrame(self.class_view)
+        leaderboard_frame.pack(fill="x", padx=20, pady=10)
+        
+        leaderboard_header = ctk.CTkFrame(leaderboard_frame)
+        leaderboard_header.pack(fill="x", pady=5)
+        
+        leaderboard_label = ctk.CTkLabel(leaderboard_header,
+                                      text="Leaderboard",
+                                      font=ctk.CTkFont(weight="bold"))
+        leaderboard_label.pack(side="left")
+        
+        if class_data.get('leader_id') == self.controller.user_id:
+            create_board_btn = ctk.CTkButton(
+                leaderboard_header,
+                text="Create Leaderboard",
+                command=lambda: self.show_create_leaderboard(class_data['id'])
             )
+            create_board_btn.pack(side="right")
+
+        if leaderboard_response.status_code == 200:
+            leaderboard = leaderboard_response.json()
             
-            if response.status_code == 200:
-                leaderboard = response.json()
-                
-                end_date = datetime.fromisoformat(leaderboard['end_date'])
-                time_left = end_date - datetime.utcnow()
+            end_date = datetime.fromisoformat(leaderboard['end_date'])
+            time_left = end_date - datetime.utcnow()
+            
+            if time_left.total_seconds() > 0:
+                time_label = ctk.CTkLabel(
+                    leaderboard_frame,
+                    text=f"Time remaining: {time_left.days} days"
+                )
+                time_label.pack(pady=5)
                 
-                if time_left.total_seconds() > 0:
-                    time_label = ctk.CTkLabel(
-                        leaderboard_frame,
-                        text=f"Time remaining: {time_left.days} days"
-                    )
-                    time_label.pack(pady=5)
+                for rank in leaderboard['rankings']:
+                    rank_frame = ctk.CTkFrame(leaderboard_frame)
+                    rank_frame.pack(fill="x", pady=2)
                     
-                    for rank in leaderboard['rankings']:
-                        rank_frame = ctk.CTkFrame(leaderboard_frame)
-                        rank_frame.pack(fill="x", pady=2)
-                        
-                        pos_label = ctk.CTkLabel(rank_frame,
-                                              text=f"#{rank['rank']}")
-                        pos_label.pack(side="left", padx=10)
-                        
-                        name_label = ctk.CTkLabel(rank_frame,
-                                               text=rank['username'])
-                        name_label.pack(side="left", padx=10)
-                        
-                        xp_label = ctk.CTkLabel(rank_frame,
-                                             text=f"XP: {rank['xp']}")
-                        xp_label.pack(side="right", padx=10)
-                        
-        except requests.exceptions.RequestException:
-            messagebox.showerror("Error", "Could not load class details")
+                    pos_label = ctk.CTkLabel(rank_frame,
+                                          text=f"#{rank['rank']}")
+                    pos_label.pack(side="left", padx=10)
+                    
+                    name_label = ctk.CTkLabel(rank_frame,
+                                           text=rank['username'])
+                    name_label.pack(side="left", padx=10)
+                    
+                    xp_label = ctk.CTkLabel(rank_frame,
+                                         text=f"XP: {rank['xp']}")
+                    xp_label.pack(side="right", padx=10)
 
     def kick_member(self, member_id):
         if not self.current_class:
@@ -218,21 +262,19 @@ class ClassFrame(ctk.CTkFrame):
                                  "Are you sure you want to kick this member?"):
             return
             
-        try:
-            headers = {'Authorization': f'Bearer {self.controller.token}'}
-            response = requests.post(
-                f'http://localhost:5000/class/{self.current_class["id"]}/kick/{member_id}',
-                headers=headers
-            )
-            
+        def done(response):
             if response.status_code == 200:
                 messagebox.showinfo("Success", "Member removed from class")
                 self.load_class_details(self.current_class)
             else:
                 messagebox.showerror("Error", "Failed to remove member")
-                
-        except requests.exceptions.RequestException:
-            messagebox.showerror("Error", "Could not connect to server")
+        
+        self.controller.worker.submit(
+            self.controller.api.post,
+            f'/class/{self.current_class["id"]}/kick/{member_id}',
+            owner=self, on_success=done,
+            on_error=lambda e: messagebox.showerror("Error", "Could not connect to server")
+        )
 
     def show_create_leaderboard(self, class_id):
         dialog = CreateLeaderboardDialog(self, class_id)
@@ -269,12 +311,7 @@ class CreateClassDialog(ctk.CTkToplevel):
             messagebox.showwarning("Warning", "Please enter a class name")
             return
 
-        try:
-            headers = {'Authorization': f'Bearer {self.parent.controller.token}'}
-            response = requests.post('http://localhost:5000/class',
-                                  headers=headers,
-                                  json={'name': name})
-            
+        def done(response):
             if response.status_code == 201:
                 result = response.json()
                 messagebox.showinfo("Success",
@@ -282,9 +319,15 @@ class CreateClassDialog(ctk.CTkToplevel):
                 self.destroy()
             else:
                 messagebox.showerror("Error", "Failed to create class")
-                
-        except requests.exceptions.RequestException:
-            messagebox.showerror("Error", "Could not connect to server")
+        
+        self.parent.controller.worker.submit(
+            self.parent.controller.api.post, '/class', json={'name': name},
+            owner=self, on_success=done,
+            on_error=lambda e: messagebox.showerror("Error", "Could not connect to server")
+        )
+
+    def set_loading(self, busy):
+        self.create_button.configure(state="disabled" if busy else "normal")
 
 class JoinClassDialog(ctk.CTkToplevel):
     def __init__(self, parent):
@@ -315,20 +358,21 @@ class JoinClassDialog(ctk.CTkToplevel):
             messagebox.showwarning("Warning", "Please enter a class code")
             return
 
-        try:
-            headers = {'Authorization': f'Bearer {self.parent.controller.token}'}
-            response = requests.post('http://localhost:5000/class/join',
-                                  headers=headers,
-                                  json={'code': code})
-            
+        def done(response):
             if response.status_code == 200:
                 messagebox.showinfo("Success", "Successfully joined class!")
                 self.destroy()
             else:
                 messagebox.showerror("Error", "Failed to join class")
-                
-        except requests.exceptions.RequestException:
-            messagebox.showerror("Error", "Could not connect to server")
+        
+        self.parent.controller.worker.submit(
+            self.parent.controller.api.post, '/class/join', json={'code': code},
+            owner=self, on_success=done,
+            on_error=lambda e: messagebox.showerror("Error", "Could not connect to server")
+        )
+
+    def set_loading(self, busy):
+        self.join_button.configure(state="disabled" if busy else "normal")
 
 class CreateLeaderboardDialog(ctk.CTkToplevel):
     def __init__(self, parent, class_id):
@@ -360,19 +404,19 @@ class CreateLeaderboardDialog(ctk.CTkToplevel):
         self.create_button.grid(row=2, column=0, padx=20, pady=20)
 
     def create_leaderboard(self):
-        try:
-            headers = {'Authorization': f'Bearer {self.parent.controller.token}'}
-            response = requests.post(
-                f'http://localhost:5000/class/{self.class_id}/leaderboard',
-                headers=headers,
-                json={'duration_days': int(self.duration_var.get())}
-            )
-            
+        def done(response):
             if response.status_code == 201:
                 messagebox.showinfo("Success", "Leaderboard created successfully!")
                 self.destroy()
             else:
                 messagebox.showerror("Error", "Failed to create leaderboard")
-                
-        except requests.exceptions.RequestException:
-            messagebox.showerror("Error", "Could not connect to server")
+        
+        self.parent.controller.worker.submit(
+            self.parent.controller.api.post, f'/class/{self.class_id}/leaderboard',
+            json={'duration_days': int(self.duration_var.get())},
+            owner=self, on_success=done,
+            on_error=lambda e: messagebox.showerror("Error", "Could not connect to server")
+        )
+
+    def set_loading(self, busy):
+        self.create_button.configure(state="disabled" if busy else "normal")
@@ -1,8 +1,21 @@
+import os
+import uuid
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 import customtkinter as ctk
-import requests
+from collections import deque
 from datetime import datetime
+from deck_cache import DeckCache
+from virtual_list import VirtualList
+
+SETS_LIST_WIDTH = 400  # fits the set name and its three action buttons
+PREFETCH_FOLDER_SETS = 3  # decks from the same folder loaded after opening one
+RECENT_SETS = 5  # recently studied decks loaded when the screen opens
+IMPORT_FORMATS = {'.csv': 'csv', '.tsv': 'tsv', '.txt': 'tsv', '.jsonl': 'jsonl', '.apkg': 'apkg'}
+IMPORT_POLL_MS = 500  # how often import progress is asked for during an upload
+IMPORT_ERRORS_SHOWN = 5
+EXPORT_FORMATS = {'.jsonl': 'jsonl', '.csv': 'csv', '.zip': 'zip', '.apkg': 'apkg'}
+EXPORT_CHUNK_SIZE = 64 * 1024
 
 class FlashcardFrame(ctk.CTkFrame):
     def __init__(self, parent, controller):
@@ -26,6 +39,16 @@ class FlashcardFrame(ctk.CTkFrame):
                                              command=self.show_create_set,
                                              width=120)  # Fixed width
         self.create_set_button.grid(row=0, column=1, padx=10)
+        
+        self.import_button = ctk.CTkButton(self.header, text="Import",
+                                         command=self.import_set,
+                                         width=120)
+        self.import_button.grid(row=0, column=2, padx=10)
+        
+        self.export_button = ctk.CTkButton(self.header, text="Export",
+                                         command=self.export_sets,
+                                         width=120)
+        self.export_button.grid(row=0, column=3, padx=10)
 
         # Main content area with sets list and flashcard view
         self.content = ctk.CTkFrame(self)
@@ -41,7 +64,9 @@ class FlashcardFrame(ctk.CTkFrame):
                                      font=ctk.CTkFont(weight="bold"))
         self.sets_label.pack(pady=10)
         
-        self.sets_list = ctk.CTkScrollableFrame(self.sets_frame, width=200)
+        # Only the visible rows exist as widgets, so thousands of sets stay fast
+        self.sets_list = VirtualList(self.sets_frame, self.create_set_row, self.update_set_row,
+                                     width=SETS_LIST_WIDTH)
         self.sets_list.pack(expand=True, fill="both", padx=10, pady=10)
 
         # Flashcard view
@@ -50,6 +75,9 @@ class FlashcardFrame(ctk.CTkFrame):
         
         self.current_set = None
         self.current_cards = []
+        self.deck_cache = DeckCache()  # recently opened and prefetched decks
+        self.recent_sets = deque(maxlen=RECENT_SETS)  # ids of studied sets, newest last
+        self.requested_set = None  # set whose cards are being fetched for display
         self.current_card_index = 0
         self.showing_answer = False
 
@@ -81,102 +109,299 @@ class FlashcardFrame(ctk.CTkFrame):
                                              command=self.start_test)
         self.start_test_button.pack(side="right", padx=5)
 
+    def set_loading(self, busy):
+        if busy:
+            self.card_text.configure(text="Loading...")
+        elif self.current_set:
+            self.update_card_display()
+        else:
+            self.card_text.configure(text="Select a flashcard set")
+
     def show_create_set(self):
         dialog = CreateSetDialog(self)
         self.wait_window(dialog)
-        self.update_sets_list()
+        self.controller.sync.trigger()
 
     def show_edit_set(self, set_data):
         dialog = EditSetDialog(self, set_data)
         self.wait_window(dialog)
         self.update_sets_list()
 
-    def copy_set(self, set_data):
-        try:
-            headers = {'Authorization': f'Bearer {self.controller.token}'}
-            response = requests.post('http://localhost:5000/flashcard/sets/copy',
-                                 json={'set_id': set_data['id']},
-                                 headers=headers)
-            
-            if response.status_code == 201:
-                messagebox.showinfo("Success", "Flashcard set copied successfully")
-                self.update_sets_list()
+    def import_set(self):
+        path = filedialog.askopenfilename(
+            title="Import Flashcards",
+            filetypes=[("Flashcard files", "*.csv *.tsv *.txt *.jsonl *.apkg"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        fmt = IMPORT_FORMATS.get(os.path.splitext(path)[1].lower())
+        if fmt is None:
+            messagebox.showerror("Error", "Choose a .csv, .tsv, .jsonl or .apkg file")
+            return
+        
+        api = self.controller.api
+        worker = self.controller.worker
+        import_id = uuid.uuid4().hex
+        params = {
+            'format': fmt,
+            'name': os.path.splitext(os.path.basename(path))[0],
+            'import_id': import_id
+        }
+        # Anki packages hold their own deck names and go to their own endpoint
+        import_path = '/flashcard/anki/import' if fmt == 'apkg' else '/flashcard/import'
+        uploading = True
+        
+        def upload():
+            # requests streams an open file rather than reading it into memory
+            with open(path, 'rb') as f:
+                return api.post(import_path, params=params, data=f)
+        
+        def finished():
+            nonlocal uploading
+            uploading = False
+            if self.import_button.winfo_exists():
+                self.import_button.configure(text="Import", state="normal")
+        
+        def done(response):
+            finished()
+            try:
+                result = response.json()
+            except ValueError:
+                result = {}  # e.g. the server refused a file that was too large
+            if response.status_code in (200, 201):
+                message = f"Imported {result['imported']} cards"
+                if fmt != 'apkg':
+                    message += f" into '{params['name']}'"
+                if result.get('duplicates'):
+                    message += f"\n{result['duplicates']} duplicate cards skipped"
+            else:
+                message = result.get('message', 'Import failed')
+            if result.get('error_count'):
+                lines = [f"Line {e['line']}: {e['message']}"
+                         for e in result['errors'][:IMPORT_ERRORS_SHOWN]]
+                message += f"\n\n{result['error_count']} rows skipped:\n" + "\n".join(lines)
+            if response.status_code in (200, 201):
+                messagebox.showinfo("Import", message)
+                self.controller.sync.trigger()
             else:
-                messagebox.showerror("Error", "Failed to copy flashcard set")
-        except requests.exceptions.RequestException:
-            messagebox.showerror("Error", "Could not connect to server")
+                messagebox.showerror("Error", message)
+        
+        def failed(error):
+            finished()
+            messagebox.showerror("Error", "Could not reach the server to import the file")
+        
+        def show_progress(response):
+            if uploading and response.status_code == 200:
+                self.import_button.configure(text=f"{response.json()['imported']:,} cards")
+        
+        def poll():
+            if not uploading:
+                return
+            # Owned by the button so switching screens does not lose the result
+            worker.submit(api.get, f'/flashcard/import/{import_id}', owner=self.import_button,
+                          key=f'import:{import_id}', on_success=show_progress,
+                          on_error=lambda error: None)
+            self.after(IMPORT_POLL_MS, poll)
+        
+        self.import_button.configure(text="Importing...", state="disabled")
+        worker.submit(upload, owner=self.import_button, on_success=done, on_error=failed)
+        self.after(IMPORT_POLL_MS, poll)
+
+    def export_sets(self):
+        path = filedialog.asksaveasfilename(
+            title="Export Flashcards", defaultextension=".zip", initialfile="flashcards.zip",
+            filetypes=[("Zip of CSV files", "*.zip"), ("CSV", "*.csv"), ("JSON Lines", "*.jsonl"),
+                       ("Anki package", "*.apkg")]
+        )
+        if not path:
+            return
+        fmt = EXPORT_FORMATS.get(os.path.splitext(path)[1].lower(), 'zip')
+        api = self.controller.api
+        if fmt == 'apkg':
+            export_path, params = '/flashcard/anki/export', {}
+        else:
+            export_path, params = '/flashcard/export', {'format': fmt}
+        
+        def download():
+            # Written to disk as it arrives, so big collections are not held in memory
+            with api.get(export_path, params=params, stream=True) as response:
+                if response.status_code != 200:
+                    return response.status_code
+                with open(path, 'wb') as f:
+                    for chunk in response.iter_content(EXPORT_CHUNK_SIZE):
+                        f.write(chunk)
+                return response.status_code
+        
+        def finished():
+            if self.export_button.winfo_exists():
+                self.export_button.configure(text="Export", state="normal")
+        
+        def done(status):
+            finished()
+            if status == 200:
+                messagebox.showinfo("Export", f"Flashcards saved to {path}")
+            else:
+                messagebox.showerror("Error", "Failed to export flashcards")
+        
+        def failed(error):
+            finished()
+            messagebox.showerror("Error", f"Could not export flashcards: {error}")
+        
+        self.export_button.configure(text="Exporting...", state="disabled")
+        self.controller.worker.submit(download, owner=self.export_button,
+                                      on_success=done, on_error=failed)
+
+    def copy_set(self, set_data):
+        # The copy gets its id from the server, so it appears after the next sync
+        self.controller.cache.enqueue(self.controller.user_id, 'POST', '/flashcard/sets/copy',
+                                      {'set_id': set_data['id']})
+        self.controller.sync.trigger()
 
     def delete_set(self, set_data):
         if messagebox.askyesno("Confirm Delete", 
                              f"Are you sure you want to delete '{set_data['name']}'?"):
-            try:
-                headers = {'Authorization': f'Bearer {self.controller.token}'}
-                response = requests.delete(
-                    f'http://localhost:5000/flashcard/sets/{set_data["id"]}',
-                    headers=headers
-                )
-                
-                if response.status_code == 204:
-                    messagebox.showinfo("Success", "Flashcard set deleted successfully")
-                    self.update_sets_list()
-                else:
-                    messagebox.showerror("Error", "Failed to delete flashcard set")
-            except requests.exceptions.RequestException:
-                messagebox.showerror("Error", "Could not connect to server")
+            user_id = self.controller.user_id
+            self.deck_cache.discard(set_data['id'])
+            if set_data['id'] in self.recent_sets:
+                self.recent_sets.remove(set_data['id'])
+            self.controller.cache.delete_set(user_id, set_data['id'])
+            self.controller.cache.enqueue(user_id, 'DELETE', f'/flashcard/sets/{set_data["id"]}')
+            self.controller.sync.trigger()
+            if self.current_set and self.current_set['id'] == set_data['id']:
+                self.current_set = None
+                self.current_cards = []
+                self.card_text.configure(text="Select a flashcard set")
+            self.update_sets_list()
 
     def update_sets_list(self):
-        # Clear existing sets
-        for widget in self.sets_list.winfo_children():
-            widget.destroy()
-
-        try:
-            headers = {'Authorization': f'Bearer {self.controller.token}'}
-            response = requests.get('http://localhost:5000/flashcard/sets', headers=headers)
-            
-            if response.status_code == 200:
-                sets = response.json()
-                for set_data in sets:
-                    set_frame = ctk.CTkFrame(self.sets_list)
-                    set_frame.pack(fill="x", pady=2)
-
-                    # Set name button
-                    name_btn = ctk.CTkButton(set_frame, text=set_data['name'],
-                                         command=lambda s=set_data: self.load_set(s))
-                    name_btn.pack(side="left", expand=True, fill="x", padx=2)
-
-                    # Action buttons
-                    edit_btn = ctk.CTkButton(set_frame, text="Edit",
-                                         command=lambda s=set_data: self.show_edit_set(s),
-                                         width=60)
-                    edit_btn.pack(side="left", padx=2)
-
-                    copy_btn = ctk.CTkButton(set_frame, text="Copy",
-                                         command=lambda s=set_data: self.copy_set(s),
-                                         width=60)
-                    copy_btn.pack(side="left", padx=2)
-
-                    delete_btn = ctk.CTkButton(set_frame, text="Delete",
-                                           command=lambda s=set_data: self.delete_set(s),
-                                           width=60)
-                    delete_btn.pack(side="left", padx=2)
-        except requests.exceptions.RequestException:
-            messagebox.showerror("Error", "Could not fetch flashcard sets")
+        # Rendered from the local mirror; the sync worker keeps it current
+        sets = self.controller.cache.get_sets(self.controller.user_id)
+        # Forget cached decks that were deleted or changed since
+        self.deck_cache.retain({s['id']: s['etag'] for s in sets})
+        self.sets_list.set_items(sets)
+
+    def create_set_row(self, parent):
+        set_frame = ctk.CTkFrame(parent)
+
+        # Set name button
+        set_frame.name_btn = ctk.CTkButton(set_frame)
+        set_frame.name_btn.pack(side="left", expand=True, fill="x", padx=2)
+
+        # Action buttons
+        set_frame.edit_btn = ctk.CTkButton(set_frame, text="Edit", width=60)
+        set_frame.edit_btn.pack(side="left", padx=2)
+
+        set_frame.copy_btn = ctk.CTkButton(set_frame, text="Copy", width=60)
+        set_frame.copy_btn.pack(side="left", padx=2)
+
+        set_frame.delete_btn = ctk.CTkButton(set_frame, text="Delete", width=60)
+        set_frame.delete_btn.pack(side="left", padx=2)
+        return set_frame
+
+    def update_set_row(self, set_frame, set_data):
+        set_frame.name_btn.configure(text=set_data['name'],
+                                     command=lambda: self.load_set(set_data))
+        set_frame.edit_btn.configure(command=lambda: self.show_edit_set(set_data))
+        set_frame.copy_btn.configure(command=lambda: self.copy_set(set_data))
+        set_frame.delete_btn.configure(command=lambda: self.delete_set(set_data))
+
+    def get_set(self, set_id, on_success, on_error, owner):
+        """Pass a set with its cards (or None) to on_success
+
+        Decks come from the in-memory cache, then the local mirror, then
+        the server. A cached deck is shown at once and revalidated in the
+        background; on_success is called again if the server's copy differs.
+        """
+        entry = self.deck_cache.get(set_id)
+        if entry is not None:
+            on_success(entry['deck'])
+            if self.deck_cache.needs_revalidation(set_id):
+                def revalidated(set_info):
+                    if set_info is not None and set_info is not entry['deck']:
+                        on_success(set_info)
+                self.fetch_set(set_id, revalidated, lambda e: None, owner)
+            return
+        
+        set_info = self.controller.cache.get_set(self.controller.user_id, set_id)
+        if set_info is not None:
+            self.deck_cache.put(set_id, set_info, set_info['etag'])
+            on_success(set_info)
+        else:
+            self.fetch_set(set_id, on_success, on_error, owner)
+
+    def fetch_set(self, set_id, on_success, on_error, owner):
+        """Fetch a set's cards, revalidating any cached copy with its ETag"""
+        headers = {}
+        cached = self.deck_cache.get(set_id)
+        if cached and cached['etag']:
+            headers['If-None-Match'] = f'"{cached["etag"]}"'
+        
+        def done(response):
+            if response.status_code == 304 and cached:
+                self.deck_cache.mark_checked(set_id)
+                on_success(cached['deck'])
+            elif response.status_code == 200:
+                set_info = response.json()
+                self.deck_cache.put(set_id, set_info, response.headers.get('ETag'),
+                                    size=len(response.content))
+                on_success(set_info)
+            else:
+                on_success(None)
+        
+        path = f'/flashcard/sets/{set_id}'
+        self.controller.worker.submit(
+            self.controller.api.get, path, headers=headers,
+            owner=owner, key=path, on_success=done, on_error=on_error
+        )
 
     def load_set(self, set_data):
-        try:
-            headers = {'Authorization': f'Bearer {self.controller.token}'}
-            response = requests.get(f'http://localhost:5000/flashcard/sets/{set_data["id"]}',
-                                 headers=headers)
-            
-            if response.status_code == 200:
+        self.requested_set = set_data
+        
+        def show(set_info):
+            # Ignore a slow reply for a set the user has since clicked away from
+            if set_info is not None and self.requested_set is set_data:
+                if self.current_set is not set_data:
+                    self.current_card_index = 0
+                    self.showing_answer = False
                 self.current_set = set_data
-                set_info = response.json()
                 self.current_cards = set_info['flashcards']
-                self.current_card_index = 0
-                self.showing_answer = False
+                self.current_card_index = min(self.current_card_index,
+                                              max(len(self.current_cards) - 1, 0))
                 self.update_card_display()
-        except requests.exceptions.RequestException:
-            messagebox.showerror("Error", "Could not load flashcard set")
+        
+        self.get_set(set_data['id'], show,
+                     lambda e: messagebox.showerror("Error", "Could not load flashcard set"),
+                     owner=self)
+        
+        if set_data['id'] in self.recent_sets:
+            self.recent_sets.remove(set_data['id'])
+        self.recent_sets.append(set_data['id'])
+        
+        # The next deck opened is likely another one from the same folder
+        same_folder = [s['id'] for s in self.sets_list.items
+                       if s['folder'] == set_data['folder'] and s['id'] != set_data['id']]
+        self.prefetch(same_folder[:PREFETCH_FOLDER_SETS])
+
+    def prefetch(self, set_ids):
+        """Load decks into the deck cache in the background"""
+        user_id = self.controller.user_id
+        owner = self.deck_cache  # no loading indicator for speculative loads
+        for set_id in set_ids:
+            if set_id in self.deck_cache:
+                continue
+            
+            def loaded(set_info, set_id=set_id):
+                if set_info is not None:
+                    self.deck_cache.put(set_id, set_info, set_info['etag'])
+                else:
+                    # Not mirrored yet; fetch_set caches the server's copy
+                    self.fetch_set(set_id, lambda set_info: None, lambda e: None, owner)
+            
+            self.controller.worker.submit(
+                self.controller.cache.get_set, user_id, set_id,
+                owner=owner, key=('prefetch', set_id),
+                on_success=loaded, on_error=lambda e: None
+            )
 
     def update_card_display(self):
         if not self.current_cards:
@@ -205,8 +430,8 @@ class FlashcardFrame(ctk.CTkFrame):
             self.update_card_display()
 
     def start_test(self):
-        if not self.current_set:
-            messagebox.showwarning("Warning", "Please select a flashcard set first")
+        if not self.current_set or not self.current_cards:
+            messagebox.showwarning("Warning", "Please select a flashcard set with cards first")
             return
             
         test_window = TestWindow(self, self.current_set)
@@ -214,6 +439,12 @@ class FlashcardFrame(ctk.CTkFrame):
 
     def update_content(self):
         self.update_sets_list()
+        self.controller.sync.trigger()
+        self.prefetch(list(self.recent_sets))
+
+    def on_sync(self, kinds):
+        if 'sets' in kinds:
+            self.update_sets_list()
 
 class CreateSetDialog(ctk.CTkToplevel):
     def __init__(self, parent):
@@ -311,6 +542,7 @@ class CreateSetDialog(ctk.CTkToplevel):
             diff_var.set(card['difficulty'])
 
         self.cards.append({
+            'id': card.get('id') if card else None,
             'frame': card_frame,
             'front': front_entry,
             'back': back_entry,
@@ -352,33 +584,41 @@ class CreateSetDialog(ctk.CTkToplevel):
                 'difficulty': card['difficulty'].get()
             })
 
-        try:
-            # Create set
-            headers = {'Authorization': f'Bearer {self.parent.controller.token}'}
-            response = requests.post('http://localhost:5000/flashcard/sets',
-                                 json={'name': name, 'folder': folder},
-                                 headers=headers)
-            
+        controller = self.parent.controller
+        # The key goes with every attempt, so a replay from the outbox after a
+        # lost reply cannot create the set twice
+        body = {'name': name, 'folder': folder, 'cards': cards_data,
+                'idempotency_key': uuid.uuid4().hex}
+        
+        def done(response):
             if response.status_code == 201:
-                set_data = response.json()
-                
-                # Add cards
-                for card_data in cards_data:
-                    response = requests.post(
-                        f'http://localhost:5000/flashcard/sets/{set_data["id"]}/cards',
-                        json=card_data,
-                        headers=headers
-                    )
-                    
-                    if response.status_code != 201:
-                        raise Exception("Failed to create card")
-                        
+                # The reply is the whole deck, so opening it needs no request
+                set_info = response.json()
+                self.parent.deck_cache.put(set_info['id'], set_info, response.headers.get('ETag'),
+                                           size=len(response.content))
                 messagebox.showinfo("Success", "Flashcard set created successfully")
                 self.destroy()
             else:
-                messagebox.showerror("Error", "Failed to create flashcard set")
-        except requests.exceptions.RequestException:
-            messagebox.showerror("Error", "Could not connect to server")
+                error_msg = response.json().get('message', 'Failed to create flashcard set')
+                messagebox.showerror("Error", error_msg)
+        
+        def failed(error):
+            # Created when the sync worker next reaches the server
+            controller.cache.enqueue(controller.user_id, 'POST', '/flashcard/sets/batch', body)
+            messagebox.showinfo("Saved Offline",
+                              "You are offline; the set will appear once it has synced")
+            self.destroy()
+        
+        # The set and all its cards are created in one request and transaction
+        controller.worker.submit(
+            controller.api.post, '/flashcard/sets/batch', json=body,
+            owner=self, on_success=done, on_error=failed
+        )
+
+    def set_loading(self, busy):
+        state = "disabled" if busy else "normal"
+        self.save_deck_button.configure(state=state)
+        self.add_card_button.configure(state=state)
 
 class EditSetDialog(CreateSetDialog):
     def __init__(self, parent, set_data):
@@ -391,24 +631,24 @@ class EditSetDialog(CreateSetDialog):
         self.folder_entry.insert(0, set_data['folder'])
         
         # Load existing cards
-        try:
-            headers = {'Authorization': f'Bearer {self.parent.controller.token}'}
-            response = requests.get(
-                f'http://localhost:5000/flashcard/sets/{set_data["id"]}',
-                headers=headers
-            )
-            
-            if response.status_code == 200:
-                set_info = response.json()
-                for card in set_info['flashcards']:
-                    self.add_card_fields(card)
-            else:
-                messagebox.showerror("Error", "Failed to load flashcard set")
-                self.destroy()
-        except requests.exceptions.RequestException:
-            messagebox.showerror("Error", "Could not connect to server")
+        self.cards_loaded = False
+        self.parent.get_set(set_data['id'], self.show_cards, self.load_failed, owner=self)
+
+    def show_cards(self, set_info):
+        if self.cards_loaded:
+            return  # Already filled from a cached copy; keep the user's edits
+        if set_info is not None:
+            self.cards_loaded = True
+            for card in set_info['flashcards']:
+                self.add_card_fields(card)
+        else:
+            messagebox.showerror("Error", "Failed to load flashcard set")
             self.destroy()
 
+    def load_failed(self, error):
+        messagebox.showerror("Error", "Could not connect to server")
+        self.destroy()
+
     def save_set(self):
         name = self.name_entry.get().strip()
         folder = self.folder_entry.get().strip()
@@ -431,38 +671,27 @@ class EditSetDialog(CreateSetDialog):
                 messagebox.showerror("Error", "All cards must have front and back content")
                 return
                 
-            cards_data.append({
+            card_data = {
                 'front': front,
                 'back': back,
                 'difficulty': card['difficulty'].get()
-            })
-
-        try:
-            # Update set
-            headers = {'Authorization': f'Bearer {self.parent.controller.token}'}
-            response = requests.put(
-                f'http://localhost:5000/flashcard/sets/{self.set_data["id"]}',
-                json={'name': name, 'folder': folder},
-                headers=headers
-            )
-            
-            if response.status_code == 200:
-                # Update cards
-                response = requests.put(
-                    f'http://localhost:5000/flashcard/sets/{self.set_data["id"]}/cards',
-                    json={'cards': cards_data},
-                    headers=headers
-                )
-                
-                if response.status_code == 200:
-                    messagebox.showinfo("Success", "Flashcard set updated successfully")
-                    self.destroy()
-                else:
-                    messagebox.showerror("Error", "Failed to update cards")
-            else:
-                messagebox.showerror("Error", "Failed to update flashcard set")
-        except requests.exceptions.RequestException:
-            messagebox.showerror("Error", "Could not connect to server")
+            }
+            if card['id'] and card['id'] > 0:
+                card_data['id'] = card['id']  # The server keeps the card and its history
+            cards_data.append(card_data)
+
+        # Apply locally and queue the requests; the sync worker sends them
+        controller = self.parent.controller
+        set_id = self.set_data['id']
+        self.parent.deck_cache.discard(set_id)
+        controller.cache.update_set(controller.user_id, set_id, name, folder, cards_data)
+        controller.cache.enqueue(controller.user_id, 'PUT', f'/flashcard/sets/{set_id}',
+                                 {'name': name, 'folder': folder})
+        controller.cache.enqueue(controller.user_id, 'PUT', f'/flashcard/sets/{set_id}/cards',
+                                 {'cards': cards_data})
+        controller.sync.trigger()
+        messagebox.showinfo("Success", "Flashcard set updated successfully")
+        self.destroy()
 
 class TestWindow(ctk.CTkToplevel):
     def __init__(self, parent, flashcard_set):
@@ -476,7 +705,11 @@ class TestWindow(ctk.CTkToplevel):
         self.current_card_index = 0
         self.start_time = datetime.now()
         self.scores = []
-        self.cards = parent.current_cards
+        # Per-card results for the server's review log
+        self.answers = []
+        self.card_shown_at = datetime.now()
+        # A copy, so reloading the deck in the main window cannot change the test
+        self.cards = list(parent.current_cards)
         self.setup_test_ui()
 
     def setup_test_ui(self):
@@ -510,6 +743,11 @@ class TestWindow(ctk.CTkToplevel):
         # Simple scoring: exact match = 1, close match = 0.5, no match = 0
         score = 1.0 if answer == correct_answer else 0.5 if answer in correct_answer or correct_answer in answer else 0.0
         self.scores.append(score)
+        card = self.cards[self.current_card_index]
+        if card['id'] > 0:  # Cards made offline have negative placeholder ids
+            latency = datetime.now() - self.card_shown_at
+            self.answers.append({'card_id': card['id'], 'grade': score,
+                                 'latency_ms': int(latency.total_seconds() * 1000)})
         
         # Show feedback
         feedback = "Correct!" if score == 1.0 else "Partially Correct" if score == 0.5 else "Incorrect"
@@ -520,6 +758,7 @@ class TestWindow(ctk.CTkToplevel):
         if self.current_card_index < len(self.cards):
             self.question_label.configure(text=self.cards[self.current_card_index]['front'])
             self.answer_entry.delete(0, 'end')
+            self.card_shown_at = datetime.now()
         else:
             self.submit_test()
 
@@ -527,14 +766,12 @@ class TestWindow(ctk.CTkToplevel):
         duration = int((datetime.now() - self.start_time).total_seconds())
         final_score = sum(self.scores) / len(self.scores) * 100
         
-        try:
-            headers = {'Authorization': f'Bearer {self.parent.controller.token}'}
-            response = requests.post(
-                f'http://localhost:5000/flashcard/sets/{self.flashcard_set["id"]}/test',
-                headers=headers,
-                json={'score': final_score, 'duration': duration}
-            )
-            
+        path = f'/flashcard/sets/{self.flashcard_set["id"]}/test'
+        body = {'score': final_score, 'duration': duration, 'answers': self.answers,
+                'idempotency_key': uuid.uuid4().hex}  # Counted once however often it is sent
+        controller = self.parent.controller
+        
+        def done(response):
             if response.status_code == 201:
                 result = response.json()
                 messagebox.showinfo("Test Complete",
@@ -543,8 +780,21 @@ class TestWindow(ctk.CTkToplevel):
                                   f"XP gained: {result['xp_gained']}")
             else:
                 messagebox.showwarning("Warning", "Failed to submit test results")
-                
-        except requests.exceptions.RequestException:
-            messagebox.showerror("Error", "Could not connect to server")
+            self.destroy()
         
-        self.destroy()
+        def failed(error):
+            # Keep the result and submit it once the server is reachable
+            controller.cache.enqueue(controller.user_id, 'POST', path, body)
+            messagebox.showinfo("Test Complete",
+                              f"Score: {final_score:.1f}%\n"
+                              f"Time: {duration} seconds\n"
+                              "You are offline; XP will be awarded when the result syncs")
+            self.destroy()
+        
+        controller.worker.submit(
+            controller.api.post, path, json=body,
+            owner=self, on_success=done, on_error=failed
+        )
+
+    def set_loading(self, busy):
+        self.submit_button.configure(state="disabled" if busy else "normal")
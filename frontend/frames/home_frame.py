@@ -1,6 +1,4 @@
 import customtkinter as ctk
-from PIL import Image, ImageTk
-import os
 
 class HomeFrame(ctk.CTkFrame):
     def __init__(self, parent, controller):
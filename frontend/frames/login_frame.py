@@ -63,29 +63,42 @@ class LoginFrame(ctk.CTkFrame):
             messagebox.showerror("Error", "Please enter both username and password")
             return
             
+        logger.info(f"Attempting login for user: {username}")
+        # Keyed so pressing Enter repeatedly sends one login, not several
+        self.controller.worker.submit(
+            self.controller.api.post, '/auth/login',
+            json={'username': username, 'password': password},
+            owner=self, key='/auth/login',
+            on_success=self.login_done, on_error=self.login_failed
+        )
+
+    def login_done(self, response):
+        logger.info(f"Login response status: {response.status_code}")
+        logger.info(f"Login response content: {response.text}")
+        
         try:
-            logger.info(f"Attempting login for user: {username}")
-            response = requests.post('http://localhost:5000/auth/login',
-                                 json={'username': username, 'password': password})
-            
-            logger.info(f"Login response status: {response.status_code}")
-            logger.info(f"Login response content: {response.text}")
-            
             if response.status_code == 200:
                 data = response.json()
-                self.controller.token = data['token']
-                self.controller.user_id = data['user_id']
-                self.controller.username = data['username']
+                self.controller.start_session(data['token'], data['user_id'], data['username'])
                 self.controller.show_frame('HomeFrame')
             else:
                 messagebox.showerror("Error", response.json().get('message', 'Login failed'))
-        except requests.exceptions.RequestException:
-            logger.error("Failed to connect to server", exc_info=True)
-            messagebox.showerror("Error", "Could not connect to server")
         except Exception as e:
             logger.error("Unexpected error during login", exc_info=True)
             messagebox.showerror("Error", str(e))
 
+    def login_failed(self, error):
+        if isinstance(error, requests.exceptions.RequestException):
+            logger.error("Failed to connect to server", exc_info=error)
+            messagebox.showerror("Error", "Could not connect to server")
+        else:
+            logger.error("Unexpected error during login", exc_info=error)
+            messagebox.showerror("Error", str(error))
+
+    def set_loading(self, busy):
+        self.login_button.configure(state="disabled" if busy else "normal",
+                                    text="Logging in..." if busy else "Login")
+
     def show_register(self):
         self.controller.show_frame('RegisterFrame')
 
@@ -194,26 +207,38 @@ class RegisterFrame(ctk.CTkFrame):
         # Remove confirm_password from data
         del data['confirm_password']
         
+        logger.info(f"Attempting registration for user: {data['username']}")
+        self.controller.worker.submit(
+            self.controller.api.post, '/auth/register', json=data,
+            owner=self, key='/auth/register',
+            on_success=self.register_done, on_error=self.register_failed
+        )
+
+    def register_done(self, response):
+        logger.info(f"Registration response status: {response.status_code}")
+        logger.info(f"Registration response content: {response.text}")
+        
         try:
-            logger.info(f"Attempting registration for user: {data['username']}")
-            response = requests.post('http://localhost:5000/auth/register',
-                                 json=data)
-            
-            logger.info(f"Registration response status: {response.status_code}")
-            logger.info(f"Registration response content: {response.text}")
-            
             if response.status_code == 201:
                 messagebox.showinfo("Success", "Account created successfully!")
                 self.show_login()
             else:
                 error_msg = response.json().get('message', 'Registration failed')
                 messagebox.showerror("Error", error_msg)
-        except requests.exceptions.RequestException:
-            logger.error("Failed to connect to server", exc_info=True)
-            messagebox.showerror("Error", "Could not connect to server")
         except Exception as e:
             logger.error("Unexpected error during registration", exc_info=True)
             messagebox.showerror("Error", str(e))
 
+    def register_failed(self, error):
+        if isinstance(error, requests.exceptions.RequestException):
+            logger.error("Failed to connect to server", exc_info=error)
+            messagebox.showerror("Error", "Could not connect to server")
+        else:
+            logger.error("Unexpected error during registration", exc_info=error)
+            messagebox.showerror("Error", str(error))
+
+    def set_loading(self, busy):
+        self.register_button.configure(state="disabled" if busy else "normal")
+
     def show_login(self):
         self.controller.show_frame('LoginFrame')
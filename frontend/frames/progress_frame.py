@@ -1,11 +1,7 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 import customtkinter as ctk
-import requests
 from datetime import datetime, timedelta
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import numpy as np
 
 class ProgressFrame(ctk.CTkFrame):
     def __init__(self, parent, controller):
@@ -23,6 +19,8 @@ class ProgressFrame(ctk.CTkFrame):
         self.title = ctk.CTkLabel(self.header, text="Progress Tracker",
                                 font=ctk.CTkFont(size=24, weight="bold"))
         self.title.pack(side="left", padx=10)
+        
+        self.loading_label = ctk.CTkLabel(self.header, text="Loading...", text_color="gray")
 
         # Main content area
         self.content = ctk.CTkFrame(self)
@@ -68,8 +66,12 @@ class ProgressFrame(ctk.CTkFrame):
                                      font=ctk.CTkFont(size=18, weight="bold"))
         self.tests_label.pack(pady=10)
         
-        # Create matplotlib figure for test performance graph
-        self.fig, self.ax = plt.subplots(figsize=(8, 4))
+        # Create matplotlib figure for test performance graph. matplotlib is
+        # slow to import, so it is only loaded once this screen is first opened
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        self.fig = Figure(figsize=(8, 4))
+        self.ax = self.fig.add_subplot()
         self.canvas = FigureCanvasTkAgg(self.fig, master=self.tests_frame)
         self.canvas.get_tk_widget().pack(fill="both", expand=True, padx=10, pady=10)
 
@@ -105,109 +107,103 @@ class ProgressFrame(ctk.CTkFrame):
         self.recent_score_value.grid(row=1, column=2, pady=5)
 
     def update_content(self):
+        # The three requests run concurrently; each section fills in as it arrives
         self.load_user_progress()
         self.load_titles()
         self.load_test_performance()
 
+    def set_loading(self, busy):
+        if busy:
+            self.loading_label.pack(side="left", padx=10)
+        else:
+            self.loading_label.pack_forget()
+
+    def fetch(self, path, on_success, error_message):
+        self.controller.worker.submit(
+            self.controller.api.get, path,
+            owner=self, key=path, on_success=on_success,
+            on_error=lambda e: messagebox.showerror("Error", error_message)
+        )
+
     def load_user_progress(self):
-        try:
-            headers = {'Authorization': f'Bearer {self.controller.token}'}
-            response = requests.get('http://localhost:5000/user/profile',
-                                 headers=headers)
+        self.fetch('/user/profile', self.show_user_progress, "Could not load user progress")
+
+    def show_user_progress(self, response):
+        if response.status_code == 200:
+            data = response.json()
+            xp = data['xp']
             
-            if response.status_code == 200:
-                data = response.json()
-                xp = data['xp']
-                
-                # Calculate level and progress
-                level = 1 + (xp // 1000)  # Level up every 1000 XP
-                progress = (xp % 1000) / 1000  # Progress to next level
-                
-                self.xp_progress.set(progress)
-                self.level_label.configure(text=f"Level {level}")
-                
-                # Update daily XP goal
-                daily_xp = data.get('daily_xp', 0)
-                self.daily_xp_label.configure(
-                    text=f"Daily XP Goal: {daily_xp}/100"
-                )
-                
-        except requests.exceptions.RequestException:
-            messagebox.showerror("Error", "Could not load user progress")
+            # Calculate level and progress
+            level = 1 + (xp // 1000)  # Level up every 1000 XP
+            progress = (xp % 1000) / 1000  # Progress to next level
+            
+            self.xp_progress.set(progress)
+            self.level_label.configure(text=f"Level {level}")
+            
+            # Update daily XP goal
+            daily_xp = data.get('daily_xp', 0)
+            self.daily_xp_label.configure(
+                text=f"Daily XP Goal: {daily_xp}/100"
+            )
 
     def load_titles(self):
+        self.fetch('/user/titles', self.show_titles, "Could not load titles")
+
+    def show_titles(self, response):
         # Clear existing titles
         for widget in self.titles_list.winfo_children():
             widget.destroy()
 
-        try:
-            headers = {'Authorization': f'Bearer {self.controller.token}'}
-            response = requests.get('http://localhost:5000/user/titles',
-                                 headers=headers)
+        if response.status_code == 200:
+            titles = response.json()
             
-            if response.status_code == 200:
-                titles = response.json()
+            for title in titles:
+                frame = ctk.CTkFrame(self.titles_list)
+                frame.pack(fill="x", pady=2)
                 
-                for title in titles:
-                    frame = ctk.CTkFrame(self.titles_list)
-                    frame.pack(fill="x", pady=2)
-                    
-                    title_label = ctk.CTkLabel(frame, text=title['title'])
-                    title_label.pack(side="left", padx=10)
-                    
-                    unlocked_date = datetime.fromisoformat(title['unlocked_at'])
-                    date_label = ctk.CTkLabel(
-                        frame,
-                        text=f"Unlocked: {unlocked_date.strftime('%b %d, %Y')}"
-                    )
-                    date_label.pack(side="right", padx=10)
-                    
-        except requests.exceptions.RequestException:
-            messagebox.showerror("Error", "Could not load titles")
+                title_label = ctk.CTkLabel(frame, text=title['title'])
+                title_label.pack(side="left", padx=10)
+                
+                unlocked_date = datetime.fromisoformat(title['unlocked_at'])
+                date_label = ctk.CTkLabel(
+                    frame,
+                    text=f"Unlocked: {unlocked_date.strftime('%b %d, %Y')}"
+                )
+                date_label.pack(side="right", padx=10)
 
     def load_test_performance(self):
-        try:
-            headers = {'Authorization': f'Bearer {self.controller.token}'}
-            response = requests.get('http://localhost:5000/user/tests',
-                                 headers=headers)
+        self.fetch('/user/tests', self.show_test_performance, "Could not load test performance")
+
+    def show_test_performance(self, response):
+        if response.status_code == 200:
+            # Totals are kept by the server; only the latest scores are sent
+            stats = response.json()
+            recent_tests = stats['recent']
             
-            if response.status_code == 200:
-                tests = response.json()
-                
-                if not tests:
-                    return
-                    
-                # Calculate statistics
-                scores = [test['score'] for test in tests]
-                avg_score = sum(scores) / len(scores)
-                recent_score = scores[-1]
-                
-                self.avg_score_value.configure(text=f"{avg_score:.1f}%")
-                self.tests_count_value.configure(text=str(len(tests)))
-                self.recent_score_value.configure(text=f"{recent_score:.1f}%")
-                
-                # Update graph
-                self.ax.clear()
-                
-                # Get last 10 tests
-                recent_tests = tests[-10:]
-                dates = [datetime.fromisoformat(t['completed_at']).strftime('%m/%d')
-                        for t in recent_tests]
-                scores = [t['score'] for t in recent_tests]
-                
-                self.ax.plot(dates, scores, marker='o')
-                self.ax.set_ylim(0, 100)
-                self.ax.set_xlabel('Date')
-                self.ax.set_ylabel('Score (%)')
-                self.ax.grid(True)
-                
-                # Rotate x-axis labels for better readability
-                plt.xticks(rotation=45)
-                
-                # Adjust layout to prevent label cutoff
-                plt.tight_layout()
-                
-                self.canvas.draw()
-                
-        except requests.exceptions.RequestException:
-            messagebox.showerror("Error", "Could not load test performance")
+            if not stats['test_count']:
+                return
+            
+            self.avg_score_value.configure(text=f"{stats['mean_score']:.1f}%")
+            self.tests_count_value.configure(text=str(stats['test_count']))
+            self.recent_score_value.configure(text=f"{recent_tests[-1]['score']:.1f}%")
+            
+            # Update graph
+            self.ax.clear()
+            
+            dates = [datetime.fromisoformat(t['completed_at']).strftime('%m/%d')
+                    for t in recent_tests]
+            scores = [t['score'] for t in recent_tests]
+            
+            self.ax.plot(dates, scores, marker='o')
+            self.ax.set_ylim(0, 100)
+            self.ax.set_xlabel('Date')
+            self.ax.set_ylabel('Score (%)')
+            self.ax.grid(True)
+            
+            # Rotate x-axis labels for better readability
+            self.ax.tick_params(axis='x', labelrotation=45)
+            
+            # Adjust layout to prevent label cutoff
+            self.fig.tight_layout()
+            
+            self.canvas.draw()
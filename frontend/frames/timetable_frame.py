@@ -1,7 +1,6 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 import customtkinter as ctk
-import requests
 from datetime import datetime, timedelta
 import calendar
 
@@ -78,111 +77,126 @@ class TimetableFrame(ctk.CTkFrame):
     def update_content(self):
         self.load_current_timetable()
         self.load_timetable_history()
+        self.controller.sync.trigger()
+
+    def on_sync(self, kinds):
+        if 'timetable' in kinds:
+            self.load_current_timetable()
+            self.load_timetable_history()
 
     def load_current_timetable(self):
-        try:
-            headers = {'Authorization': f'Bearer {self.controller.token}'}
-            response = requests.get('http://localhost:5000/timetable/current',
-                                 headers=headers)
-            
-            # Clear existing targets
-            for frame in self.targets_frame.winfo_children():
-                for widget in frame.winfo_children():
-                    widget.destroy()
+        # Clear existing targets
+        for frame in self.targets_frame.winfo_children():
+            for widget in frame.winfo_children():
+                widget.destroy()
 
-            if response.status_code == 200:
-                data = response.json()
-                targets_by_day = data['targets']
+        # Rendered from the local mirror; the sync worker keeps it current
+        data = self.controller.cache.get_response(self.controller.user_id, '/timetable/current')
+        if data is None:
+            return
+        targets_by_day = data['targets']
+        
+        for day in range(7):
+            frame = self.targets_frame.winfo_children()[day]
+            day_targets = targets_by_day.get(str(day), [])
+            
+            for i, target in enumerate(day_targets):
+                target_frame = ctk.CTkFrame(frame)
+                target_frame.pack(fill="x", padx=5, pady=2)
                 
-                for day in range(7):
-                    frame = self.targets_frame.winfo_children()[day]
-                    day_targets = targets_by_day.get(str(day), [])
+                text = target['description']
+                if len(text) > 30:
+                    text = text[:27] + "..."
                     
-                    for i, target in enumerate(day_targets):
-                        target_frame = ctk.CTkFrame(frame)
-                        target_frame.pack(fill="x", padx=5, pady=2)
-                        
-                        text = target['description']
-                        if len(text) > 30:
-                            text = text[:27] + "..."
-                            
-                        label = ctk.CTkLabel(target_frame, text=text,
-                                          wraplength=150)
-                        label.pack(side="left", padx=5)
-                        
-                        if not target['completed']:
-                            complete_btn = ctk.CTkButton(
-                                target_frame,
-                                text="✓",
-                                width=30,
-                                command=lambda t=target: self.complete_target(t['id'])
-                            )
-                            complete_btn.pack(side="right", padx=5)
-                        else:
-                            complete_label = ctk.CTkLabel(target_frame, text="✓",
-                                                       text_color="green")
-                            complete_label.pack(side="right", padx=5)
-                            
-        except requests.exceptions.RequestException:
-            messagebox.showerror("Error", "Could not load timetable")
+                label = ctk.CTkLabel(target_frame, text=text,
+                                  wraplength=150)
+                label.pack(side="left", padx=5)
+                
+                if not target['completed']:
+                    complete_btn = ctk.CTkButton(
+                        target_frame,
+                        text="✓",
+                        width=30,
+                        command=lambda t=target: self.complete_target(t['id'])
+                    )
+                    complete_btn.pack(side="right", padx=5)
+                else:
+                    complete_label = ctk.CTkLabel(target_frame, text="✓",
+                                               text_color="green")
+                    complete_label.pack(side="right", padx=5)
 
     def load_timetable_history(self):
-        try:
-            headers = {'Authorization': f'Bearer {self.controller.token}'}
-            response = requests.get('http://localhost:5000/timetable/history',
-                                 headers=headers)
+        # Clear existing history
+        for widget in self.history_list.winfo_children():
+            widget.destroy()
+
+        timetables = self.controller.cache.get_response(self.controller.user_id,
+                                                        '/timetable/history') or []
+        for timetable in timetables:
+            frame = ctk.CTkFrame(self.history_list)
+            frame.pack(fill="x", pady=2)
             
-            # Clear existing history
-            for widget in self.history_list.winfo_children():
-                widget.destroy()
+            week_start = datetime.fromisoformat(timetable['week_start'])
+            week_end = week_start + timedelta(days=6)
+            
+            date_label = ctk.CTkLabel(
+                frame,
+                text=f"{week_start.strftime('%b %d')} - {week_end.strftime('%b %d')}"
+            )
+            date_label.pack(side="left", padx=10)
+            
+            completion = timetable['completion_rate'] * 100
+            stats_label = ctk.CTkLabel(
+                frame,
+                text=f"Completed: {completion:.1f}% ({timetable['completed_targets']}/{timetable['total_targets']})"
+            )
+            stats_label.pack(side="right", padx=10)
 
-            if response.status_code == 200:
-                timetables = response.json()
-                
-                for timetable in timetables:
-                    frame = ctk.CTkFrame(self.history_list)
-                    frame.pack(fill="x", pady=2)
-                    
-                    week_start = datetime.fromisoformat(timetable['week_start'])
-                    week_end = week_start + timedelta(days=6)
-                    
-                    date_label = ctk.CTkLabel(
-                        frame,
-                        text=f"{week_start.strftime('%b %d')} - {week_end.strftime('%b %d')}"
-                    )
-                    date_label.pack(side="left", padx=10)
-                    
-                    completion = timetable['completion_rate'] * 100
-                    stats_label = ctk.CTkLabel(
-                        frame,
-                        text=f"Completed: {completion:.1f}% ({timetable['completed_targets']}/{timetable['total_targets']})"
-                    )
-                    stats_label.pack(side="right", padx=10)
-                    
-        except requests.exceptions.RequestException:
-            messagebox.showerror("Error", "Could not load timetable history")
+    def mark_completed(self, target_id):
+        """Tick a target in the mirrored timetable before the server confirms it"""
+        user_id = self.controller.user_id
+        data = self.controller.cache.get_response(user_id, '/timetable/current')
+        if data is None:
+            return
+        for targets in data['targets'].values():
+            for target in targets:
+                if target['id'] == target_id:
+                    target['completed'] = True
+        self.controller.cache.put_response(user_id, '/timetable/current', data)
 
     def complete_target(self, target_id):
-        try:
-            headers = {'Authorization': f'Bearer {self.controller.token}'}
-            response = requests.post(f'http://localhost:5000/timetable/target/{target_id}/complete',
-                                  headers=headers)
-            
+        path = f'/timetable/target/{target_id}/complete'
+        
+        def done(response):
             if response.status_code == 200:
                 result = response.json()
                 messagebox.showinfo("Success",
                                  f"Target completed! You earned {result['xp_gained']} XP")
+                self.mark_completed(target_id)
                 self.load_current_timetable()
+                self.controller.sync.trigger()
             else:
                 messagebox.showerror("Error", "Failed to complete target")
-                
-        except requests.exceptions.RequestException:
-            messagebox.showerror("Error", "Could not connect to server")
+        
+        def failed(error):
+            # Queue it; XP is awarded when the sync worker replays the request
+            self.controller.cache.enqueue(self.controller.user_id, 'POST', path)
+            self.mark_completed(target_id)
+            self.load_current_timetable()
+            messagebox.showinfo("Success",
+                             "Target completed! XP will be awarded once you are back online")
+        
+        # Keyed so a double click completes the target once. The owner is the
+        # app rather than this frame, so switching frames does not lose the result
+        self.controller.worker.submit(
+            self.controller.api.post, path,
+            owner=self.controller, key=path, on_success=done, on_error=failed
+        )
 
     def show_create_timetable(self):
         dialog = CreateTimetableDialog(self)
         self.wait_window(dialog)
-        self.update_content()
+        self.controller.sync.trigger()
 
 class CreateTimetableDialog(ctk.CTkToplevel):
     def __init__(self, parent):
@@ -263,32 +277,41 @@ class CreateTimetableDialog(ctk.CTkToplevel):
 
     def toggle_copy(self):
         if self.copy_var.get():
-            try:
-                headers = {'Authorization': f'Bearer {self.parent.controller.token}'}
-                response = requests.get('http://localhost:5000/timetable/current',
-                                    headers=headers)
-                
+            controller = self.parent.controller
+            data = controller.cache.get_response(controller.user_id, '/timetable/current')
+            if data is not None:
+                self.copy_targets(data)
+                return
+            
+            def done(response):
                 if response.status_code == 200:
-                    data = response.json()
-                    # Clear existing targets
-                    for day_data in self.day_targets.values():
-                        for target in day_data['targets']:
-                            target['frame'].destroy()
-                        day_data['targets'] = []
-                        self.update_add_button(day_data)
-                    
-                    # Add targets from previous week
-                    for day, targets in data['targets'].items():
-                        day = int(day)
-                        for target in targets:
-                            self.add_target(day, target['description'])
+                    self.copy_targets(response.json())
                 else:
                     messagebox.showwarning("Warning", "No previous timetable to copy from")
                     self.copy_var.set(False)
-                    
-            except requests.exceptions.RequestException:
+            
+            def failed(error):
                 messagebox.showerror("Error", "Could not fetch previous timetable")
                 self.copy_var.set(False)
+            
+            controller.worker.submit(
+                controller.api.get, '/timetable/current',
+                owner=self, key='/timetable/current', on_success=done, on_error=failed
+            )
+
+    def copy_targets(self, data):
+        # Clear existing targets
+        for day_data in self.day_targets.values():
+            for target in day_data['targets']:
+                target['frame'].destroy()
+            day_data['targets'] = []
+            self.update_add_button(day_data)
+        
+        # Add targets from previous week
+        for day, targets in data['targets'].items():
+            day = int(day)
+            for target in targets:
+                self.add_target(day, target['description'])
 
     def update_add_button(self, day_data):
         count = len(day_data['targets'])
@@ -349,24 +372,24 @@ class CreateTimetableDialog(ctk.CTkToplevel):
             messagebox.showerror("Error", "Please add at least one target")
             return
         
-        try:
-            # Create timetable
-            headers = {'Authorization': f'Bearer {self.parent.controller.token}'}
-            response = requests.post(
-                'http://localhost:5000/timetable/',
-                json={
-                    'week_start': self.week_start.isoformat(),
-                    'targets': targets_by_day
-                },
-                headers=headers
-            )
-            
+        def done(response):
             if response.status_code == 201:
                 messagebox.showinfo("Success", "Timetable created successfully")
                 self.destroy()
             else:
                 error_msg = response.json().get('message', 'Failed to create timetable')
                 messagebox.showerror("Error", error_msg)
-                
-        except requests.exceptions.RequestException:
-            messagebox.showerror("Error", "Could not connect to server")
+        
+        # Create timetable
+        self.parent.controller.worker.submit(
+            self.parent.controller.api.post, '/timetable/',
+            json={
+                'week_start': self.week_start.isoformat(),
+                'targets': targets_by_day
+            },
+            owner=self, on_success=done,
+            on_error=lambda e: messagebox.showerror("Error", "Could not connect to server")
+        )
+
+    def set_loading(self, busy):
+        self.create_button.configure(state="disabled" if busy else "normal")
@@ -0,0 +1,384 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+CACHE_PATH = os.path.join(os.path.expanduser('~'), '.rafifi', 'cache.db')
+SYNC_INTERVAL = 30  # seconds between background syncs
+MAX_REPLAY_ATTEMPTS = 5  # failed replays before a queued change is given up
+# Server responses mirrored as-is because they have no change feed
+MIRRORED_RESPONSES = ['/timetable/current', '/timetable/history']
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS sets (
+    user_id INTEGER NOT NULL,
+    id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    folder TEXT,
+    card_count INTEGER NOT NULL DEFAULT 0,
+    etag TEXT,
+    created_at TEXT,
+    PRIMARY KEY (user_id, id)
+);
+CREATE TABLE IF NOT EXISTS cards (
+    user_id INTEGER NOT NULL,
+    id INTEGER NOT NULL,
+    set_id INTEGER NOT NULL,
+    front TEXT NOT NULL,
+    back TEXT NOT NULL,
+    difficulty TEXT,
+    created_at TEXT,
+    PRIMARY KEY (user_id, id)
+);
+CREATE INDEX IF NOT EXISTS ix_cards_set ON cards (user_id, set_id);
+CREATE TABLE IF NOT EXISTS responses (
+    user_id INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    body TEXT NOT NULL,
+    fetched_at TEXT NOT NULL,
+    PRIMARY KEY (user_id, path)
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    user_id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    method TEXT NOT NULL,
+    path TEXT NOT NULL,
+    body TEXT,
+    created_at TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS dead_letters (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    method TEXT NOT NULL,
+    path TEXT NOT NULL,
+    body TEXT,
+    created_at TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    failed_at TEXT NOT NULL
+);
+'''
+
+class LocalCache:
+    """SQLite mirror of the user's sets, cards and timetables
+
+    Screens read from here instantly; SyncWorker keeps it up to date and
+    replays queued mutations from the outbox when the server is reachable.
+    """
+    def __init__(self, path=CACHE_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+            # Caches from before retries were counted
+            columns = {row['name'] for row in self._conn.execute('PRAGMA table_info(outbox)')}
+            if 'attempts' not in columns:
+                self._conn.execute(
+                    'ALTER TABLE outbox ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0')
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params)]
+
+    # Reads
+
+    def get_sets(self, user_id):
+        return self._query(
+            'SELECT id, name, folder, card_count, etag, created_at FROM sets '
+            'WHERE user_id = ? ORDER BY created_at DESC', (user_id,)
+        )
+
+    def get_set(self, user_id, set_id):
+        """Return a set with its cards, or None if the cards are not cached"""
+        rows = self._query('SELECT * FROM sets WHERE user_id = ? AND id = ?', (user_id, set_id))
+        if not rows:
+            return None
+        cards = self._query(
+            'SELECT id, front, back, difficulty, created_at FROM cards '
+            'WHERE user_id = ? AND set_id = ? ORDER BY id', (user_id, set_id)
+        )
+        if rows[0]['card_count'] and not cards:
+            return None
+        return {'id': set_id, 'name': rows[0]['name'], 'folder': rows[0]['folder'],
+                'flashcards': cards, 'etag': rows[0]['etag'],
+                'created_at': rows[0]['created_at']}
+
+    def get_response(self, user_id, path):
+        rows = self._query('SELECT body FROM responses WHERE user_id = ? AND path = ?',
+                           (user_id, path))
+        return json.loads(rows[0]['body']) if rows else None
+
+    def get_version(self, user_id):
+        rows = self._query('SELECT version FROM sync_state WHERE user_id = ?', (user_id,))
+        return rows[0]['version'] if rows else 0
+
+    # Writes from the server
+
+    def put_response(self, user_id, path, data):
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)',
+                (user_id, path, json.dumps(data), datetime.utcnow().isoformat())
+            )
+
+    def delete_response(self, user_id, path):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM responses WHERE user_id = ? AND path = ?',
+                               (user_id, path))
+
+    def apply_changes(self, user_id, changes, replace=None, version=None):
+        """Apply a /flashcard/changes response in one transaction
+
+        replace (default: whether it is a snapshot) drops the cached sets
+        and cards first; version (default: the response's) is the new
+        watermark.
+        """
+        if replace is None:
+            replace = changes.get('snapshot')
+        if version is None:
+            version = changes['version']
+        with self._lock, self._conn:
+            conn = self._conn
+            if replace:
+                conn.execute('DELETE FROM sets WHERE user_id = ?', (user_id,))
+                conn.execute('DELETE FROM cards WHERE user_id = ?', (user_id,))
+            conn.executemany(
+                'INSERT OR REPLACE INTO sets VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(user_id, s['id'], s['name'], s['folder'], s['card_count'],
+                  s.get('etag'), s['created_at']) for s in changes['sets']]
+            )
+            # Server cards replace the placeholders of local edits to the same set
+            conn.executemany(
+                'DELETE FROM cards WHERE user_id = ? AND set_id = ? AND id < 0',
+                [(user_id, set_id) for set_id in {c['set_id'] for c in changes['cards']}]
+            )
+            conn.executemany(
+                'INSERT OR REPLACE INTO cards VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(user_id, c['id'], c['set_id'], c['front'], c['back'],
+                  c['difficulty'], c['created_at']) for c in changes['cards']]
+            )
+            for set_id in changes['deleted_sets']:
+                conn.execute('DELETE FROM sets WHERE user_id = ? AND id = ?', (user_id, set_id))
+                conn.execute('DELETE FROM cards WHERE user_id = ? AND set_id = ?', (user_id, set_id))
+            conn.executemany(
+                'DELETE FROM cards WHERE user_id = ? AND id = ?',
+                [(user_id, card_id) for card_id in changes['deleted_cards']]
+            )
+            conn.execute('INSERT OR REPLACE INTO sync_state VALUES (?, ?)',
+                         (user_id, version))
+
+    # Local edits, applied before the server confirms them
+
+    def delete_set(self, user_id, set_id):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM sets WHERE user_id = ? AND id = ?', (user_id, set_id))
+            self._conn.execute('DELETE FROM cards WHERE user_id = ? AND set_id = ?', (user_id, set_id))
+
+    def update_set(self, user_id, set_id, name, folder, cards=None):
+        with self._lock, self._conn:
+            conn = self._conn
+            conn.execute('UPDATE sets SET name = ?, folder = ? WHERE user_id = ? AND id = ?',
+                         (name, folder, user_id, set_id))
+            if cards is None:
+                return
+            conn.execute('DELETE FROM cards WHERE user_id = ? AND set_id = ?', (user_id, set_id))
+            # Cards the server knows keep their ids; the others get
+            # placeholder ids until the server assigns real ones
+            lowest = conn.execute('SELECT MIN(id) FROM cards WHERE user_id = ?',
+                                  (user_id,)).fetchone()[0]
+            low = min(lowest or 0, 0)
+            now = datetime.utcnow().isoformat()
+            conn.executemany(
+                'INSERT INTO cards VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(user_id, c['id'] if c.get('id', 0) > 0 else low - i - 1, set_id,
+                  c['front'], c['back'], c.get('difficulty', 'medium'), now)
+                 for i, c in enumerate(cards)]
+            )
+            conn.execute('UPDATE sets SET card_count = ? WHERE user_id = ? AND id = ?',
+                         (len(cards), user_id, set_id))
+
+    # Outbox
+
+    def enqueue(self, user_id, method, path, body=None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT INTO outbox (user_id, method, path, body, created_at) VALUES (?, ?, ?, ?, ?)',
+                (user_id, method, path, json.dumps(body) if body is not None else None,
+                 datetime.utcnow().isoformat())
+            )
+
+    def pending(self, user_id):
+        rows = self._query('SELECT * FROM outbox WHERE user_id = ? ORDER BY id', (user_id,))
+        for row in rows:
+            row['body'] = json.loads(row['body']) if row['body'] else None
+        return rows
+
+    def remove_outbox(self, outbox_id):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM outbox WHERE id = ?', (outbox_id,))
+
+    def retry_outbox(self, outbox_id):
+        """Count a failed replay of an outbox item and return its attempts so far"""
+        with self._lock, self._conn:
+            self._conn.execute('UPDATE outbox SET attempts = attempts + 1 WHERE id = ?',
+                               (outbox_id,))
+            row = self._conn.execute('SELECT attempts FROM outbox WHERE id = ?',
+                                     (outbox_id,)).fetchone()
+            return row['attempts'] if row else 0
+
+    def dead_letter(self, outbox_id, status):
+        """Move an outbox item the server will not take to dead_letters"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT INTO dead_letters '
+                'SELECT id, user_id, method, path, body, created_at, ?, ? FROM outbox WHERE id = ?',
+                (status, datetime.utcnow().isoformat(), outbox_id)
+            )
+            self._conn.execute('DELETE FROM outbox WHERE id = ?', (outbox_id,))
+
+class SyncWorker(threading.Thread):
+    """Background thread that flushes the outbox and pulls server changes
+
+    Results are reported through events (a queue.Queue) as ('synced', kinds)
+    and ('status', online) tuples; the Tk thread polls the queue, since Tk
+    widgets must not be touched from this thread.
+    """
+    def __init__(self, cache, api, events, interval=SYNC_INTERVAL):
+        super().__init__(name='sync-worker', daemon=True)
+        self.cache = cache
+        self.api = api
+        self.events = events
+        self.interval = interval
+        self.token = None
+        self.user_id = None
+        self.online = True
+        self._wake = threading.Event()
+
+    def set_user(self, token, user_id):
+        self.token = token
+        self.user_id = user_id
+        self.trigger()
+
+    def trigger(self):
+        """Sync as soon as possible instead of waiting for the interval"""
+        self._wake.set()
+
+    def run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            token, user_id = self.token, self.user_id
+            if not token:
+                continue
+            # The token is captured here so a logout mid-sync cannot mix users
+            headers = {'Authorization': f'Bearer {token}'}
+            try:
+                self.flush_outbox(user_id, headers)
+                kinds = set()
+                if self.pull_changes(user_id, headers):
+                    kinds.add('sets')
+                if self.refresh_responses(user_id, headers):
+                    kinds.add('timetable')
+                self._set_online(True)
+                if kinds:
+                    self.events.put(('synced', kinds))
+            except requests.exceptions.RequestException:
+                logger.info('Sync failed; working offline')
+                self._set_online(False)
+
+    def _set_online(self, online):
+        if online != self.online:
+            self.online = online
+            self.events.put(('status', online))
+
+    def flush_outbox(self, user_id, headers):
+        """Replay queued changes in order
+
+        A change that fails is retried on later syncs, up to
+        MAX_REPLAY_ATTEMPTS times, without holding up the changes behind it,
+        except later changes to the same path, which wait so they are still
+        applied in order. Changes the server rejects, or that keep failing,
+        are moved to dead_letters. Only an expired login stops the flush.
+        """
+        failed_paths = set()
+        logged_in = False
+        for item in self.cache.pending(user_id):
+            change = f"{item['method']} {item['path']}"
+            if item['path'] in failed_paths:
+                continue
+            response = self.api.request(item['method'], item['path'],
+                                        json=item['body'], headers=headers)
+            status = response.status_code
+            if status < 400:
+                self.cache.remove_outbox(item['id'])
+                continue
+            if status == 401 and not logged_in:
+                # The server also answers 401 when a request fails, so ask
+                # whether it is the login that is no longer accepted
+                logged_in = self.api.get('/user/profile', headers=headers).status_code != 401
+                if not logged_in:
+                    logger.warning(f'Login expired; keeping queued changes from {change}')
+                    return
+            if status >= 500 or status == 401:
+                attempts = self.cache.retry_outbox(item['id'])
+                if attempts < MAX_REPLAY_ATTEMPTS:
+                    logger.warning(f'Could not replay {change}: {status} (attempt {attempts})')
+                    failed_paths.add(item['path'])
+                    continue
+            logger.warning(f'Giving up on change {change}: {status}')
+            self.cache.dead_letter(item['id'], status)
+
+    def pull_changes(self, user_id, headers):
+        changed = False
+        params = {'since': self.cache.get_version(user_id)}
+        snapshot_version = None
+        while True:
+            response = self.api.get('/flashcard/changes', params=params, headers=headers)
+            if response.status_code != 200:
+                return changed
+            changes = response.json()
+            if (changes['sets'] or changes['cards'] or changes['deleted_sets']
+                    or changes['deleted_cards'] or changes['snapshot']):
+                changed = True
+            if changes['snapshot']:
+                # A snapshot comes in pages. The watermark stays at 0 until the
+                # last page is stored, so an interrupted snapshot starts over,
+                # and then becomes the first page's version.
+                first = snapshot_version is None
+                if first:
+                    snapshot_version = changes['version']
+                self.cache.apply_changes(user_id, changes, replace=first,
+                                         version=0 if changes['more'] else snapshot_version)
+                params = {'since': 0, 'after': changes['cursor']}
+            else:
+                self.cache.apply_changes(user_id, changes)
+                params = {'since': changes['version']}
+            if not changes['more']:
+                return changed
+
+    def refresh_responses(self, user_id, headers):
+        changed = False
+        for path in MIRRORED_RESPONSES:
+            response = self.api.get(path, headers=headers)
+            old = self.cache.get_response(user_id, path)
+            if response.status_code == 200:
+                data = response.json()
+                if data != old:
+                    self.cache.put_response(user_id, path, data)
+                    changed = True
+            elif response.status_code == 404 and old is not None:
+                self.cache.delete_response(user_id, path)
+                changed = True
+        return changed
@@ -1,10 +1,26 @@
 import customtkinter as ctk
-from frames.home_frame import HomeFrame
-from frames.flashcard_frame import FlashcardFrame
-from frames.timetable_frame import TimetableFrame
-from frames.class_frame import ClassFrame
-from frames.progress_frame import ProgressFrame
-from frames.login_frame import LoginFrame, RegisterFrame
+import importlib
+import queue
+from api_client import ApiClient
+from class_events import ClassEventStream
+from local_cache import LocalCache, SyncWorker
+from worker import RequestWorker
+
+SYNC_POLL_MS = 250  # how often the UI checks for finished background syncs
+
+# Frame name -> module defining it. Frames are imported and built on first
+# use, so startup only pays for the login screen.
+FRAME_MODULES = {
+    'LoginFrame': 'frames.login_frame',
+    'RegisterFrame': 'frames.login_frame',
+    'HomeFrame': 'frames.home_frame',
+    'FlashcardFrame': 'frames.flashcard_frame',
+    'TimetableFrame': 'frames.timetable_frame',
+    'ClassFrame': 'frames.class_frame',
+    'ProgressFrame': 'frames.progress_frame',
+}
+# Frames that survive logging out; the rest hold the previous user's data
+PUBLIC_FRAMES = ('LoginFrame', 'RegisterFrame')
 
 class App(ctk.CTk):
     def __init__(self):
@@ -19,6 +35,23 @@ class App(ctk.CTk):
         self.user_id = None
         self.username = None
         self.xp = 0
+        self.current_frame = None
+        
+        # Shared keep-alive connection to the server
+        self.api = ApiClient()
+        
+        # Local mirror of the user's data, kept up to date in the background
+        self.cache = LocalCache()
+        self.sync_events = queue.Queue()
+        self.sync = SyncWorker(self.cache, self.api, self.sync_events)
+        self.sync.start()
+        
+        # Live updates for the class being viewed, reported on the same queue
+        self.class_events = ClassEventStream(self.api, self.sync_events)
+        self.class_events.start()
+        
+        # Runs HTTP requests off the Tk thread
+        self.worker = RequestWorker(self)
         
         # Configure grid layout
         self.grid_rowconfigure(0, weight=1)
@@ -48,23 +81,24 @@ class App(ctk.CTk):
             btn.pack(pady=5, padx=10, fill="x")
             self.sidebar_buttons[frame] = btn
         
+        # Shown while the server cannot be reached
+        self.offline_label = ctk.CTkLabel(self.sidebar, text="Offline - changes will sync",
+                                       text_color="orange", wraplength=180)
+        
         # Create main content area
         self.main_content = ctk.CTkFrame(self)
         self.main_content.grid(row=0, column=1, sticky="nsew", padx=10, pady=10)
         self.main_content.grid_columnconfigure(0, weight=1)
         self.main_content.grid_rowconfigure(0, weight=1)
         
-        # Create frames
+        # Frames are created by get_frame when first shown
         self.frames = {}
-        for F in (LoginFrame, RegisterFrame, HomeFrame, FlashcardFrame, 
-                 TimetableFrame, ClassFrame, ProgressFrame):
-            frame = F(self.main_content, self)
-            self.frames[F.__name__] = frame
-            frame.grid(row=0, column=0, sticky="nsew")
             
         # Show login frame initially
         self.show_frame('LoginFrame')
         self.sidebar.grid_remove()  # Hide sidebar until logged in
+        
+        self.after(SYNC_POLL_MS, self.process_sync_events)
     
     def show_frame(self, frame_name):
         # Show/hide sidebar based on login state
@@ -84,8 +118,16 @@ class App(ctk.CTk):
         for frame in self.frames.values():
             frame.grid_remove()
         
+        # Replies for the frame being left are no longer needed
+        previous = self.frames.get(self.current_frame)
+        if previous is not None:
+            self.worker.cancel(previous)
+            if hasattr(previous, 'on_hide'):
+                previous.on_hide()
+        
         # Show requested frame
-        frame = self.frames.get(frame_name)
+        frame = self.get_frame(frame_name)
+        self.current_frame = frame_name
         if frame:
             frame.grid()
             if hasattr(frame, 'update_content'):
@@ -93,12 +135,59 @@ class App(ctk.CTk):
         else:
             print(f"Frame {frame_name} not found")
     
+    def get_frame(self, frame_name):
+        """Return the named frame, creating it on first use"""
+        frame = self.frames.get(frame_name)
+        if frame is None and frame_name in FRAME_MODULES:
+            module = importlib.import_module(FRAME_MODULES[frame_name])
+            frame = getattr(module, frame_name)(self.main_content, self)
+            frame.grid(row=0, column=0, sticky="nsew")
+            self.frames[frame_name] = frame
+        return frame
+    
+    def start_session(self, token, user_id, username):
+        self.token = token
+        self.user_id = user_id
+        self.username = username
+        self.api.token = token
+        self.sync.set_user(token, user_id)
+    
+    def process_sync_events(self):
+        """Hand results of background syncs to the visible frame"""
+        try:
+            while True:
+                kind, value = self.sync_events.get_nowait()
+                if kind == 'status':
+                    if value:
+                        self.offline_label.pack_forget()
+                    else:
+                        self.offline_label.pack(side="bottom", pady=10, padx=10)
+                elif kind == 'synced':
+                    frame = self.frames.get(self.current_frame)
+                    if hasattr(frame, 'on_sync'):
+                        frame.on_sync(value)
+                elif kind == 'class_event':
+                    frame = self.frames.get(self.current_frame)
+                    if hasattr(frame, 'on_class_event'):
+                        frame.on_class_event(*value)
+        except queue.Empty:
+            pass
+        self.after(SYNC_POLL_MS, self.process_sync_events)
+    
     def logout(self):
         self.token = None
         self.user_id = None
         self.username = None
         self.xp = 0
+        self.api.token = None
+        self.sync.set_user(None, None)
+        self.class_events.watch(None)
         self.show_frame('LoginFrame')
+        # Rebuilt for the next user when they are shown again
+        for name in list(self.frames):
+            if name not in PUBLIC_FRAMES:
+                self.worker.cancel(self.frames[name])
+                self.frames.pop(name).destroy()
 
 if __name__ == "__main__":
     app = App()
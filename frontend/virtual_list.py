@@ -0,0 +1,112 @@
+import sys
+import tkinter as tk
+import customtkinter as ctk
+
+ROW_HEIGHT = 34  # pixels; every row has the same height
+WHEEL_ROWS = 3  # rows scrolled per mouse wheel notch
+
+class VirtualList(ctk.CTkFrame):
+    """Scrollable list that only builds widgets for the rows on screen
+
+    create_row(parent) builds an empty row widget and update_row(row, item)
+    fills it in. The same few row widgets are moved and refilled as the list
+    scrolls, and set_items() only refills visible rows whose item changed,
+    so a list of thousands of items costs about as much as one screenful.
+    """
+    def __init__(self, parent, create_row, update_row, row_height=ROW_HEIGHT, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.create_row = create_row
+        self.update_row = update_row
+        self.row_height = row_height
+        self.items = []
+        self._rows = []  # recycled rows: {'widget', 'window', 'index', 'item'}
+
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        bg = self._apply_appearance_mode(ctk.ThemeManager.theme["CTkFrame"]["top_fg_color"])
+        self.canvas = tk.Canvas(self, highlightthickness=0, bg=bg,
+                                yscrollincrement=row_height)
+        self.canvas.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar = ctk.CTkScrollbar(self, command=self.canvas.yview)
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+        self.canvas.configure(yscrollcommand=self._on_scroll)
+
+        self.canvas.bind('<Configure>', self._on_resize)
+        # Only scroll with the wheel while the pointer is over the list
+        self.canvas.bind('<Enter>', self._bind_wheel)
+        self.canvas.bind('<Leave>', self._unbind_wheel)
+
+    def set_items(self, items):
+        """Show items, refilling only the visible rows that changed"""
+        self.items = list(items)
+        self.canvas.configure(scrollregion=(0, 0, 0, len(self.items) * self.row_height))
+        self._render()
+
+    def _on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self._render()
+
+    def _on_resize(self, event):
+        for row in self._rows:
+            self.canvas.itemconfigure(row['window'], width=event.width)
+        self._render()
+
+    def _render(self):
+        top = self.canvas.canvasy(0)
+        height = max(self.canvas.winfo_height(), self.row_height)
+        first = max(0, int(top // self.row_height))
+        last = min(len(self.items), int((top + height) // self.row_height) + 1)
+
+        # Enough rows to cover the viewport; extras stay hidden at the end
+        needed = int(height // self.row_height) + 2
+        while len(self._rows) < needed:
+            widget = self.create_row(self.canvas)
+            window = self.canvas.create_window(0, 0, window=widget, anchor="nw",
+                                               width=self.canvas.winfo_width(),
+                                               height=self.row_height, state="hidden")
+            self._rows.append({'widget': widget, 'window': window, 'index': None, 'item': None})
+
+        # Index i always lands in slot i % len(rows), so a row scrolled
+        # partly off screen keeps its contents
+        shown = set()
+        for index in range(first, last):
+            slot = index % len(self._rows)
+            row = self._rows[slot]
+            item = self.items[index]
+            if row['index'] != index or row['item'] != item:
+                self.update_row(row['widget'], item)
+                row['index'], row['item'] = index, item
+                self.canvas.coords(row['window'], 0, index * self.row_height)
+            self.canvas.itemconfigure(row['window'], state="normal")
+            shown.add(slot)
+        for slot, row in enumerate(self._rows):
+            if slot not in shown:
+                self.canvas.itemconfigure(row['window'], state="hidden")
+                row['index'] = row['item'] = None
+
+    def _bind_wheel(self, event):
+        if sys.platform.startswith('linux'):
+            self.canvas.bind_all('<Button-4>', lambda e: self._scroll(-WHEEL_ROWS))
+            self.canvas.bind_all('<Button-5>', lambda e: self._scroll(WHEEL_ROWS))
+        else:
+            self.canvas.bind_all('<MouseWheel>', self._on_wheel)
+
+    def _unbind_wheel(self, event):
+        widget = self.winfo_containing(*self.winfo_pointerxy())
+        if widget is not None and str(widget).startswith(str(self.canvas)):
+            return  # Moved onto one of the rows, which is still inside the list
+        for sequence in ('<Button-4>', '<Button-5>', '<MouseWheel>'):
+            self.canvas.unbind_all(sequence)
+
+    def _on_wheel(self, event):
+        # Windows reports multiples of 120 per notch, macOS small deltas
+        if sys.platform == 'darwin':
+            steps = -event.delta
+        else:
+            steps = -(event.delta // 120) * WHEEL_ROWS
+        self._scroll(steps)
+
+    def _scroll(self, rows):
+        if self.canvas.yview() != (0.0, 1.0):
+            self.canvas.yview_scroll(rows, 'units')
@@ -0,0 +1,114 @@
+import logging
+import queue
+import weakref
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = 4
+POLL_MS = 20  # how often the Tk thread picks up finished requests
+
+class RequestWorker:
+    """Runs blocking calls on a thread pool and hands results back to Tk
+
+    Callbacks always run on the Tk thread, from a queue polled with after().
+    Calls submitted with the same key while one is in flight share its
+    result instead of hitting the server twice. Every call belongs to an
+    owner (usually a frame or dialog): cancel(owner) drops its pending
+    callbacks, and owners that define set_loading(busy) are told when they
+    start and stop waiting.
+    """
+    def __init__(self, root, max_workers=MAX_WORKERS):
+        self.root = root
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix='request')
+        self._done = queue.Queue()
+        self._inflight = {}  # key -> pending call shared by everyone asking for it
+        self._busy = defaultdict(int)  # owner -> number of callbacks waiting; 0 is dropped
+        # owner -> bumped by cancel(). Weak, so closed dialogs are not kept
+        # alive by it; calls without an owner are never cancelled.
+        self._generations = weakref.WeakKeyDictionary()
+        self.root.after(POLL_MS, self._poll)
+
+    def submit(self, func, *args, owner=None, key=None, on_success=None, on_error=None,
+               **kwargs):
+        """Run func(*args, **kwargs) in the pool and call on_success(result)
+
+        on_error(exc) is called if func raises; without it the error is logged.
+        """
+        callback = (owner, self._generation(owner), on_success, on_error)
+        call = self._inflight.get(key) if key is not None else None
+        if call is None:
+            call = {'key': key, 'callbacks': []}
+            call['future'] = self._executor.submit(func, *args, **kwargs)
+            call['future'].add_done_callback(lambda future: self._done.put(call))
+            if key is not None:
+                self._inflight[key] = call
+        call['callbacks'].append(callback)
+        self._mark_busy(owner, 1)
+
+    def cancel(self, owner):
+        """Forget pending callbacks of owner, e.g. when its frame is hidden"""
+        if owner is not None:
+            self._generations[owner] = self._generation(owner) + 1
+        for key, call in list(self._inflight.items()):
+            call['callbacks'] = [c for c in call['callbacks'] if c[0] is not owner]
+            if not call['callbacks'] and call['future'].cancel():
+                # Nobody is waiting and it has not started, so skip it entirely
+                del self._inflight[key]
+        if self._busy.pop(owner, 0):
+            self._set_loading(owner, False)
+
+    def _poll(self):
+        try:
+            while True:
+                self._deliver(self._done.get_nowait())
+        except queue.Empty:
+            pass
+        self.root.after(POLL_MS, self._poll)
+
+    def _deliver(self, call):
+        if call['key'] is not None and self._inflight.get(call['key']) is call:
+            del self._inflight[call['key']]
+        future = call['future']
+        if future.cancelled():
+            return
+        error = future.exception()
+        for owner, generation, on_success, on_error in call['callbacks']:
+            if generation != self._generation(owner):
+                continue  # Cancelled while the call was running
+            if hasattr(owner, 'winfo_exists') and not owner.winfo_exists():
+                # The dialog was closed before the reply arrived
+                self._busy.pop(owner, None)
+                continue
+            self._mark_busy(owner, -1)
+            try:
+                if error is None:
+                    if on_success:
+                        on_success(future.result())
+                elif on_error:
+                    on_error(error)
+                else:
+                    logger.error('Background request failed', exc_info=error)
+            except Exception:
+                logger.exception('Error in request callback')
+
+    def _generation(self, owner):
+        return self._generations.get(owner, 0) if owner is not None else 0
+
+    def _mark_busy(self, owner, delta):
+        before = self._busy[owner]
+        after = before + delta
+        if after:
+            self._busy[owner] = after
+        else:
+            del self._busy[owner]
+        if (before == 0) != (after == 0):
+            self._set_loading(owner, after > 0)
+
+    def _set_loading(self, owner, busy):
+        if hasattr(owner, 'set_loading'):
+            owner.set_loading(busy)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)